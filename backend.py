@@ -1,60 +1,72 @@
 # backend.py
-import streamlit as st
-from dotenv import load_dotenv
 import os
 import time
+import threading
+import queue
+import asyncio
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import nullcontext
 
 # 1. Import necessary libraries
+#
+# Only lightweight modules are imported here. LangChain chains, the OpenAI /
+# Pinecone SDKs and LangSmith are imported on first use (first question,
+# first feedback), so the Streamlit pages render before any of them has
+# loaded. Check with: python -m benchmarks.startup
 
-# from pinecone import Pinecone, ServerlessSpec
-from pinecone import Pinecone
-
-from langchain_openai import OpenAIEmbeddings, ChatOpenAI
-from langchain_pinecone import PineconeVectorStore
-from langchain.chains import RetrievalQA
-from langchain.prompts import PromptTemplate
-# from langchain.agents import Tool, initialize_agent
-
-# for memory in the chat
-from langchain.memory import ConversationBufferWindowMemory
-from langchain.chains import ConversationalRetrievalChain
-
-from langsmith import Client
-# from langsmith import traceable
-
-# from langchain.callbacks.tracers.langchain import wait_for_all_tracers
-from langchain.callbacks.manager import collect_runs
+from src.batch_qa import ResultWriter, normalize_items, result_row, run_batch, with_backoff
+from src.metrics import StageTimer, stage_metrics, start_metrics_server
+from src.resources import ResourcePool
+from src.session_store import SessionRegistry
+from src.settings import apply_langsmith_env, get_settings
+from src.telemetry import TelemetryDispatcher, register_shutdown
+from src.warmup import Warmup
 
 
 # # ---------------------------
 # # Configure your API keys (with 'sectrets')
 # # ---------------------------
+# Secrets and GDPR_* environment variables are read once into an immutable
+# Settings object (src/settings.py); the module constants below mirror it.
+settings = get_settings()
+
 def setup_environment():
     """
-    Get API keys from Streamlit secrets or environment variables
+    API keys from Streamlit secrets or environment variables (from the settings)
     """
-    # First try environment variables (works everywhere)
-    OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
-    PINECONE_API_KEY = os.getenv("PINECONE_API_KEY")
+    return settings.index_name, settings.openai_api_key, settings.pinecone_api_key
 
-    # Try Streamlit secrets first
-    if hasattr(st, 'secrets') and st.secrets:
-        if "OPENAI_API_KEY" in st.secrets and "PINECONE_API_KEY" in st.secrets:
-            OPENAI_API_KEY = st.secrets["OPENAI_API_KEY"]
-            PINECONE_API_KEY = st.secrets["PINECONE_API_KEY"]
-            index_name = "gdpr-compliance-openai"
-            return index_name, OPENAI_API_KEY, PINECONE_API_KEY
-    
-    # Fallback to environment variables
-    OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
-    PINECONE_API_KEY = os.getenv("PINECONE_API_KEY")
-    index_name = "gdpr-compliance-openai"
-    
-    if OPENAI_API_KEY and PINECONE_API_KEY:
-        return index_name, OPENAI_API_KEY, PINECONE_API_KEY
-    else:
-        print("❌ API keys not found in secrets or environment variables")
-        return None, None, None
+# Retrieval backend: "pinecone" (default) or "local" (in-process index built
+# from 2_data/processed/chunks.pkl with `python -m src.local_index`)
+VECTOR_BACKEND = settings.vector_backend
+LOCAL_INDEX_DIR = settings.local_index_dir
+# Compact local index scan (none / int8 / binary, 0 = all dimensions) + float32 rescoring
+INDEX_QUANTIZATION = settings.index_quantization
+INDEX_DIMENSIONS = settings.index_dimensions
+INDEX_RESCORE_FACTOR = settings.index_rescore_factor
+
+# Hybrid retrieval: BM25 over the chunk texts fused with dense results.
+# Build the lexical index with `python -m src.lexical_index`
+HYBRID_SEARCH = settings.hybrid_search
+LEXICAL_INDEX_DIR = settings.lexical_index_dir
+
+# Query routing: a local keyword / centroid classifier predicts document_type
+# and content_category of a question; dense search then runs on that subset
+# (`python -m src.query_router` precomputes the centroids)
+QUERY_ROUTER = settings.query_router
+
+# Cross-lingual query expansion: local language ID + a GDPR glossary add German
+# variants of English / Italian / French / Spanish questions (one embedding batch)
+QUERY_EXPANSION = settings.query_expansion
+
+# Re-ranking: over-fetch RERANK_FETCH_K candidates and keep the RERANK_TOP_N
+# best by a local ONNX cross-encoder (`python -m src.reranker` downloads it)
+RERANK_ENABLED = settings.rerank_enabled
+RERANK_MODEL_DIR = settings.rerank_model_dir
+RERANK_FETCH_K = settings.rerank_fetch_k
+RERANK_TOP_N = settings.rerank_top_n
+RERANK_BUDGET_MS = settings.rerank_budget_ms
 
 # Initialize environment
 index_name, OPENAI_API_KEY, PINECONE_API_KEY = setup_environment()
@@ -63,77 +75,149 @@ index_name, OPENAI_API_KEY, PINECONE_API_KEY = setup_environment()
 def setup_langsmith():
     """
     Setup LangSmith tracing for observability
+    (exports the keys from Streamlit secrets; the tracer itself loads lazily)
     """
-    # Try Streamlit secrets first
-    if hasattr(st, 'secrets') and st.secrets:
-        if "LANGSMITH_API_KEY" in st.secrets:
-            # Set the EXACT environment variables LangSmith expects
-            os.environ["LANGSMITH_TRACING"] = st.secrets.get("LANGSMITH_TRACING", "true")
-            os.environ["LANGSMITH_API_KEY"] = st.secrets["LANGSMITH_API_KEY"]
-            os.environ["LANGSMITH_PROJECT"] = st.secrets.get("LANGSMITH_PROJECT", "GDPR-Compliance-Assistant")
-            
-            return True
-    else:
-        print("⚠️  LangSmith API key not found - tracing disabled")
-        return False
+    return apply_langsmith_env(settings)
 # Initialize LangSmith
 langsmith_enabled = setup_langsmith()
 # ========== END OF LANGSMITH SETUP ==========
 
+# ---------------------------
+# Telemetry dispatch (LangSmith feedback off the request path)
+# ---------------------------
+# Feedback clicks are queued and sent by one background worker over the same
+# client the tracer uses (which already batches runs in the background).
+# While LangSmith is unreachable, items go to a spool file and are replayed later.
+TELEMETRY_SPOOL_PATH = settings.telemetry_spool_path
+
+def _langsmith_client():
+    """The tracer's LangSmith client (langsmith is imported on the first send)"""
+    from langchain_core.tracers.langchain import get_client
+    return get_client()
+
+telemetry = TelemetryDispatcher(
+    client_factory=_langsmith_client,
+    max_queue=settings.telemetry_queue_size,
+    spool_path=TELEMETRY_SPOOL_PATH or None,
+)
+register_shutdown(telemetry)
+
+def get_telemetry_stats():
+    """
+    Counters of the telemetry dispatcher (sent, retried, dropped, spooled, ...)
+    """
+    return telemetry.stats()
+
+# ---------------------------
+# Process-wide resource pool (warm clients)
+# ---------------------------
+# Pinecone client/index, embeddings and LLM are created once per process and
+# share keep-alive HTTP connection pools. The index readiness check runs in
+# the background instead of blocking the first question.
+resource_pool = ResourcePool(
+    openai_api_key=OPENAI_API_KEY,
+    pinecone_api_key=PINECONE_API_KEY,
+    index_name=index_name or "gdpr-compliance-openai",
+    index_host=settings.index_host,
+)
+if PINECONE_API_KEY and VECTOR_BACKEND == "pinecone":
+    resource_pool.start_readiness_check()
+
+def get_resource_health():
+    """
+    Health and connection-reuse counters of the shared clients
+    """
+    return resource_pool.health()
+
 # ---------------------------
 # Pinecone Initialization
 # ---------------------------
 def init_pinecone(api_key: str, index_name: str = "gdpr-compliance-openai", environment: str = "us-east-1"):
     """
-    Initialize Pinecone connection using current Pinecone
+    Return the shared Pinecone client and index handle
     """
     if not api_key:
         raise ValueError("PINECONE_API_KEY is missing!")
     
-    # Initialize Pinecone
-    pc = Pinecone(api_key=api_key)
-    
-    # Check if index exists
-    if index_name in pc.list_indexes().names():
-        # Wait for index to be ready
-        while not pc.describe_index(index_name).status.ready:
-            time.sleep(1)
-    else:
-        print(f"⚠️  Index '{index_name}' not found.")
-    
-    # Get the index object
-    index = pc.Index(index_name)
+    pc = resource_pool.pinecone_client()
+    index = resource_pool.index()
     return pc, index
 
 # ---------------------------
 # Embeddings Initialization 
 # ---------------------------
+# Query embeddings are cached (memory LRU -> SQLite) keyed by model + normalized
+# text, so repeated questions skip the embedding round-trip.
+EMBEDDING_CACHE_PATH = settings.embedding_cache_path
+EMBEDDING_CACHE_MEMORY_SIZE = settings.embedding_cache_memory_size
+EMBEDDING_CACHE_DISK_SIZE = settings.embedding_cache_disk_size
+EMBEDDING_CACHE_STORAGE = settings.embedding_cache_storage
+
+_cached_embeddings = None
+_cached_embeddings_lock = threading.Lock()
+
 def init_embeddings():
     """
-    Initialize OpenAI embeddings
+    Return the shared OpenAI embeddings client, wrapped in the embedding cache
     """
+    global _cached_embeddings
     if not OPENAI_API_KEY:
         raise ValueError("OPENAI_API_KEY is missing!")
     
-    embeddings = OpenAIEmbeddings(
-        model="text-embedding-3-small",
-        openai_api_key=OPENAI_API_KEY
-    )
-    return embeddings
+    if _cached_embeddings is None:
+        with _cached_embeddings_lock:
+            if _cached_embeddings is None:
+                from src.embedding_cache import CachedEmbeddings
+                _cached_embeddings = CachedEmbeddings(
+                    resource_pool.embeddings(),
+                    model_name=resource_pool.embedding_model,
+                    path=EMBEDDING_CACHE_PATH or None,
+                    max_memory_entries=EMBEDDING_CACHE_MEMORY_SIZE,
+                    max_disk_entries=EMBEDDING_CACHE_DISK_SIZE,
+                    storage=EMBEDDING_CACHE_STORAGE,
+                )
+    return _cached_embeddings
+
+def get_embedding_cache_stats():
+    """
+    Hit/miss counters of the query embedding cache
+    """
+    if _cached_embeddings is None:
+        return {}
+    return _cached_embeddings.stats()
 
 # ---------------------------
 # vector store connection Initialization 
 # ---------------------------
-def init_vector_store():
+def init_vector_store(backend=None):
     """
     Initialize the vector store connection
+    backend: "pinecone" or "local" (defaults to GDPR_VECTOR_BACKEND)
     """
+    backend = (backend or VECTOR_BACKEND).lower()
+    if backend == "local":
+        if not os.path.exists(os.path.join(LOCAL_INDEX_DIR, "embeddings.npy")):
+            raise ValueError(
+                f"Local index not found in {LOCAL_INDEX_DIR}. Build it with: python -m src.local_index"
+            )
+        from src.local_index import LocalVectorStore
+        return LocalVectorStore.load(
+            LOCAL_INDEX_DIR,
+            embedding=init_embeddings(),
+            quantization=INDEX_QUANTIZATION,
+            dimensions=INDEX_DIMENSIONS or None,
+            rescore_factor=INDEX_RESCORE_FACTOR,
+        )
+
     if not PINECONE_API_KEY:
         raise ValueError("PINECONE_API_KEY is missing!")
     
+    from langchain_pinecone import PineconeVectorStore
+
     pc, index = init_pinecone(PINECONE_API_KEY)
     embeddings = init_embeddings()
     
+    # Sync and async (IndexAsyncio) queries both use this index's host + key
     vector_store = PineconeVectorStore(
         index=index,
         embedding=embeddings,
@@ -141,24 +225,322 @@ def init_vector_store():
     )
     return vector_store
 
+# ---------------------------
+# Lexical (BM25) index Initialization 
+# ---------------------------
+def dense_document_types(vector_store):
+    """
+    Source documents (document_type) in the dense index: the local index
+    knows them, for Pinecone they come from GDPR_CORPUS_DOCUMENT_TYPES
+    """
+    if getattr(vector_store, "metadatas", None) is not None:
+        from src.lexical_index import document_types
+        return document_types(vector_store.metadatas)
+    return set(settings.corpus_document_types)
+
+def init_lexical_index(vector_store=None):
+    """
+    Load the precomputed BM25 index, or None if hybrid search is off / not built,
+    or if it doesn't cover every document of the dense index (a partial BM25
+    list fused into every query would pull results toward the covered guides)
+    """
+    if not HYBRID_SEARCH:
+        return None
+    if not os.path.exists(os.path.join(LEXICAL_INDEX_DIR, "vocab.json")):
+        print(f"⚠️  Lexical index not found in {LEXICAL_INDEX_DIR}, using dense retrieval only. "
+              "Build it with: python -m src.lexical_index --pinecone-index <name> (or --chunks for the local index)")
+        return None
+    from src.lexical_index import LexicalIndex
+    lexical_index = LexicalIndex.load(LEXICAL_INDEX_DIR)
+    missing = dense_document_types(vector_store) - lexical_index.document_types
+    if missing:
+        print(f"⚠️  Lexical index in {LEXICAL_INDEX_DIR} lacks {', '.join(sorted(missing))}, using dense retrieval only. "
+              "Rebuild it from the full corpus: python -m src.lexical_index --pinecone-index <name> "
+              "(or --chunks with one chunks file per guide)")
+        return None
+    return lexical_index
+
+# ---------------------------
+# Query router Initialization 
+# ---------------------------
+def init_query_router(vector_store=None):
+    """
+    Router for metadata-filtered retrieval, or None if routing is off.
+    Centroids come from GDPR_ROUTER_CENTROIDS or, for the local index,
+    from its vectors; without them only keyword cues route. Centroids built
+    from fewer source documents than the searched index holds are not used
+    (their content_category filter would drop the other guides' chunks).
+    """
+    if not QUERY_ROUTER:
+        return None
+    from src.query_router import QueryRouter, build_centroids, centroid_document_types, index_labels, load_centroids
+
+    centroids = None
+    # Local index: route only to labels it actually contains
+    known_labels = index_labels(vector_store.metadatas) if hasattr(vector_store, "metadatas") else None
+    try:
+        path = settings.router_centroids_path
+        if path and os.path.exists(path):
+            missing = dense_document_types(vector_store) - centroid_document_types(path)
+            if missing:
+                print(f"⚠️  Router centroids in {path} lack {', '.join(sorted(missing))}, routing document_type "
+                      "by keywords only. Rebuild them from the searched index: python -m src.query_router "
+                      "--pinecone-index <name> (or --index for the local one)")
+            else:
+                centroids = load_centroids(path)
+        elif getattr(vector_store, "vectors", None) is not None:
+            centroids = build_centroids(vector_store.vectors, vector_store.metadatas)
+    except Exception as e:
+        print(f"⚠️  Router centroids not available ({e}), routing by keywords only")
+    return QueryRouter(centroids=centroids, margin=settings.router_margin, known_labels=known_labels)
+
+# ---------------------------
+# Query expansion Initialization 
+# ---------------------------
+def init_query_expander():
+    """
+    Glossary-based German query variants, or None if expansion is off
+    """
+    if not QUERY_EXPANSION:
+        return None
+    from src.query_expansion import QueryExpander
+    return QueryExpander(max_variants=settings.expansion_max_variants)
+
+# ---------------------------
+# Cross-encoder re-ranker Initialization 
+# ---------------------------
+def init_reranker():
+    """
+    Load the local cross-encoder, or None if re-ranking is off / not installed
+    """
+    if not RERANK_ENABLED:
+        return None
+    from src.reranker import CrossEncoderReranker, reranker_available
+
+    if not reranker_available(RERANK_MODEL_DIR):
+        print(f"⚠️  Re-ranker not available in {RERANK_MODEL_DIR} (needs onnxruntime + tokenizers), "
+              "keeping retrieval order. Download it with: python -m src.reranker")
+        return None
+    try:
+        return CrossEncoderReranker(RERANK_MODEL_DIR)
+    except Exception as e:
+        print(f"❌ Could not load re-ranker: {e}")
+        return None
+
 # ---------------------------
 # LLM Initialization 
 # ---------------------------
 def init_llm():
     """
-    Initialize the LLM
+    Return the shared LLM client
     """
     if not OPENAI_API_KEY:
         raise ValueError("OPENAI_API_KEY is missing!")
         
-    llm = ChatOpenAI(
-        openai_api_key=OPENAI_API_KEY,
-        model_name='gpt-3.5-turbo',
-        temperature=0.0,
-        max_tokens=500,
-    )
-    return llm
+    return resource_pool.llm()
+
+
+# ---------------------------
+# Shared (per-process) components
+# ---------------------------
+_shared_components = None
+_shared_components_lock = threading.Lock()
+
+def get_shared_components():
+    """
+    Build the heavy, stateless parts of the QA chain ONCE per process
+    (Pinecone client + index, embeddings, vector store, retriever and LLM).
+    Every session's chain reuses them; only memory is per session.
+    """
+    global _shared_components
+    if _shared_components is None:
+        # A running warm-up is building them already: wait for it instead
+        warmup.wait(settings.warmup_wait_timeout)
+    if _shared_components is None:
+        with _shared_components_lock:
+            if _shared_components is None:
+                from src.condense import SpeculativeRetriever
+                from src.retrievers import DedupRetriever, HybridRetriever, RerankRetriever
 
+                vector_store = init_vector_store()
+                router = init_query_router(vector_store)
+                expander = init_query_expander()
+                lexical_index = init_lexical_index(vector_store)
+                reranker = init_reranker()
+                # With a re-ranker, retrieval over-fetches candidates for it
+                k = RERANK_FETCH_K if reranker is not None else 3
+                if lexical_index is not None:
+                    # Dense + BM25 candidates, fused by reciprocal rank -> k
+                    retriever = HybridRetriever(
+                        dense_retriever=DedupRetriever(
+                            vector_store=vector_store,
+                            k=max(k, 8),
+                            fetch_k=max(k, 8) + 4,
+                            router=router,
+                            expander=expander,
+                        ),
+                        lexical_index=lexical_index,
+                        k=k,
+                        lexical_k=max(k, 8),
+                        expander=expander,
+                    )
+                else:
+                    # Similarity search, over-fetching a little so that
+                    # duplicate chunks don't take up retrieval slots
+                    retriever = DedupRetriever(
+                        vector_store=vector_store, k=k, fetch_k=k + 5, router=router, expander=expander
+                    )
+                if reranker is not None:
+                    # Only the best RERANK_TOP_N candidates reach the prompt
+                    retriever = RerankRetriever(
+                        base_retriever=retriever,
+                        reranker=reranker,
+                        top_n=RERANK_TOP_N,
+                        budget_ms=RERANK_BUDGET_MS,
+                    )
+                if SPECULATIVE_RETRIEVAL:
+                    # Lets the condensing step start retrieval before its rewrite returns
+                    retriever = SpeculativeRetriever(retriever=retriever)
+                _shared_components = {
+                    "embeddings": init_embeddings(),
+                    "vector_store": vector_store,
+                    "retriever": retriever,
+                    "reranker": reranker,
+                    "router": router,
+                    "expander": expander,
+                    "llm": init_llm(),
+                }
+                if ANSWER_CACHE_ENABLED:
+                    # Answers cached for a previously built index must not be served
+                    get_answer_cache().check_version(force=True)
+    return _shared_components
+
+def index_version():
+    """
+    Version of the searched index content, or None if unknown: the local
+    index's build time, else the ingestion manifest's size and mtime
+    (it grows with every re-ingestion into Pinecone)
+    """
+    shared = _shared_components
+    built_at = getattr(shared["vector_store"], "manifest", {}).get("built_at") if shared else None
+    if built_at:
+        return f"local:{built_at}:{len(shared['vector_store'])}"
+    path = settings.index_manifest_path
+    if path and os.path.exists(path):
+        stat = os.stat(path)
+        return f"manifest:{stat.st_size}:{stat.st_mtime_ns}"
+    return None
+
+# ---------------------------
+# Semantic answer cache
+# ---------------------------
+# Near-duplicate questions (cosine >= threshold) that retrieve the SAME chunks
+# in the SAME chat-history context get the stored answer without an LLM call.
+ANSWER_CACHE_ENABLED = settings.answer_cache_enabled
+
+# Both caches are created on first use (their modules pull in LangChain)
+_answer_cache = None
+_rewrite_cache = None
+_caches_lock = threading.Lock()
+
+def get_answer_cache():
+    """
+    The process-wide semantic answer cache
+    """
+    global _answer_cache
+    if _answer_cache is None:
+        with _caches_lock:
+            if _answer_cache is None:
+                from src.answer_cache import SemanticAnswerCache
+                _answer_cache = SemanticAnswerCache(
+                    threshold=settings.answer_cache_threshold,
+                    ttl=settings.answer_cache_ttl,
+                    max_entries=settings.answer_cache_size,
+                    version_source=index_version,
+                )
+    return _answer_cache
+
+def invalidate_answer_cache(index_version=None):
+    """
+    Drop cached answers now (index changes are also picked up by the
+    cache itself, see index_version())
+    """
+    get_answer_cache().invalidate(index_version)
+
+def get_answer_cache_stats():
+    """
+    Hit/miss counters of the semantic answer cache ({} before the first question)
+    """
+    return _answer_cache.stats() if _answer_cache is not None else {}
+
+# ---------------------------
+# Question condensing (follow-up -> standalone question)
+# ---------------------------
+# Follow-ups that don't refer back to earlier turns skip the rewrite LLM call,
+# rewrites are cached, and retrieval on the raw question runs in parallel
+# with the rewrite (used when the rewrite leaves the question unchanged).
+CONDENSE_HEURISTICS = settings.condense_heuristics
+SPECULATIVE_RETRIEVAL = settings.speculative_retrieval
+
+def get_rewrite_cache():
+    """
+    The process-wide cache of condensed (standalone) questions
+    """
+    global _rewrite_cache
+    if _rewrite_cache is None:
+        with _caches_lock:
+            if _rewrite_cache is None:
+                from src.condense import RewriteCache
+                _rewrite_cache = RewriteCache(
+                    max_entries=settings.rewrite_cache_size,
+                    ttl=settings.rewrite_cache_ttl,
+                )
+    return _rewrite_cache
+
+def get_reranker_stats():
+    """
+    Counters of the cross-encoder re-ranker ({} if it isn't loaded)
+    """
+    reranker = _shared_components.get("reranker") if _shared_components else None
+    return reranker.stats() if reranker is not None else {}
+
+def get_router_stats():
+    """
+    Counters of the query router ({} if routing is off / not built yet)
+    """
+    router = _shared_components.get("router") if _shared_components else None
+    return router.stats() if router is not None else {}
+
+def get_expansion_stats():
+    """
+    Counters of the cross-lingual query expansion ({} if it is off / not built yet)
+    """
+    expander = _shared_components.get("expander") if _shared_components else None
+    return expander.stats() if expander is not None else {}
+
+def get_condense_stats():
+    """
+    Counters of the question-condensing stage ({} before the first question)
+    """
+    if _rewrite_cache is None:
+        return {}
+    from src.condense import SpeculativeRetriever, condense_stats
+
+    stats = {**condense_stats(), "rewrite_cache": _rewrite_cache.stats()}
+    retriever = _shared_components["retriever"] if _shared_components else None
+    if isinstance(retriever, SpeculativeRetriever):
+        stats["speculative_retrieval"] = retriever.stats()
+    return stats
+
+# ---------------------------
+# Prompt token budget
+# ---------------------------
+# Whole answering prompt (template + history + question + context chunks);
+# the chunks get what's left, at least CONTEXT_MIN_TOKENS.
+PROMPT_TOKEN_BUDGET = settings.prompt_token_budget
+CONTEXT_MIN_TOKENS = settings.context_min_tokens
+# Chat history kept verbatim (older turns are summarized)
+HISTORY_TOKEN_BUDGET = settings.history_token_budget
 
 # ---------------------------
 # QA Memory (opt.)  Initialization 
@@ -166,17 +548,21 @@ def init_llm():
 
 def create_qa_chain_with_memory():
     """Create QA chain with conversation memory"""
+    from langchain.prompts import PromptTemplate
+    from src.answer_cache import CachedCombineDocsChain
+    from src.condense import CondenseQuestionChain, SpeculativeRetriever
+    from src.context_packing import ContextPacker, PackedConversationalRetrievalChain, count_tokens
+    from src.summary_memory import TokenBudgetMemory
+
+    shared = get_shared_components()
+    llm = shared["llm"]
+    retriever = shared["retriever"]
     
-    vector_store = init_vector_store()
-    llm = init_llm()
-    
-    retriever = vector_store.as_retriever(
-        search_type="similarity",
-        search_kwargs={"k": 3}
-    )
-    
-    memory = ConversationBufferWindowMemory(
-        k=3,  # Remember last 3 exchanges
+    # Recent exchanges verbatim, older ones folded into a rolling summary
+    # (summarized in the background) so history stays within its token budget
+    memory = TokenBudgetMemory(
+        llm=llm,
+        max_history_tokens=HISTORY_TOKEN_BUDGET,
         memory_key="chat_history",
         return_messages=True,
         output_key="answer"
@@ -203,143 +589,452 @@ Answer (short and practical):"""
         input_variables=["chat_history", "context", "question"]
     )
     
+    # Retrieved chunks are merged (same page, consecutive) and packed into
+    # the token budget before they are stuffed into PROMPT_mem
+    context_packer = ContextPacker(
+        prompt_budget=PROMPT_TOKEN_BUDGET,
+        reserved_tokens=count_tokens(prompt_template_mem),
+        min_context_tokens=CONTEXT_MIN_TOKENS,
+    )
+
     # Use ConversationalRetrievalChain with custom prompt
-    qa_chain_mem = ConversationalRetrievalChain.from_llm(
+    qa_chain_mem = PackedConversationalRetrievalChain.from_llm(
         llm=llm,
         retriever=retriever,
         memory=memory,
         combine_docs_chain_kwargs={"prompt": PROMPT_mem},
         return_source_documents=True,
+        context_packer=context_packer,
         verbose=False  # Set to True to see the chain thinking
     )
+
+    # Cheaper condensing: same prompt and LLM, but skipped / cached / speculative
+    qa_chain_mem.question_generator = CondenseQuestionChain(
+        llm=llm,
+        prompt=qa_chain_mem.question_generator.prompt,
+        rewrite_cache=get_rewrite_cache(),
+        speculative_retriever=retriever if isinstance(retriever, SpeculativeRetriever) else None,
+        use_heuristics=CONDENSE_HEURISTICS,
+    )
+
+    # Short-circuit the answering LLM call for near-duplicate questions
+    if ANSWER_CACHE_ENABLED:
+        qa_chain_mem.combine_docs_chain = CachedCombineDocsChain(
+            combine_docs_chain=qa_chain_mem.combine_docs_chain,
+            cache=get_answer_cache(),
+            embeddings=shared["embeddings"],
+        )
     
     return qa_chain_mem, memory
 
+# ---------------------------
+# Per-session chain registry
+# ---------------------------
+# One chain + memory per chat session, so concurrent users never share history.
+# Idle sessions are dropped after SESSION_IDLE_TTL seconds, and at most
+# MAX_SESSIONS are kept (least recently used goes first).
+DEFAULT_SESSION_ID = "default"
+MAX_SESSIONS = settings.max_sessions
+SESSION_IDLE_TTL = settings.session_idle_ttl
+
+session_registry = SessionRegistry(
+    factory=create_qa_chain_with_memory,
+    max_sessions=MAX_SESSIONS,
+    idle_ttl=SESSION_IDLE_TTL,
+)
+
+# ---------------------------
+# Background warm-up (opt-in: GDPR_WARMUP=true, started by home_app.py)
+# ---------------------------
+# Builds the shared components and a chain, then sends one throwaway query
+# embedding and one top-1 vector query, so imports, client setup, index
+# readiness and the first TLS handshakes are done before the first question.
+# Requests arriving meanwhile wait for it (see get_shared_components).
+def _warmup_steps():
+    probe = {}
+
+    def index_ready():
+        if PINECONE_API_KEY and VECTOR_BACKEND == "pinecone":
+            if not resource_pool.wait_until_ready(timeout=settings.warmup_wait_timeout):
+                raise RuntimeError(f"index not ready ({resource_pool.health()['index_status']})")
+
+    def embedding():
+        embeddings = get_shared_components()["embeddings"]
+        # Past the embedding cache, so the request really reaches the API
+        client = getattr(embeddings, "embeddings", embeddings)
+        probe["vector"] = client.embed_query("Datenschutz warm-up")
+
+    def vector_query():
+        get_shared_components()["vector_store"].similarity_search_by_vector(probe["vector"], k=1)
+
+    return [
+        ("index_ready", index_ready),
+        ("chain", create_qa_chain_with_memory),
+        ("embedding", embedding),
+        ("vector_query", vector_query),
+    ]
+
+warmup = Warmup(_warmup_steps())
+
+def start_warmup():
+    """
+    Start the background warm-up once per process (no-op without API keys)
+    """
+    if not api_keys_configured():
+        return None
+    return warmup.start()
+
+def get_warmup_status():
+    """
+    State of the warm-up: off | running | ready | failed, with step timings
+    """
+    return warmup.status()
+
+# ---------------------------
+# Per-stage latency metrics
+# ---------------------------
+# Every request is timed per stage (condense, embed, vector search, prompt
+# build, LLM first token / completion, source post-processing); the response
+# carries the breakdown and the histograms are available as Prometheus text
+# or JSON. GDPR_METRICS_PORT additionally serves them over HTTP (/metrics).
+METRICS_PORT = settings.metrics_port
+if METRICS_PORT:
+    start_metrics_server(METRICS_PORT, host=settings.metrics_host)
+
+def get_latency_metrics():
+    """
+    Per-stage latency summary (count, mean, p50/p95/p99, max in ms)
+    """
+    return stage_metrics.snapshot()
+
+def get_latency_metrics_text():
+    """
+    Per-stage latency histograms in the Prometheus text format
+    """
+    return stage_metrics.prometheus_text()
+
 # ---------------------------
 #  Ask a question WITH MEMORY and return answer
 # ---------------------------
 
-def ask_gdpr_question_with_memory(question, show_sources=True):
+def ask_gdpr_question_with_memory(question, show_sources=True, session_id=DEFAULT_SESSION_ID):
     """
     Ask a question with conversation memory and return answer with sources
     Includes LangSmith run_id for feedback tracking
+    Each session_id gets its own chain and memory (see session_registry)
     """
-    global qa_chain_memory, memory_instance
     
     # Check if API keys are available
-    if not OPENAI_API_KEY or not PINECONE_API_KEY:
-        return {
-            "answer": "❌ API keys not configured. Please set OPENAI_API_KEY and PINECONE_API_KEY in Streamlit secrets.",
-            "sources": [],
-            "memory_count": 0,
-            "run_id": None
-        }
-    
-    # Initialize chain and memory if not already done
-    if qa_chain_memory is None or memory_instance is None:
-        qa_chain_memory, memory_instance = create_qa_chain_with_memory()
+    if not api_keys_configured():
+        return error_response("❌ API keys not configured. Please set OPENAI_API_KEY and PINECONE_API_KEY in Streamlit secrets.")
     
-    # Use collect_runs to properly capture run_id
-    current_run_id = None
+    # Our own run_id for the top-level run, so feedback can refer to the trace
+    # without collecting runs in memory
+    current_run_id = str(uuid.uuid4())
+    timer = StageTimer()
     try:
-        with collect_runs() as callback_manager:
+        # Get (or lazily create) this session's chain and memory
+        session = session_registry.get(session_id)
+
+        # Requests of one session run one at a time; other sessions are not blocked
+        with session.lock:
             # Get answer from QA chain with memory
-            result = qa_chain_memory.invoke(
+            result = session.chain.invoke(
                 {"question": question},
-                config={"callbacks": [callback_manager]}
+                config={"callbacks": [timer], "run_id": current_run_id}
             )
-            
-            # Capture run_id from the traced run
-            if callback_manager.traced_runs:
-                current_run_id = str(callback_manager.traced_runs[0].id)
+
+            memory_count = session.memory.message_count // 2
                 
     except Exception as e:
         print(f"Error in QA chain invocation: {e}")
-        return {
-            "answer": f"❌ Error processing your question: {str(e)}",
-            "sources": [],
-            "memory_count": 0,
-            "run_id": None
-        }
+        return error_response(f"❌ Error processing your question: {str(e)}")
     
+    return build_response(result, current_run_id, memory_count, show_sources, timer)
+
+def api_keys_configured():
+    """
+    True if the keys needed by the selected vector backend are present
+    """
+    return settings.api_keys_configured
+
+def error_response(message):
+    """
+    Response dict for a request that could not be answered
+    """
+    return {
+        "answer": message,
+        "sources": [],
+        "memory_count": 0,
+        "run_id": None
+    }
+
+def extract_sources(source_documents):
+    """
+    Convert retrieved Documents into the source dicts shown in the UI
+    """
+    sources = []
+    for doc in source_documents or []:
+        source_text = doc.page_content.strip()
+        metadata = doc.metadata or {}
+        raw_page = metadata.get('page_number')
+        page = None
+        if raw_page is not None:
+            page = int(float(raw_page))
+        else:
+            page = raw_page
+        document_name = metadata.get('document_name')
+        sources.append({
+            "content": source_text,
+            "page": page,
+            "document": document_name,
+            "metadata": metadata
+        })
+    return sources
+
+def build_response(result, run_id, memory_count, show_sources=True, timer=None):
+    """
+    Response dict returned by all ask_* variants
+    With a StageTimer, it also gets a "timings" breakdown in ms
+    """
     # Prepare response with run_id - PRESERVING YOUR EXACT SOURCE FORMAT
     response = {
         "answer": result.get('answer', '').strip(),
         "sources": [],
-        "memory_count": len(memory_instance.chat_memory.messages) // 2,
-        "run_id": current_run_id  # Add run_id to response
+        "memory_count": memory_count,
+        "run_id": run_id  # Add run_id to response
     }
     
-    # Extract sources if requested - EXACTLY AS YOU HAD IT
-    if show_sources and result.get('source_documents'):
-        for doc in result['source_documents']:
-            source_text = doc.page_content.strip()
-            metadata = doc.metadata or {}
-            raw_page = metadata.get('page_number')
-            page = None
-            if raw_page is not None:
-                page = int(float(raw_page))
-            else:
-                page = raw_page
-            document_name = metadata.get('document_name')
-            response["sources"].append({
-                "content": source_text,
-                "page": page,
-                "document": document_name,
-                "metadata": metadata
-            })
+    # Extract sources if requested
+    with timer.stage("postprocess") if timer is not None else nullcontext():
+        if show_sources and result.get('source_documents'):
+            response["sources"] = extract_sources(result['source_documents'])
+
+    if timer is not None:
+        response["timings"] = timer.finish()
     
     return response
 
-def clear_memory():
+# ---------------------------
+#  Stream a question WITH MEMORY (retrieval first, then LLM tokens)
+# ---------------------------
+
+def stream_gdpr_question_with_memory(question, show_sources=True, session_id=DEFAULT_SESSION_ID):
+    """
+    Generator variant of ask_gdpr_question_with_memory. Yields event dicts:
+      {"type": "retrieval", "sources": [...]}   once retrieval is done
+      {"type": "token", "text": "..."}         answer tokens as they arrive
+      {"type": "done", "response": {...}}      same dict ask_gdpr_question_with_memory returns
+    """
+    if not api_keys_configured():
+        yield {"type": "done", "response": error_response(
+            "❌ API keys not configured. Please set OPENAI_API_KEY and PINECONE_API_KEY in Streamlit secrets."
+        )}
+        return
+
+    from src.stream_events import StreamEventHandler
+
+    events = queue.Queue()
+    timer = StageTimer()
+
+    def _run():
+        try:
+            session = session_registry.get(session_id)
+            handler = StreamEventHandler(events)
+            run_id = str(uuid.uuid4())
+            with session.lock:
+                result = session.chain.invoke(
+                    {"question": question},
+                    config={"callbacks": [handler, timer], "run_id": run_id}
+                )
+                memory_count = session.memory.message_count // 2
+            events.put(("done", build_response(result, run_id, memory_count, show_sources, timer)))
+        except Exception as e:
+            print(f"Error in QA chain invocation: {e}")
+            events.put(("done", error_response(f"❌ Error processing your question: {str(e)}")))
+
+    worker = threading.Thread(target=_run, name="qa-stream", daemon=True)
+    worker.start()
+
+    streamed_any = False
+    while True:
+        kind, payload = events.get()
+        if kind == "retrieval":
+            yield {"type": "retrieval", "sources": extract_sources(payload) if show_sources else []}
+        elif kind == "token":
+            streamed_any = True
+            yield {"type": "token", "text": payload}
+        else:
+            # Cached answers and errors arrive without tokens: emit them in one piece
+            if not streamed_any and payload["answer"]:
+                yield {"type": "token", "text": payload["answer"]}
+            yield {"type": "done", "response": payload}
+            break
+    worker.join()
+
+# ---------------------------
+#  Async: ask a question WITH MEMORY
+# ---------------------------
+
+async def _acquire_session_lock(lock, poll_interval=0.01):
+    """
+    Take a session's threading.Lock without blocking the event loop.
+    Polling (instead of acquiring in a helper thread) keeps cancellation safe.
     """
-    Clear the conversation memory
+    while not lock.acquire(blocking=False):
+        await asyncio.sleep(poll_interval)
+
+async def aask_gdpr_question_with_memory(question, show_sources=True, session_id=DEFAULT_SESSION_ID):
+    """
+    Async counterpart of ask_gdpr_question_with_memory, built on chain.ainvoke
+    (async OpenAI client for condensing/answering, async Pinecone queries).
+    Returns the same response dict.
     """
-    global memory_instance
-    if memory_instance is not None:
-        memory_instance.clear()
+    if not api_keys_configured():
+        return error_response("❌ API keys not configured. Please set OPENAI_API_KEY and PINECONE_API_KEY in Streamlit secrets.")
+
+    current_run_id = str(uuid.uuid4())
+    timer = StageTimer()
+    try:
+        # First call per process builds the shared clients: keep that off the loop
+        session = await asyncio.to_thread(session_registry.get, session_id)
 
-def get_memory_state():
+        await _acquire_session_lock(session.lock)
+        try:
+            result = await session.chain.ainvoke(
+                {"question": question},
+                config={"callbacks": [timer], "run_id": current_run_id}
+            )
+            memory_count = session.memory.message_count // 2
+        finally:
+            session.lock.release()
+
+    except Exception as e:
+        print(f"Error in async QA chain invocation: {e}")
+        return error_response(f"❌ Error processing your question: {str(e)}")
+
+    return build_response(result, current_run_id, memory_count, show_sources, timer)
+
+# ---------------------------
+#  Ask MANY independent questions (evaluation runs)
+# ---------------------------
+
+async def aask_gdpr_questions_batch(
+    questions,
+    show_sources=True,
+    output_path=None,
+    retrieval_concurrency=16,
+    llm_concurrency=8,
+    max_retries=5,
+):
+    """
+    Answer a list of independent questions (no conversation memory), e.g. an
+    evaluation dataset. questions: strings or dicts with question /
+    reference / example_id. All questions are embedded in one batched call,
+    retrieval runs concurrently, LLM calls run at most llm_concurrency at a
+    time and back off on rate limits. With output_path (.csv or .jsonl),
+    rows are written as they finish, in the german_experiment_results.csv
+    column layout. Returns the rows in input order.
+    """
+    items = normalize_items(questions)
+    if not api_keys_configured():
+        message = "❌ API keys not configured. Please set OPENAI_API_KEY and PINECONE_API_KEY in Streamlit secrets."
+        return [result_row(item, None, message, 0.0) for item in items]
+
+    # Stateless chain: same retriever / packing / prompt, history always empty
+    chain, _ = await asyncio.to_thread(create_qa_chain_with_memory)
+    embeddings = get_shared_components()["embeddings"]
+
+    # One embeddings request for all questions; retrieval then hits the cache
+    unique_questions = list(dict.fromkeys(i["question"] for i in items))
+    await with_backoff(lambda: embeddings.aembed_documents(unique_questions), max_retries)
+
+    async def retrieve(question):
+        docs = await chain.retriever.ainvoke(question)
+        return chain.context_packer.pack(docs, "", question) if chain.context_packer else docs
+
+    async def answer(item, docs):
+        run_id = str(uuid.uuid4())
+        output = await chain.combine_docs_chain.ainvoke(
+            {"input_documents": docs, "question": item["question"], "chat_history": ""},
+            config={"run_id": run_id},
+        )
+        result = {"answer": output[chain.combine_docs_chain.output_key], "source_documents": docs}
+        return build_response(result, run_id, 0, show_sources)
+
+    writer = ResultWriter(output_path) if output_path else None
+    try:
+        return await run_batch(
+            items,
+            retrieve,
+            answer,
+            retrieval_concurrency=retrieval_concurrency,
+            llm_concurrency=llm_concurrency,
+            max_retries=max_retries,
+            on_row=writer.write if writer else None,
+        )
+    finally:
+        if writer:
+            writer.close()
+
+def ask_gdpr_questions_batch(questions, **kwargs):
+    """
+    Sync wrapper of aask_gdpr_questions_batch (also works inside a running
+    event loop, e.g. a notebook)
+    """
+    try:
+        asyncio.get_running_loop()
+    except RuntimeError:
+        return asyncio.run(aask_gdpr_questions_batch(questions, **kwargs))
+    with ThreadPoolExecutor(max_workers=1) as pool:
+        return pool.submit(asyncio.run, aask_gdpr_questions_batch(questions, **kwargs)).result()
+
+def clear_memory(session_id=DEFAULT_SESSION_ID):
+    """
+    Clear the conversation memory of one session
+    """
+    session = session_registry.peek(session_id)
+    if session is not None:
+        session.memory.clear()
+
+def get_memory_state(session_id=DEFAULT_SESSION_ID):
     """
     Get current memory state for debugging
     """
-    global memory_instance
-    if memory_instance is not None:
+    session = session_registry.peek(session_id)
+    if session is not None:
         return {
-            "message_count": len(memory_instance.chat_memory.messages),
-            "messages": memory_instance.chat_memory.messages
+            "message_count": session.memory.message_count,
+            "messages": session.memory.chat_memory.messages,
+            **session.memory.stats(),
         }
     return {"message_count": 0, "messages": []}
 
-# Global variables for memory-based QA chain
-qa_chain_memory = None
-memory_instance = None
-
 # ---------------------------
 #  FEEDBACK to LangSmith
 # ---------------------------
 
 def submit_feedback_to_langsmith(run_id: str, score: int, comment: str = "") -> bool:
-    """Submit feedback to LangSmith with proper error handling"""
-    try:
-        if not run_id:
-            print("❌ No run_id provided for feedback")
-            return False
-            
-        client = Client()
-        
-        # Submit feedback
-        client.create_feedback(
-            run_id=run_id,
-            key="user_rating", 
-            score=score,  # 1 for thumbs up, 0 for thumbs down
-            comment=comment,
-            value=str(score)
-        )
-        
-        print(f"✅ Feedback submitted for run_id: {run_id}, score: {score}")
-        return True
-        
-    except Exception as e:
-        print(f"❌ LangSmith feedback error: {str(e)}")
+    """
+    Queue feedback for LangSmith (sent in the background, see telemetry).
+    Returns immediately; False if it can't be sent at all.
+    """
+    if not run_id:
+        print("❌ No run_id provided for feedback")
+        return False
+    if not os.getenv("LANGSMITH_API_KEY"):
+        print("❌ LangSmith API key not configured - feedback not sent")
         return False
+
+    queued = telemetry.submit_feedback(
+        run_id,
+        key="user_rating",
+        score=score,  # 1 for thumbs up, 0 for thumbs down
+        comment=comment,
+        value=str(score),
+    )
+    if queued:
+        print(f"✅ Feedback queued for run_id: {run_id}, score: {score}")
+    else:
+        print(f"⚠️  Telemetry queue full - feedback for run_id {run_id} dropped")
+    return queued
@@ -0,0 +1,140 @@
+# fakes.py
+# Local stand-ins for OpenAI and Pinecone, so the backend can be benchmarked offline
+import asyncio
+import hashlib
+import re
+import time
+from typing import Any, AsyncIterator, Iterator, List, Optional
+
+import numpy as np
+from langchain_core.callbacks import AsyncCallbackManagerForLLMRun, CallbackManagerForLLMRun
+from langchain_core.embeddings import Embeddings
+from langchain_core.language_models import BaseChatModel
+from langchain_core.messages import AIMessage, AIMessageChunk, BaseMessage
+from langchain_core.outputs import ChatGeneration, ChatGenerationChunk, ChatResult
+
+_WORD_RE = re.compile(r"\w+", re.UNICODE)
+
+ANSWER_TEXT = (
+    "Nach der DSGVO dürfen Handwerksbetriebe personenbezogene Daten nur verarbeiten, wenn eine "
+    "Rechtsgrundlage besteht, etwa ein Vertrag, eine gesetzliche Pflicht oder eine Einwilligung. "
+    "Kundendaten sollten nach Ablauf der Aufbewahrungsfristen gelöscht werden. Prüfen Sie außerdem, "
+    "ob ein Verzeichnis von Verarbeitungstätigkeiten geführt wird und ob technische und "
+    "organisatorische Maßnahmen dokumentiert sind. Dies ist keine Rechtsberatung."
+)
+
+
+class FakeEmbeddings(Embeddings):
+    """
+    Deterministic hashed bag-of-words vectors: texts sharing words are similar,
+    so retrieval over chunks.pkl behaves plausibly. latency is per API call.
+    """
+
+    def __init__(self, size: int = 256, latency: float = 0.0):
+        self.size = size
+        self.latency = latency
+        self.calls = 0
+
+    def _vector(self, text: str) -> List[float]:
+        vector = np.zeros(self.size, dtype=np.float32)
+        for word in _WORD_RE.findall(text.lower()):
+            h = int.from_bytes(hashlib.blake2b(word.encode("utf-8"), digest_size=8).digest(), "big")
+            vector[h % self.size] += 1.0 if (h >> 32) & 1 else -1.0
+        norm = np.linalg.norm(vector)
+        return (vector / norm if norm else vector).tolist()
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        self.calls += 1
+        if self.latency:
+            time.sleep(self.latency)
+        return [self._vector(t) for t in texts]
+
+    def embed_query(self, text: str) -> List[float]:
+        return self.embed_documents([text])[0]
+
+    async def aembed_documents(self, texts: List[str]) -> List[List[float]]:
+        self.calls += 1
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        return [self._vector(t) for t in texts]
+
+    async def aembed_query(self, text: str) -> List[float]:
+        return (await self.aembed_documents([text]))[0]
+
+
+class FakeChatModel(BaseChatModel):
+    """
+    Chat model that answers after `latency` seconds (time to first token) and
+    then emits `tokens_per_second` tokens. Condensing and summary prompts get
+    short, plausible outputs instead of a full answer.
+    """
+
+    latency: float = 0.25
+    tokens_per_second: float = 80.0
+    answer: str = ANSWER_TEXT
+
+    @property
+    def _llm_type(self) -> str:
+        return "fake-chat-benchmark"
+
+    def _reply(self, messages: List[BaseMessage]) -> str:
+        prompt = messages[-1].content if messages else ""
+        if prompt.rstrip().endswith("Standalone question:"):
+            match = re.search(r"Follow Up Input:\s*(.*)", prompt)
+            return match.group(1).strip() if match else "Welche Pflichten gelten nach der DSGVO?"
+        if prompt.rstrip().endswith("New summary:"):
+            return "Der Nutzer fragt nach Pflichten seines Handwerksbetriebs nach der DSGVO."
+        return self.answer
+
+    def _tokens(self, text: str) -> List[str]:
+        return re.findall(r"\S+\s*", text)
+
+    def _generate(
+        self,
+        messages: List[BaseMessage],
+        stop: Optional[List[str]] = None,
+        run_manager: Optional[CallbackManagerForLLMRun] = None,
+        **kwargs: Any,
+    ) -> ChatResult:
+        text = "".join(chunk.message.content for chunk in self._stream(messages, stop, run_manager, **kwargs))
+        return ChatResult(generations=[ChatGeneration(message=AIMessage(content=text))])
+
+    def _stream(
+        self,
+        messages: List[BaseMessage],
+        stop: Optional[List[str]] = None,
+        run_manager: Optional[CallbackManagerForLLMRun] = None,
+        **kwargs: Any,
+    ) -> Iterator[ChatGenerationChunk]:
+        time.sleep(self.latency)
+        for token in self._tokens(self._reply(messages)):
+            time.sleep(1.0 / self.tokens_per_second)
+            chunk = ChatGenerationChunk(message=AIMessageChunk(content=token))
+            if run_manager:
+                run_manager.on_llm_new_token(token, chunk=chunk)
+            yield chunk
+
+    async def _agenerate(
+        self,
+        messages: List[BaseMessage],
+        stop: Optional[List[str]] = None,
+        run_manager: Optional[AsyncCallbackManagerForLLMRun] = None,
+        **kwargs: Any,
+    ) -> ChatResult:
+        parts = [chunk.message.content async for chunk in self._astream(messages, stop, run_manager, **kwargs)]
+        return ChatResult(generations=[ChatGeneration(message=AIMessage(content="".join(parts)))])
+
+    async def _astream(
+        self,
+        messages: List[BaseMessage],
+        stop: Optional[List[str]] = None,
+        run_manager: Optional[AsyncCallbackManagerForLLMRun] = None,
+        **kwargs: Any,
+    ) -> AsyncIterator[ChatGenerationChunk]:
+        await asyncio.sleep(self.latency)
+        for token in self._tokens(self._reply(messages)):
+            await asyncio.sleep(1.0 / self.tokens_per_second)
+            chunk = ChatGenerationChunk(message=AIMessageChunk(content=token))
+            if run_manager:
+                await run_manager.on_llm_new_token(token, chunk=chunk)
+            yield chunk
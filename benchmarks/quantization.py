@@ -0,0 +1,130 @@
+# quantization.py
+# Recall vs. memory of the compact local-index scans (truncated dimensions,
+# int8 / binary codes, with and without float32 rescoring) against exact
+# search, on the evaluation questions (docs/german_experiment_results.csv)
+#
+#   python -m benchmarks.quantization                          # local index + OpenAI query embeddings
+#   python -m benchmarks.quantization --offline                # fake embeddings over chunks.pkl
+#   python -m benchmarks.quantization --synthetic-rows 200000  # + noisy copies, for memory / latency at scale
+import argparse
+import json
+import os
+import pickle
+import sys
+import time
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if ROOT not in sys.path:
+    sys.path.insert(0, ROOT)
+
+from src.batch_qa import load_questions  # noqa: E402
+from src.local_index import DEFAULT_RESCORE_FACTOR, LocalVectorStore  # noqa: E402
+
+DEFAULT_QUESTIONS = os.path.join(ROOT, "docs", "german_experiment_results.csv")
+DEFAULT_INDEX = os.path.join(ROOT, "2_data", "processed", "local_index")
+CHUNKS_PATH = os.path.join(ROOT, "2_data", "processed", "chunks.pkl")
+
+
+def configs(dimension: int, rescore_factor: int) -> List[Tuple[str, str, Optional[int], int]]:
+    """(label, quantization, dimensions, rescore factor); the first one is the exact reference"""
+    half, quarter = dimension // 2, dimension // 4
+    rows = [("float32", "none", None, 0)]
+    for kind, dims in (("none", half), ("none", quarter), ("int8", None), ("int8", half), ("binary", None)):
+        name = f"{'float32' if kind == 'none' else kind}" + (f"/{dims}d" if dims else "")
+        rows.append((name, kind, dims, 0))
+        rows.append((f"{name}+rescore", kind, dims, rescore_factor))
+    return rows
+
+
+def load_store(args) -> Tuple[LocalVectorStore, object, bool]:
+    """(store, query embeddings, offline?)"""
+    if not args.offline and os.path.exists(os.path.join(args.index, "embeddings.npy")) and os.getenv("OPENAI_API_KEY"):
+        from langchain_openai import OpenAIEmbeddings
+
+        store = LocalVectorStore.load(args.index, embedding=None)
+        model = store.manifest.get("model") or "text-embedding-3-small"
+        return store, OpenAIEmbeddings(model=model), False
+
+    from benchmarks.fakes import FakeEmbeddings
+
+    with open(CHUNKS_PATH, "rb") as f:
+        chunks = pickle.load(f)
+    embeddings = FakeEmbeddings(size=args.fake_dim)
+    return LocalVectorStore.build(chunks, embeddings), embeddings, True
+
+
+def add_synthetic_rows(store: LocalVectorStore, count: int, noise: float = 0.05, seed: int = 0) -> LocalVectorStore:
+    """Noisy copies of the real vectors, so memory and scan time can be compared at a realistic size"""
+    if count <= 0:
+        return store
+    rng = np.random.default_rng(seed)
+    base = np.asarray(store.vectors, dtype=np.float32)
+    copies = base[rng.integers(0, len(base), count)] + rng.normal(0, noise, (count, base.shape[1])).astype(np.float32)
+    copies /= np.linalg.norm(copies, axis=1, keepdims=True)
+    vectors = np.vstack([base, copies])
+    n = len(vectors)
+    return LocalVectorStore(
+        embedding=store.embeddings, vectors=vectors, texts=[""] * n, metadatas=[{}] * n, ids=[str(i) for i in range(n)]
+    )
+
+
+def run_config(store: LocalVectorStore, queries: np.ndarray, k: int, exact: Optional[List[set]], repeats: int) -> Dict:
+    results = [{row for row, _ in store._top_k(q, k)} for q in queries]
+    started = time.perf_counter()
+    for _ in range(repeats):
+        for q in queries:
+            store._top_k(q, k)
+    latency_us = (time.perf_counter() - started) / (repeats * len(queries)) * 1e6
+    recall = 1.0 if exact is None else float(np.mean([len(r & e) / len(e) for r, e in zip(results, exact) if e]))
+    return {"recall": round(recall, 4), "index_bytes": store.index_bytes(), "latency_us": round(latency_us, 1)}, results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Recall vs. memory of quantized / truncated local index scans")
+    parser.add_argument("--questions", default=DEFAULT_QUESTIONS, help="Evaluation questions (.csv/.jsonl/.txt)")
+    parser.add_argument("--index", default=DEFAULT_INDEX, help="Local index directory")
+    parser.add_argument("--offline", action="store_true", help="Fake embeddings over chunks.pkl (no API key needed)")
+    parser.add_argument("--fake-dim", type=int, default=256, help="Fake embedding size (offline)")
+    parser.add_argument("--k", type=int, default=4, help="Results per query (recall@k)")
+    parser.add_argument("--rescore-factor", type=int, default=DEFAULT_RESCORE_FACTOR)
+    parser.add_argument("--synthetic-rows", type=int, default=0, help="Extra noisy copies of the index vectors")
+    parser.add_argument("--repeats", type=int, default=20, help="Timed passes over the questions")
+    parser.add_argument("--json", help="Also write the results to this file")
+    args = parser.parse_args()
+
+    questions = [item["question"] for item in load_questions(args.questions) if item["question"]]
+    store, embeddings, offline = load_store(args)
+    if offline:
+        print("⚠️  Offline mode: hashed fake embeddings. Int8 / binary numbers are indicative; truncation "
+              "recall is not (only OpenAI text-embedding-3 vectors are trained to be truncated)")
+    store = add_synthetic_rows(store, args.synthetic_rows)
+    queries = np.asarray(embeddings.embed_documents(questions), dtype=np.float32)
+    dimension = int(np.asarray(store.vectors).shape[1])
+    print(f"⏱️  {len(questions)} questions, {len(store)} vectors x {dimension} dims, k={args.k}")
+
+    exact, rows = None, []
+    for label, kind, dims, rescore in configs(dimension, args.rescore_factor):
+        store.quantize(kind, dims, rescore)
+        result, found = run_config(store, queries, args.k, exact, args.repeats)
+        exact = exact if exact is not None else found
+        rows.append({"config": label, **result})
+
+    reference = rows[0]["index_bytes"]
+    print(f"   {'config':<22} {'recall@' + str(args.k):>9} {'scan MB':>9} {'vs f32':>7} {'µs/query':>10}")
+    for row in rows:
+        print(f"   {row['config']:<22} {row['recall']:>9.3f} {row['index_bytes'] / 2**20:>9.2f} "
+              f"{row['index_bytes'] / reference:>6.1%} {row['latency_us']:>10.1f}")
+    print("   (rescore configs also read k x factor float32 rows from the memory-mapped embeddings.npy per query)")
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump({"offline": offline, "k": args.k, "vectors": len(store), "dimension": dimension, "results": rows}, f, indent=2)
+        print(f"✅ Results written to {args.json}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
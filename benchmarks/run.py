@@ -0,0 +1,286 @@
+# run.py
+# Offline benchmarks of backend.py with fake OpenAI / Pinecone services:
+# latency percentiles, throughput and peak RSS, checked against a JSON baseline
+#
+#   python -m benchmarks.run                   # run + compare with benchmarks/baseline.json
+#   python -m benchmarks.run --save-baseline   # run + overwrite the baseline
+import argparse
+import json
+import os
+import pickle
+import platform
+import resource
+import sys
+import threading
+import time
+from typing import Callable, Dict, List
+
+import numpy as np
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DEFAULT_BASELINE = os.path.join(ROOT, "benchmarks", "baseline.json")
+CHUNKS_PATH = os.path.join(ROOT, "2_data", "processed", "chunks.pkl")
+
+# A short multi-turn conversation (standalone questions and follow-ups)
+QUESTIONS = [
+    "Welche Kundendaten darf ein Handwerksbetrieb für ein Angebot erheben?",
+    "Wie lange muss ich Arbeitsverträge und Stundenzettel aufbewahren?",
+    "Gilt das auch für Bewerbungsunterlagen?",
+    "Brauche ich in einem Betrieb mit 12 Mitarbeitern einen Datenschutzbeauftragten?",
+    "Was muss ich tun, wenn eine Kunden-E-Mail-Liste gestohlen wurde?",
+    "Und welche Fristen gelten dafür?",
+    "Was regelt § 26 BDSG für Beschäftigtendaten?",
+    "Which special rules apply when training AI models on customer data?",
+]
+
+# Metric -> (direction, absolute slack). "up" = higher is worse.
+CHECKS = {
+    "p95_ms": ("up", 2.0),
+    "throughput_per_s": ("down", 0.0),
+    "peak_rss_mb": ("up", 25.0),
+}
+
+
+def peak_rss_mb() -> float:
+    usage = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is in KB on Linux, bytes on macOS
+    return usage / (1024 * 1024) if platform.system() == "Darwin" else usage / 1024
+
+
+def summarize(latencies_s: List[float], wall_s: float) -> Dict[str, float]:
+    ms = np.asarray(latencies_s) * 1000
+    return {
+        "count": int(len(ms)),
+        "p50_ms": round(float(np.percentile(ms, 50)), 3),
+        "p95_ms": round(float(np.percentile(ms, 95)), 3),
+        "p99_ms": round(float(np.percentile(ms, 99)), 3),
+        "mean_ms": round(float(ms.mean()), 3),
+        "throughput_per_s": round(len(ms) / wall_s, 2) if wall_s else 0.0,
+        "peak_rss_mb": round(peak_rss_mb(), 1),
+    }
+
+
+def timed(fn: Callable, repeat: int) -> Dict[str, float]:
+    latencies = []
+    wall = time.perf_counter()
+    for _ in range(repeat):
+        started = time.perf_counter()
+        fn()
+        latencies.append(time.perf_counter() - started)
+    return summarize(latencies, time.perf_counter() - wall)
+
+
+# ---------------------------
+# Backend with fake services
+# ---------------------------
+def load_backend(args):
+    # Must be set before backend is imported (settings are read at import)
+    os.environ.setdefault("OPENAI_API_KEY", "sk-benchmark")
+    os.environ.setdefault("PINECONE_API_KEY", "benchmark")
+    os.environ["GDPR_VECTOR_BACKEND"] = "local"
+    os.environ["GDPR_EMBEDDING_CACHE_PATH"] = ""
+    os.environ["GDPR_RERANK"] = "false"
+    os.environ["GDPR_ANSWER_CACHE"] = "true" if args.answer_cache else "false"
+    os.environ["LANGSMITH_TRACING"] = "false"
+    os.environ["LANGCHAIN_TRACING_V2"] = "false"
+    sys.path.insert(0, ROOT)
+
+    import backend
+    from benchmarks.fakes import FakeChatModel, FakeEmbeddings
+    from src.local_index import LocalVectorStore
+
+    with open(CHUNKS_PATH, "rb") as f:
+        chunks = pickle.load(f)
+    embeddings = FakeEmbeddings(latency=args.embed_latency)
+    store = LocalVectorStore.build(chunks, embeddings)
+    llm = FakeChatModel(latency=args.llm_latency, tokens_per_second=args.tokens_per_second)
+
+    backend.init_embeddings = lambda: embeddings
+    backend.init_vector_store = lambda *a, **k: store
+    backend.init_llm = lambda: llm
+    backend._shared_components = None
+    return backend
+
+
+# ---------------------------
+# Scenarios
+# ---------------------------
+def bench_create_chain(backend, args) -> Dict[str, float]:
+    started = time.perf_counter()
+    backend.create_qa_chain_with_memory()  # builds the shared components
+    cold_ms = (time.perf_counter() - started) * 1000
+    result = timed(backend.create_qa_chain_with_memory, args.chain_repeat)
+    result["cold_start_ms"] = round(cold_ms, 3)
+    return result
+
+
+def bench_single_user(backend, args) -> Dict[str, float]:
+    latencies = []
+    wall = time.perf_counter()
+    for round_number in range(args.rounds):
+        session_id = f"bench-single-{round_number}"
+        for question in QUESTIONS:
+            started = time.perf_counter()
+            response = backend.ask_gdpr_question_with_memory(question, session_id=session_id)
+            latencies.append(time.perf_counter() - started)
+            if response["answer"].startswith("❌"):
+                raise RuntimeError(response["answer"])
+        backend.clear_memory(session_id)
+    return summarize(latencies, time.perf_counter() - wall)
+
+
+def bench_concurrent(backend, args) -> Dict[str, float]:
+    latencies: List[float] = []
+    errors: List[str] = []
+    lock = threading.Lock()
+
+    def _user(user: int):
+        session_id = f"bench-user-{user}"
+        for question in QUESTIONS[: args.questions_per_user]:
+            started = time.perf_counter()
+            response = backend.ask_gdpr_question_with_memory(question, session_id=session_id)
+            with lock:
+                latencies.append(time.perf_counter() - started)
+                if response["answer"].startswith("❌"):
+                    errors.append(response["answer"])
+        backend.clear_memory(session_id)
+
+    wall = time.perf_counter()
+    threads = [threading.Thread(target=_user, args=(u,)) for u in range(args.users)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    if errors:
+        raise RuntimeError(errors[0])
+    result = summarize(latencies, time.perf_counter() - wall)
+    result["users"] = args.users
+    return result
+
+
+def bench_extract_sources(backend, args) -> Dict[str, float]:
+    retriever = backend.get_shared_components()["retriever"]
+    batches = [retriever.invoke(q) for q in QUESTIONS]
+    state = {"i": 0}
+
+    def _extract():
+        backend.extract_sources(batches[state["i"] % len(batches)])
+        state["i"] += 1
+
+    return timed(_extract, args.micro_repeat)
+
+
+def bench_export_chat(backend, args) -> Dict[str, float]:
+    from utils import RenderCache, export_chat
+
+    messages = []
+    session_id = "bench-export"
+    for question in QUESTIONS:
+        response = backend.ask_gdpr_question_with_memory(question, session_id=session_id)
+        messages.append({"role": "user", "content": question})
+        messages.append({"role": "assistant", "content": response["answer"], "sources": response["sources"]})
+    backend.clear_memory(session_id)
+    # Same as the chat page: message blocks memoized across exports
+    cache = RenderCache()
+    return timed(lambda: export_chat("Benchmark chat", messages, cache=cache), args.micro_repeat)
+
+
+SCENARIOS = {
+    "create_qa_chain_with_memory": bench_create_chain,
+    "ask_single_user": bench_single_user,
+    "ask_concurrent": bench_concurrent,
+    "extract_sources": bench_extract_sources,
+    "export_chat": bench_export_chat,
+}
+
+
+# ---------------------------
+# Baseline comparison
+# ---------------------------
+def compare(results: Dict, baseline: Dict, tolerance: float) -> List[str]:
+    regressions = []
+    for name, base in baseline.get("scenarios", {}).items():
+        current = results["scenarios"].get(name)
+        if current is None:
+            continue
+        for metric, (direction, slack) in CHECKS.items():
+            if metric not in base or metric not in current:
+                continue
+            if direction == "up":
+                limit = base[metric] * (1 + tolerance) + slack
+                failed = current[metric] > limit
+            else:
+                limit = base[metric] * (1 - tolerance) - slack
+                failed = current[metric] < limit
+            if failed:
+                regressions.append(f"{name}.{metric}: {current[metric]} (baseline {base[metric]}, limit {limit:.2f})")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Offline benchmarks of backend.py with fake OpenAI / Pinecone")
+    parser.add_argument("--baseline", default=DEFAULT_BASELINE)
+    parser.add_argument("--save-baseline", action="store_true", help="Write results as the new baseline")
+    parser.add_argument("--output", help="Also write the results JSON here")
+    parser.add_argument("--tolerance", type=float, default=0.25, help="Allowed relative regression")
+    parser.add_argument("--only", nargs="*", choices=sorted(SCENARIOS), help="Run only these scenarios")
+    parser.add_argument("--llm-latency", type=float, default=0.25, help="Fake LLM time to first token (s)")
+    parser.add_argument("--tokens-per-second", type=float, default=400.0, help="Fake LLM token rate")
+    parser.add_argument("--embed-latency", type=float, default=0.02, help="Fake embeddings call latency (s)")
+    parser.add_argument("--users", type=int, default=8)
+    parser.add_argument("--questions-per-user", type=int, default=4)
+    parser.add_argument("--rounds", type=int, default=2)
+    parser.add_argument("--chain-repeat", type=int, default=50)
+    parser.add_argument("--micro-repeat", type=int, default=2000)
+    parser.add_argument("--answer-cache", action="store_true", help="Keep the semantic answer cache on")
+    args = parser.parse_args()
+
+    backend = load_backend(args)
+    results = {
+        "config": {k: v for k, v in vars(args).items() if k not in ("baseline", "save_baseline", "output", "only")},
+        "python": platform.python_version(),
+        "scenarios": {},
+    }
+    for name, scenario in SCENARIOS.items():
+        if args.only and name not in args.only:
+            continue
+        results["scenarios"][name] = stats = scenario(backend, args)
+        print(
+            f"⏱️  {name:<28} p50 {stats['p50_ms']:>9.3f} ms  p95 {stats['p95_ms']:>9.3f} ms  "
+            f"p99 {stats['p99_ms']:>9.3f} ms  {stats['throughput_per_s']:>9.2f}/s  RSS {stats['peak_rss_mb']:.0f} MB"
+        )
+
+    # Where the time of the chat scenarios went (not compared with the baseline)
+    results["stages"] = backend.get_latency_metrics()["stages"]
+    for stage, stats in results["stages"].items():
+        print(f"   {stage:<16} n={stats['count']:<5} mean {stats['mean_ms']:>9.2f} ms  p95 ~{stats['p95_ms']:>9.2f} ms")
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+
+    if args.save_baseline:
+        with open(args.baseline, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+        print(f"✅ Baseline saved to {args.baseline}")
+        return 0
+
+    if not os.path.exists(args.baseline):
+        print(f"⚠️  No baseline at {args.baseline} (create one with --save-baseline)")
+        return 0
+    with open(args.baseline, "r", encoding="utf-8") as f:
+        baseline = json.load(f)
+    if baseline.get("config") != results["config"]:
+        print("⚠️  Benchmark settings differ from the baseline's, comparison may not be meaningful")
+    regressions = compare(results, baseline, args.tolerance)
+    if regressions:
+        print("❌ Performance regressions:")
+        for line in regressions:
+            print(f"   {line}")
+        return 1
+    print("✅ No regressions against the baseline")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
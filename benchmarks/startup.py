@@ -0,0 +1,126 @@
+# startup.py
+# Cold-start cost of importing backend (what every Streamlit page pays on a
+# fresh container), measured with `python -X importtime` in clean subprocesses
+#
+#   python -m benchmarks.startup                   # run + compare with benchmarks/startup_baseline.json
+#   python -m benchmarks.startup --save-baseline   # run + overwrite the baseline
+import argparse
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+from typing import Dict, List, Tuple
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DEFAULT_BASELINE = os.path.join(ROOT, "benchmarks", "startup_baseline.json")
+
+# Must only be imported on first use (first question / first feedback),
+# never while the page is being rendered
+VENDOR_MODULES = (
+    "openai",
+    "langchain_openai",
+    "pinecone",
+    "langchain_pinecone",
+    "langsmith.client",
+    "langchain.chains",
+    "langchain_core.callbacks.manager",
+)
+
+
+def measure(module: str) -> Tuple[float, Dict[str, int]]:
+    """Import `module` in a fresh interpreter; (its cumulative ms, {module: cumulative us})"""
+    env = {
+        **os.environ,
+        "OPENAI_API_KEY": "sk-startup",
+        "PINECONE_API_KEY": "startup",
+        "GDPR_VECTOR_BACKEND": "local",
+        "GDPR_METRICS_PORT": "0",
+        "LANGSMITH_TRACING": "false",
+        "PYTHONDONTWRITEBYTECODE": "1",
+    }
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        cwd=ROOT, env=env, capture_output=True, text=True,
+    )
+    if proc.returncode != 0:
+        raise RuntimeError(f"import {module} failed:\n{proc.stderr[-2000:]}")
+    cumulative: Dict[str, int] = {}
+    for line in proc.stderr.splitlines():
+        # "import time:  self [us] | cumulative | imported package"
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cum, name = line[len("import time:"):].split("|", 2)
+        cumulative[name.strip()] = max(cumulative.get(name.strip(), 0), int(cum))
+    if module not in cumulative:
+        raise RuntimeError(f"No importtime entry for {module}")
+    return cumulative[module] / 1000, cumulative
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Import-time (cold start) benchmark of backend.py")
+    parser.add_argument("--module", default="backend", help="Module to import")
+    parser.add_argument("--runs", type=int, default=7, help="Fresh interpreters (median is reported)")
+    parser.add_argument("--top", type=int, default=10, help="Show the N most expensive imports")
+    parser.add_argument("--baseline", default=DEFAULT_BASELINE)
+    parser.add_argument("--save-baseline", action="store_true", help="Write results as the new baseline")
+    parser.add_argument("--tolerance", type=float, default=0.25, help="Allowed relative regression")
+    parser.add_argument("--slack-ms", type=float, default=50.0, help="Allowed absolute regression (ms)")
+    args = parser.parse_args()
+
+    # First run warms the bytecode / page cache and is not counted
+    measure(args.module)
+    timings: List[float] = []
+    for _ in range(args.runs):
+        import_ms, cumulative = measure(args.module)
+        timings.append(import_ms)
+
+    loaded_vendor = sorted(m for m in VENDOR_MODULES if m in cumulative)
+    results = {
+        "module": args.module,
+        "python": platform.python_version(),
+        "runs": args.runs,
+        "import_ms_p50": round(statistics.median(timings), 1),
+        "import_ms_min": round(min(timings), 1),
+        "modules_loaded": len(cumulative),
+        "vendor_modules_loaded": loaded_vendor,
+    }
+
+    print(f"⏱️  import {args.module:<12} p50 {results['import_ms_p50']:>8.1f} ms  "
+          f"min {results['import_ms_min']:>8.1f} ms  {results['modules_loaded']} modules")
+    top_level = {name: us for name, us in cumulative.items() if name != args.module and "." not in name}
+    for name, us in sorted(top_level.items(), key=lambda kv: -kv[1])[:args.top]:
+        print(f"   {name:<28} {us / 1000:>8.1f} ms")
+
+    failed = False
+    if loaded_vendor:
+        print(f"❌ Vendor SDKs imported at startup: {', '.join(loaded_vendor)}")
+        failed = True
+
+    if args.save_baseline:
+        if failed:
+            return 1
+        with open(args.baseline, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+        print(f"✅ Baseline saved to {args.baseline}")
+        return 0
+
+    if not os.path.exists(args.baseline):
+        print(f"⚠️  No baseline at {args.baseline} (create one with --save-baseline)")
+        return 1 if failed else 0
+    with open(args.baseline, "r", encoding="utf-8") as f:
+        baseline = json.load(f)
+    limit = baseline["import_ms_p50"] * (1 + args.tolerance) + args.slack_ms
+    if results["import_ms_p50"] > limit:
+        print(f"❌ Startup regression: {results['import_ms_p50']} ms "
+              f"(baseline {baseline['import_ms_p50']} ms, limit {limit:.1f} ms)")
+        failed = True
+    if failed:
+        return 1
+    print("✅ No startup regressions against the baseline")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,5 +1,12 @@
 # home_app.py - Simple launcher that starts with the GDPR chatbot
 import streamlit as st
+from src.settings import get_settings
+
+# Opt-in (GDPR_WARMUP=true): build the QA chain and open the OpenAI / Pinecone
+# connections in the background while the first page renders (once per process)
+if get_settings().warmup:
+    from backend import start_warmup
+    start_warmup()
 
 # Configure the app to start with the GDPR chatbot as the main page
 pages = [
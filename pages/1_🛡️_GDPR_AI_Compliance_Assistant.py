@@ -2,17 +2,16 @@ import streamlit as st
 import streamlit.components.v1 as components
 from dotenv import load_dotenv
 import os
-import time
 import json
-import html
+import uuid
 from datetime import datetime
-from utils import export_chat
+from utils import EXPORT_FORMATS, RenderCache, export_chat, export_filename, new_message_id
 
 # Load environment variables
 load_dotenv()
 
 # from backend import ask_gdpr_question, ask_gdpr_question_with_memory, clear_memory, get_memory_state
-from backend import ask_gdpr_question_with_memory, clear_memory, get_memory_state
+from backend import stream_gdpr_question_with_memory, clear_memory, get_memory_state, get_warmup_status
 # feedback:
 from backend import submit_feedback_to_langsmith
 
@@ -81,6 +80,19 @@ if "current_chat" not in st.session_state:
 # Initialize feedback tracking
 if "feedback_given" not in st.session_state:
     st.session_state.feedback_given = {}
+# Per-browser-session id: keys this user's chain + memory in the backend
+if "session_id" not in st.session_state:
+    st.session_state.session_id = str(uuid.uuid4())
+# Per-message render payloads (copy widget, sources, export blocks), built once
+if "render_cache" not in st.session_state:
+    st.session_state.render_cache = RenderCache()
+render_cache = st.session_state.render_cache
+# Only the last CHAT_WINDOW_TURNS turns are rendered in full; older turns stay
+# collapsed (one-line previews on demand), so a rerun costs the same however
+# long the chat gets. "Load more" widens the window per chat.
+CHAT_WINDOW_TURNS = int(os.getenv("GDPR_CHAT_WINDOW_TURNS", "10"))
+if "history_window" not in st.session_state:
+    st.session_state.history_window = {}
 
 
 
@@ -142,35 +154,70 @@ with st.sidebar:
             # Don't modify current_chat directly - let the selectbox handle it
             st.rerun()
 
+    # Warm-up readiness (only shown when GDPR_WARMUP is on)
+    @st.fragment(run_every=1.0 if get_warmup_status()["state"] == "running" else None)
+    def _warmup_status():
+        status = get_warmup_status()
+        if status["state"] == "running":
+            st.caption(f"⏳ Warming up the assistant ({status['step'] or 'starting'})...")
+        elif status["state"] == "ready":
+            st.caption(f"✅ Assistant ready (warmed up in {sum(status['timings_ms'].values()) / 1000:.1f}s)")
+        elif status["state"] == "failed":
+            st.caption("⚠️ Warm-up failed, the first answer may take longer")
+        if st.session_state.get("warmup_state") == "running" and status["state"] != "running":
+            st.session_state.warmup_state = status["state"]
+            st.rerun()  # full rerun: stops the 1 s refresh
+        st.session_state.warmup_state = status["state"]
+
+    _warmup_status()
+
     # Memory controls
     st.markdown("---")
     st.markdown("**🧠 Memory Controls**")
     
     # Show memory state
-    memory_state = get_memory_state()
+    memory_state = get_memory_state(st.session_state.session_id)
     st.caption(f"Memory: {memory_state['message_count']} messages")
+    if memory_state.get("summarized_messages"):
+        st.caption(
+            f"{memory_state['summarized_messages']} older messages summarized "
+            f"({memory_state['tokens_saved']} tokens saved)"
+        )
     
     # Clear memory button
     if st.button("🧹 Clear Memory", use_container_width=True):
-        clear_memory()
+        clear_memory(st.session_state.session_id)
         st.success("Memory cleared!")
         st.rerun()
     
     # Export current chat download
     current_chat_name = st.session_state.current_chat
     if st.session_state.chats[current_chat_name]:  # Only show download if there are messages
-        export_bytes, export_filename = export_chat(
-            current_chat_name,
-            st.session_state.chats[current_chat_name],
-            project_description="GDPR & AI Compliance Assistant - Chat export",
-            author="Guillermo Fiallo-Montero",
-            url="https://github.com/GFiaMon/multilingual-gdpr-rag",
+        format_labels = {"txt": "TXT", "md": "Markdown", "jsonl": "JSONL"}
+        export_format = st.selectbox(
+            "Export format",
+            list(EXPORT_FORMATS),
+            format_func=format_labels.get,
+            key="export_format",
         )
+
+        def _build_export(chat_name=current_chat_name, chat_messages=st.session_state.chats[current_chat_name], fmt=export_format):
+            # Only runs when the download is clicked; message blocks are memoized
+            return export_chat(
+                chat_name,
+                chat_messages,
+                project_description="GDPR & AI Compliance Assistant - Chat export",
+                author="Guillermo Fiallo-Montero",
+                url="https://github.com/GFiaMon/multilingual-gdpr-rag",
+                fmt=fmt,
+                cache=render_cache,
+            )[0]
+
         st.download_button(
-            label="⬇️ Download chat TXT",
-            data=export_bytes,
-            file_name=export_filename,
-            mime="text/plain",
+            label=f"⬇️ Download chat {format_labels[export_format]}",
+            data=_build_export,
+            file_name=export_filename(current_chat_name, export_format),
+            mime=EXPORT_FORMATS[export_format][0],
             use_container_width=True,
         )
     else:
@@ -188,65 +235,45 @@ st.markdown(f"### {st.session_state.current_chat}")
 
 messages = st.session_state.chats[st.session_state.current_chat]
 
-# for msg in messages:
-for idx, msg in enumerate(messages):
+# Older turns: collapsed, previews only when asked for
+window_turns = st.session_state.history_window.get(st.session_state.current_chat, CHAT_WINDOW_TURNS)
+first_full = max(len(messages) - 2 * window_turns, 0)
+if first_full:
+    col_older, col_more = st.columns([3, 1])
+    with col_older:
+        show_older = st.toggle(
+            f"🗂️ {first_full} earlier messages",
+            key=f"show_older_{st.session_state.current_chat}",
+        )
+    with col_more:
+        if st.button("Load more", key=f"load_more_{st.session_state.current_chat}", use_container_width=True):
+            st.session_state.history_window[st.session_state.current_chat] = window_turns + CHAT_WINDOW_TURNS
+            st.rerun()
+    if show_older:
+        # One markdown element for all of them (no widgets, no iframes)
+        st.markdown("\n".join(render_cache.message_payload(m)["preview"] for m in messages[:first_full]))
+
+# Recent turns in full
+for msg in messages[first_full:]:
+    # Copy widget and source markdown are built once per message (stable ids)
+    payload = render_cache.message_payload(msg)
     with st.chat_message(msg["role"]):
         st.markdown(msg["content"])
         # Copy-to-clipboard for assistant messages (includes sources if available)
         if msg["role"] == "assistant":
-            _answer_text = (msg.get("content") or "")
-            _sources = msg.get("sources") or []
-            if _sources:
-                _sources_lines = []
-                for i, source in enumerate(_sources):
-                    _doc_name = source.get("document") or (source.get("metadata", {}) or {}).get("document_name")
-                    _page_num = source.get("page") or (source.get("metadata", {}) or {}).get("page_number") or (source.get("metadata", {}) or {}).get("page")
-                    _header = f"[{i+1}] {(_doc_name or 'Unknown document')}" + (f" — page {_page_num}" if _page_num is not None else "")
-                    _body = (source.get('content', '') or '')
-                    _sources_lines.append(f"{_header}\n{_body}")
-                _copy_plain = _answer_text + "\n\nSources:\n" + "\n\n".join(_sources_lines)
-            else:
-                _copy_plain = _answer_text
-            _suffix = str(int(time.time() * 1000))
-            _escaped_html = html.escape(_copy_plain)
-            components.html(
-                """
-                <div style=\"display:flex; justify-content:flex-end; margin: 4px 0;\">
-                  <button id=\"copy-btn-""" + _suffix + """\" style=\"font-size:12px; padding:4px 8px; cursor:pointer;\">📋 Copy</button>
-                </div>
-                <textarea id=\"copy-text-""" + _suffix + """\" style=\"position:absolute; left:-10000px; top:-10000px; white-space:pre;\">""" + _escaped_html + """</textarea>
-                <script>
-                (function(){
-                  var btn = document.getElementById('copy-btn-""" + _suffix + """');
-                  var txt = document.getElementById('copy-text-""" + _suffix + """');
-                  if(btn && txt){
-                    btn.addEventListener('click', async function(){
-                      try{
-                        await navigator.clipboard.writeText(txt.value);
-                        btn.textContent = '✅ Copied';
-                        setTimeout(function(){ btn.textContent = '📋 Copy'; }, 1200);
-                      }catch(e){
-                        btn.textContent = '⚠️ Failed';
-                      }
-                    });
-                  }
-                })();
-                </script>
-                """,
-                height=50,
-            )
+            components.html(payload["copy_html"], height=50)
             
                     # === FEEDBACK BUTTONS ===
             col_fb1, col_fb2 = st.columns([1, 1])
             with col_fb1:
-                if st.button("👍", key=f"thumbs_up_{idx}", use_container_width=True):
+                if st.button("👍", key=f"thumbs_up_{payload['id']}", use_container_width=True):
                     run_id = msg.get("run_id")
                     if run_id:
                         success = submit_feedback_to_langsmith(run_id, 1, "thumbs_up")
                         if success:
                             st.success("✅ Feedback submitted!")
                             # Prevent multiple submissions
-                            st.session_state.feedback_given[f"thumbs_up_{idx}"] = True
+                            st.session_state.feedback_given[f"thumbs_up_{payload['id']}"] = True
                         else:
                             st.error("❌ Failed to submit feedback")
                     else:
@@ -254,23 +281,24 @@ for idx, msg in enumerate(messages):
 
             
 
-        # Show sources for assistant messages
-        if msg["role"] == "assistant" and msg.get("sources"):
-            with st.expander("📚 Source Documents"):
-                for i, source in enumerate(msg["sources"]):
-                    doc_name = source.get("document") or (source.get("metadata", {}) or {}).get("document_name")
-                    page_num = source.get("page") or (source.get("metadata", {}) or {}).get("page_number") or (source.get("metadata", {}) or {}).get("page")
-                    header = f"**Source {i+1}:** {doc_name or 'Unknown document'}"
-                    if page_num is not None:
-                        header += f" — page {page_num}"
+        # Show sources for assistant messages: a toggle instead of an expander,
+        # so the source texts are only sent to the browser when opened
+        if msg["role"] == "assistant" and payload["sources"]:
+            if st.toggle(f"📚 Source Documents ({len(payload['sources'])})", key=f"sources_{payload['id']}"):
+                for header, body in payload["sources"]:
                     st.markdown(header)
-                    st.markdown((source.get('content', '') or '').replace('\n', '  \n'))
+                    st.markdown(body)
                     st.markdown("---")
 
 # Chat input
 if prompt := st.chat_input("Ask about GDPR compliance..."):
     # Add user message to chat history
-    messages.append({"role": "user", "content": prompt, "timestamp": datetime.utcnow().isoformat(timespec="seconds") + "Z"})
+    messages.append({
+        "id": new_message_id(),
+        "role": "user",
+        "content": prompt,
+        "timestamp": datetime.utcnow().isoformat(timespec="seconds") + "Z",
+    })
     
     # Display user message
     with st.chat_message("user"):
@@ -282,56 +310,42 @@ if prompt := st.chat_input("Ask about GDPR compliance..."):
         thinking_placeholder = st.empty()
         thinking_placeholder.markdown("🤔 Thinking...")
         
-        # Get response from backend
-        
-        # # TO (with memory):
-        response = ask_gdpr_question_with_memory(prompt, show_sources=True)
+        # Stream the answer from the backend: retrieval first, then tokens
+        response = {}
+
+        def _answer_tokens():
+            first_token = True
+            for event in stream_gdpr_question_with_memory(
+                prompt, show_sources=True, session_id=st.session_state.session_id
+            ):
+                if event["type"] == "retrieval":
+                    thinking_placeholder.markdown(f"📚 Found {len(event['sources'])} relevant sources, writing answer...")
+                elif event["type"] == "token":
+                    if first_token:
+                        thinking_placeholder.empty()
+                        first_token = False
+                    yield event["text"]
+                elif event["type"] == "done":
+                    response.update(event["response"])
 
         # Display answer
-        thinking_placeholder.markdown(response["answer"])
+        st.write_stream(_answer_tokens())
+        thinking_placeholder.empty()
         
+        # Assistant message as it will be stored; its id keeps the copy widget
+        # identical on the following reruns (rendered from the cache there)
+        assistant_msg = {
+            "id": new_message_id(),
+            "role": "assistant",
+            "content": response["answer"],
+            "sources": response["sources"],
+            "run_id": response.get("run_id"),  # Add this line to store the run_id
+            "timestamp": datetime.utcnow().isoformat(timespec="seconds") + "Z",
+        }
+        payload = render_cache.message_payload(assistant_msg)
+
         # Copy-to-clipboard button for the latest assistant answer (includes sources if available)
-        _latest_answer = response.get("answer") or ""
-        _latest_sources = response.get("sources") or []
-        if _latest_sources:
-            _latest_sources_lines = []
-            for i, source in enumerate(_latest_sources):
-                _doc_name = source.get("document") or (source.get("metadata", {}) or {}).get("document_name")
-                _page_num = source.get("page") or (source.get("metadata", {}) or {}).get("page_number") or (source.get("metadata", {}) or {}).get("page")
-                _header = f"[{i+1}] {(_doc_name or 'Unknown document')}" + (f" — page {_page_num}" if _page_num is not None else "")
-                _body = (source.get('content', '') or '')
-                _latest_sources_lines.append(f"{_header}\n{_body}")
-            _copy_latest_plain = _latest_answer + "\n\nSources:\n" + "\n\n".join(_latest_sources_lines)
-        else:
-            _copy_latest_plain = _latest_answer
-        _suffix2 = str(int(time.time() * 1000))
-        _escaped_html_resp = html.escape(_copy_latest_plain)
-        components.html(
-            """
-            <div style=\"display:flex; justify-content:flex-end; margin: 4px 0;\">
-              <button id=\"copy-btn-""" + _suffix2 + """\" style=\"font-size:12px; padding:4px 8px; cursor:pointer;\">📋 Copy</button>
-            </div>
-            <textarea id=\"copy-text-""" + _suffix2 + """\" style=\"position:absolute; left:-10000px; top:-10000px; white-space:pre;\">""" + _escaped_html_resp + """</textarea>
-            <script>
-            (function(){
-              var btn = document.getElementById('copy-btn-""" + _suffix2 + """');
-              var txt = document.getElementById('copy-text-""" + _suffix2 + """');
-              if(btn && txt){
-                btn.addEventListener('click', async function(){
-                  try{
-                    await navigator.clipboard.writeText(txt.value);
-                    btn.textContent = '✅ Copied';
-                    setTimeout(function(){ btn.textContent = '📋 Copy'; }, 1200);
-                  }catch(e){
-                    btn.textContent = '⚠️ Failed';
-                  }
-                });
-              }
-            })();
-            </script>
-            """,
-            height=50,
-        )
+        components.html(payload["copy_html"], height=50)
 
         # === feedback buttons for the latest response ===
         col_fb1, col_fb2, col_fb3 = st.columns([1, 1, 6])
@@ -359,26 +373,14 @@ if prompt := st.chat_input("Ask about GDPR compliance..."):
                     st.warning("⚠️ No run_id available for feedback")
 
         # Display sources in expander
-        if response["sources"]:
-            with st.expander(f"📚 Source Documents ({len(response['sources'])})"):
-                for i, source in enumerate(response["sources"]):
-                    doc_name = source.get("document") or (source.get("metadata", {}) or {}).get("document_name")
-                    page_num = source.get("page") or (source.get("metadata", {}) or {}).get("page_number") or (source.get("metadata", {}) or {}).get("page")
-                    header = f"**Source {i+1}:** {doc_name or 'Unknown document'}"
-                    if page_num is not None:
-                        header += f" — page {page_num}"
+        if payload["sources"]:
+            with st.expander(f"📚 Source Documents ({len(payload['sources'])})"):
+                for header, body in payload["sources"]:
                     st.markdown(header)
-                    # Preserve original line breaks in normal font
-                    st.markdown((source.get('content', '') or '').replace('\n', '  \n'))
+                    st.markdown(body)
                     st.markdown("---")
     
     # Add assistant response to chat history
-    messages.append({
-        "role": "assistant",
-        "content": response["answer"],
-        "sources": response["sources"],
-        "run_id": response.get("run_id"),  # Add this line to store the run_id
-        "timestamp": datetime.utcnow().isoformat(timespec="seconds") + "Z",
-    })
+    messages.append(assistant_msg)
     # Persist back to session state (not strictly necessary but explicit)
     st.session_state.chats[st.session_state.current_chat] = messages
\ No newline at end of file
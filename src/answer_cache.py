@@ -0,0 +1,282 @@
+# answer_cache.py
+# Semantic answer cache: reuse answers for near-duplicate questions
+import hashlib
+import threading
+import time
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+from langchain_core.documents import Document
+from langchain.chains.combine_documents.base import BaseCombineDocumentsChain
+
+
+def document_key(doc: Document) -> str:
+    """Stable identifier of a retrieved chunk (vector id, else document + chunk id, else content hash)"""
+    if getattr(doc, "id", None):
+        return str(doc.id)
+    metadata = doc.metadata or {}
+    if metadata.get("chunk_id") is not None:
+        return f"{metadata.get('document_name')}:{metadata.get('chunk_id')}"
+    return hashlib.sha1(doc.page_content.encode("utf-8")).hexdigest()
+
+
+def history_key(chat_history: Any) -> str:
+    """Fingerprint of the conversation so far ("" for a fresh conversation)"""
+    if not chat_history:
+        return ""
+    return hashlib.sha256(str(chat_history).encode("utf-8")).hexdigest()
+
+
+@dataclass
+class CachedAnswer:
+    question: str
+    answer: str
+    doc_keys: Tuple[str, ...]
+    history_key: str
+    sources: Optional[List[Dict]] = None
+    hits: int = 0
+
+
+class SemanticAnswerCache:
+    """
+    Stores (question embedding, answer, retrieved chunk ids) and serves the
+    answer again when a new question is similar enough.
+
+    A cached answer is only returned when ALL of these hold:
+      - cosine similarity >= threshold
+      - the retrieved chunk ids are identical (same grounding)
+      - the chat-history fingerprint is identical (never across contexts)
+      - the entry is younger than ttl seconds
+
+    Question vectors live in one contiguous float32 matrix so a lookup is a
+    single matrix-vector product. When full, the least recently used entry
+    is replaced.
+
+    With a version_source (returns the current index version, or None when
+    unknown), lookups check it at most every version_check_interval seconds
+    and drop all answers once the version changes (re-ingested index).
+    """
+
+    def __init__(
+        self,
+        threshold: float = 0.95,
+        ttl: float = 24 * 3600,
+        max_entries: int = 1000,
+        version_source: Optional[Callable[[], Optional[str]]] = None,
+        version_check_interval: float = 30.0,
+    ):
+        self.threshold = threshold
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.index_version: Optional[str] = None
+        self.version_source = version_source
+        self.version_check_interval = version_check_interval
+        self._version_checked = 0.0
+
+        self._lock = threading.Lock()
+        self._vectors: Optional[np.ndarray] = None  # (capacity, dim), rows L2-normalized
+        self._created = np.zeros(0, dtype=np.float64)
+        self._last_used = np.zeros(0, dtype=np.float64)
+        self._active = np.zeros(0, dtype=bool)
+        self._entries: List[Optional[CachedAnswer]] = []
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    # ---------------------------
+    # Storage helpers
+    # ---------------------------
+    @staticmethod
+    def _normalize(vector: Sequence[float]) -> np.ndarray:
+        v = np.asarray(vector, dtype=np.float32)
+        norm = np.linalg.norm(v)
+        return v / norm if norm > 0 else v
+
+    def _grow(self, dim: int):
+        old_capacity = len(self._entries)
+        capacity = min(max(16, old_capacity * 2), self.max_entries)
+        vectors = np.zeros((capacity, dim), dtype=np.float32)
+        if self._vectors is not None:
+            vectors[:old_capacity] = self._vectors
+        self._vectors = vectors
+        self._created = np.resize(self._created, capacity)
+        self._last_used = np.resize(self._last_used, capacity)
+        active = np.zeros(capacity, dtype=bool)
+        active[:old_capacity] = self._active
+        self._active = active
+        self._entries.extend([None] * (capacity - old_capacity))
+
+    def _expire(self, now: float):
+        if self.ttl and self._active.any():
+            expired = self._active & (self._created < now - self.ttl)
+            for slot in np.flatnonzero(expired):
+                self._entries[slot] = None
+            self._active &= ~expired
+
+    def _free_slot(self, dim: int) -> int:
+        if self._vectors is None or self._vectors.shape[1] != dim:
+            # First entry, or the embedding model changed: start over
+            self._vectors = None
+            self._created = np.zeros(0, dtype=np.float64)
+            self._last_used = np.zeros(0, dtype=np.float64)
+            self._active = np.zeros(0, dtype=bool)
+            self._entries = []
+            self._grow(dim)
+        free = np.flatnonzero(~self._active)
+        if free.size:
+            return int(free[0])
+        if len(self._entries) < self.max_entries:
+            slot = len(self._entries)
+            self._grow(dim)
+            return slot
+        # Full: evict the least recently used entry
+        slot = int(np.argmin(np.where(self._active, self._last_used, np.inf)))
+        self.evictions += 1
+        return slot
+
+    # ---------------------------
+    # Public API
+    # ---------------------------
+    def check_version(self, force: bool = False):
+        """Invalidate if the version_source reports a different index version"""
+        now = time.monotonic()
+        if self.version_source is None or (not force and now - self._version_checked < self.version_check_interval):
+            return
+        self._version_checked = now
+        try:
+            version = self.version_source()
+        except Exception as e:
+            print(f"⚠️  Could not read the index version: {e}")
+            return
+        if version is not None:
+            self.invalidate(version)
+
+    def lookup(self, query_vector: Sequence[float], doc_keys: Sequence[str], chat_history_key: str = "") -> Optional[CachedAnswer]:
+        """Return a cached answer for this question/grounding/history, or None"""
+        self.check_version()
+        with self._lock:
+            if self._vectors is None or not self._active.any():
+                self.misses += 1
+                return None
+            now = time.time()
+            self._expire(now)
+            q = self._normalize(query_vector)
+            if q.shape[0] != self._vectors.shape[1]:
+                self.misses += 1
+                return None
+            scores = self._vectors @ q
+            scores[~self._active] = -1.0
+            candidates = np.flatnonzero(scores >= self.threshold)
+            wanted_docs = tuple(doc_keys)
+            # Best match first; history/grounding checks are cheap python compares
+            for slot in candidates[np.argsort(-scores[candidates])]:
+                entry = self._entries[slot]
+                if entry is None:
+                    continue
+                if entry.history_key == chat_history_key and entry.doc_keys == wanted_docs:
+                    entry.hits += 1
+                    self._last_used[slot] = now
+                    self.hits += 1
+                    return entry
+            self.misses += 1
+            return None
+
+    def store(
+        self,
+        query_vector: Sequence[float],
+        question: str,
+        answer: str,
+        doc_keys: Sequence[str],
+        chat_history_key: str = "",
+        sources: Optional[List[Dict]] = None,
+    ):
+        """Add an answer to the cache"""
+        if not answer:
+            return
+        q = self._normalize(query_vector)
+        with self._lock:
+            slot = self._free_slot(q.shape[0])
+            now = time.time()
+            self._vectors[slot] = q
+            self._created[slot] = now
+            self._last_used[slot] = now
+            self._active[slot] = True
+            self._entries[slot] = CachedAnswer(
+                question=question,
+                answer=answer,
+                doc_keys=tuple(doc_keys),
+                history_key=chat_history_key,
+                sources=sources,
+            )
+
+    def invalidate(self, index_version: Optional[str] = None):
+        """
+        Drop all cached answers. Call this whenever the index content changes;
+        passing an index_version only clears when it differs from the last one.
+        """
+        with self._lock:
+            if index_version is not None and index_version == self.index_version:
+                return
+            self.index_version = index_version
+            if self._vectors is not None:
+                self._active[:] = False
+                self._entries = [None] * len(self._entries)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": int(self._active.sum()),
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "evictions": self.evictions,
+                "threshold": self.threshold,
+                "index_version": self.index_version,
+            }
+
+
+class CachedCombineDocsChain(BaseCombineDocumentsChain):
+    """
+    Drop-in replacement for the "stuff" combine-docs chain of
+    ConversationalRetrievalChain. Retrieval has already happened when this
+    runs, so the cache can compare the retrieved chunk ids; on a hit the
+    LLM call is skipped entirely.
+    """
+
+    combine_docs_chain: BaseCombineDocumentsChain
+    cache: Any
+    embeddings: Any
+
+    def _cache_args(self, docs: List[Document], kwargs: Dict[str, Any]):
+        question = kwargs.get("question", "")
+        chat_history = history_key(kwargs.get("chat_history"))
+        doc_keys = [document_key(d) for d in docs]
+        return question, chat_history, doc_keys
+
+    def combine_docs(self, docs: List[Document], callbacks=None, **kwargs: Any) -> Tuple[str, dict]:
+        question, chat_history, doc_keys = self._cache_args(docs, kwargs)
+        # Retrieval just embedded this question, so this is an embedding cache hit
+        query_vector = self.embeddings.embed_query(question)
+        cached = self.cache.lookup(query_vector, doc_keys, chat_history)
+        if cached is not None:
+            return cached.answer, {"answer_cache_hit": True}
+        answer, extra = self.combine_docs_chain.combine_docs(docs, callbacks=callbacks, **kwargs)
+        self.cache.store(query_vector, question, answer, doc_keys, chat_history)
+        return answer, extra
+
+    async def acombine_docs(self, docs: List[Document], callbacks=None, **kwargs: Any) -> Tuple[str, dict]:
+        question, chat_history, doc_keys = self._cache_args(docs, kwargs)
+        query_vector = await self.embeddings.aembed_query(question)
+        cached = self.cache.lookup(query_vector, doc_keys, chat_history)
+        if cached is not None:
+            return cached.answer, {"answer_cache_hit": True}
+        answer, extra = await self.combine_docs_chain.acombine_docs(docs, callbacks=callbacks, **kwargs)
+        self.cache.store(query_vector, question, answer, doc_keys, chat_history)
+        return answer, extra
+
+    @property
+    def _chain_type(self) -> str:
+        return "cached_combine_docs"
@@ -0,0 +1,175 @@
+# async_worker.py
+# asyncio worker that answers many sessions' questions concurrently
+import asyncio
+import concurrent.futures
+import threading
+from collections import deque
+from dataclasses import dataclass
+from typing import Any, Awaitable, Callable, Deque, Dict, Iterable, List, Optional, Tuple
+
+
+@dataclass
+class _Job:
+    question: str
+    session_id: str
+    kwargs: Dict[str, Any]
+    future: "asyncio.Future"
+
+
+@dataclass
+class WorkerStats:
+    submitted: int = 0
+    completed: int = 0
+    failed: int = 0
+    in_flight: int = 0
+    peak_in_flight: int = 0
+
+
+class AsyncQAWorker:
+    """
+    Runs an async ask function (e.g. backend.aask_gdpr_question_with_memory)
+    for questions from many sessions, at most `concurrency` at a time.
+
+    Questions of the same session are answered strictly in submission order
+    (they share one conversation memory); different sessions run in parallel.
+    Each session has its own queue, and only sessions with no question in
+    flight are dispatched, so a worker never sits idle waiting for a busy one.
+
+    Use it from async code:
+        worker = AsyncQAWorker(aask_gdpr_question_with_memory, concurrency=16)
+        await worker.start()
+        response = await worker.ask("Was ist die DSGVO?", session_id="abc")
+
+    or from sync code (Streamlit), on its own event-loop thread:
+        worker.start_background()
+        response = worker.submit_threadsafe("Was ist die DSGVO?", "abc").result()
+    """
+
+    def __init__(
+        self,
+        ask_fn: Callable[..., Awaitable[Dict]],
+        concurrency: int = 8,
+        max_queue: int = 1000,
+    ):
+        self.ask_fn = ask_fn
+        self.concurrency = concurrency
+        self.max_queue = max_queue
+        self.stats = WorkerStats()
+
+        # Ready sessions (ids), each at most once and never while one of its jobs runs
+        self._queue: Optional[asyncio.Queue] = None
+        self._slots: Optional[asyncio.Semaphore] = None
+        self._tasks: List[asyncio.Task] = []
+        self._session_jobs: Dict[str, Deque[_Job]] = {}
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._thread: Optional[threading.Thread] = None
+
+    # ---------------------------
+    # Lifecycle
+    # ---------------------------
+    async def start(self):
+        if self._tasks:
+            return
+        self._loop = asyncio.get_running_loop()
+        self._queue = asyncio.Queue()
+        self._slots = asyncio.Semaphore(self.max_queue)
+        self._tasks = [asyncio.create_task(self._run(), name=f"qa-worker-{i}") for i in range(self.concurrency)]
+
+    async def stop(self):
+        """Finish queued questions, then stop the worker tasks"""
+        if not self._tasks:
+            return
+        await self._queue.join()
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    def start_background(self) -> asyncio.AbstractEventLoop:
+        """Start the worker on a dedicated event-loop thread (for sync callers)"""
+        if self._thread is not None:
+            return self._loop
+        ready = threading.Event()
+
+        def _serve():
+            loop = asyncio.new_event_loop()
+            asyncio.set_event_loop(loop)
+            loop.run_until_complete(self.start())
+            ready.set()
+            loop.run_forever()
+
+        self._thread = threading.Thread(target=_serve, name="qa-async-worker", daemon=True)
+        self._thread.start()
+        ready.wait()
+        return self._loop
+
+    def stop_background(self, timeout: Optional[float] = None):
+        if self._thread is None:
+            return
+        asyncio.run_coroutine_threadsafe(self.stop(), self._loop).result(timeout)
+        self._loop.call_soon_threadsafe(self._loop.stop)
+        self._thread.join(timeout)
+        self._thread = None
+
+    # ---------------------------
+    # Submitting work
+    # ---------------------------
+    async def ask(self, question: str, session_id: str, **kwargs: Any) -> Dict:
+        """Queue a question and wait for its response dict"""
+        if not self._tasks:
+            await self.start()
+        future = asyncio.get_running_loop().create_future()
+        await self._slots.acquire()  # back-pressure: at most max_queue questions waiting or running
+        jobs = self._session_jobs.get(session_id)
+        if jobs is None:
+            # Idle session: make it ready
+            jobs = self._session_jobs[session_id] = deque()
+            self._queue.put_nowait(session_id)
+        jobs.append(_Job(question, session_id, kwargs, future))
+        self.stats.submitted += 1
+        return await future
+
+    async def ask_many(self, items: Iterable[Tuple[str, str]], **kwargs: Any) -> List[Dict]:
+        """Answer (question, session_id) pairs concurrently; results keep input order"""
+        return await asyncio.gather(*(self.ask(q, sid, **kwargs) for q, sid in items))
+
+    def submit_threadsafe(self, question: str, session_id: str, **kwargs: Any) -> concurrent.futures.Future:
+        """From any thread: schedule a question on the background loop"""
+        if self._loop is None or self._thread is None:
+            raise RuntimeError("Call start_background() first")
+        return asyncio.run_coroutine_threadsafe(self.ask(question, session_id, **kwargs), self._loop)
+
+    # ---------------------------
+    # Worker loop
+    # ---------------------------
+    async def _run(self):
+        while True:
+            session_id = await self._queue.get()
+            jobs = self._session_jobs[session_id]
+            job = jobs.popleft()
+            try:
+                self.stats.in_flight += 1
+                self.stats.peak_in_flight = max(self.stats.peak_in_flight, self.stats.in_flight)
+                try:
+                    result = await self.ask_fn(job.question, session_id=job.session_id, **job.kwargs)
+                finally:
+                    self.stats.in_flight -= 1
+                if not job.future.done():
+                    job.future.set_result(result)
+                self.stats.completed += 1
+            except asyncio.CancelledError:
+                if not job.future.done():
+                    job.future.cancel()
+                raise
+            except Exception as e:
+                self.stats.failed += 1
+                if not job.future.done():
+                    job.future.set_exception(e)
+            finally:
+                self._slots.release()
+                if jobs:
+                    # Back of the line, so a busy session doesn't starve the others
+                    self._queue.put_nowait(session_id)
+                else:
+                    self._session_jobs.pop(session_id, None)
+                self._queue.task_done()
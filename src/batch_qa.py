@@ -0,0 +1,202 @@
+# batch_qa.py
+# Bulk question answering for evaluation runs: concurrent retrieval, bounded
+# LLM parallelism with rate-limit backoff, incremental CSV / JSONL output
+import argparse
+import asyncio
+import csv
+import json
+import os
+import random
+import time
+import uuid
+from typing import Any, Awaitable, Callable, Dict, Iterable, List, Optional
+
+# Same column layout as docs/german_experiment_results.csv (LangSmith export)
+RESULT_COLUMNS = [
+    "inputs.question",
+    "outputs.answer",
+    "outputs.sources",
+    "error",
+    "reference.answer",
+    "feedback.german_relevance",
+    "feedback.groundedness",
+    "execution_time",
+    "example_id",
+    "id",
+]
+
+_RETRYABLE_NAMES = {"RateLimitError", "APITimeoutError", "APIConnectionError", "InternalServerError"}
+
+
+def normalize_items(questions: Iterable[Any]) -> List[Dict[str, Any]]:
+    """Accept plain strings or dicts with question / reference / example_id"""
+    items = []
+    for position, q in enumerate(questions):
+        if isinstance(q, str):
+            q = {"question": q}
+        items.append({
+            "question": q.get("question") or q.get("inputs.question", ""),
+            "reference": q.get("reference") or q.get("reference.answer", ""),
+            "example_id": q.get("example_id") or str(position + 1),
+        })
+    return items
+
+
+def load_questions(path: str) -> List[Dict[str, Any]]:
+    """Questions from .txt (one per line), .jsonl or .csv (question / inputs.question column)"""
+    ext = os.path.splitext(path)[1].lower()
+    with open(path, "r", encoding="utf-8-sig") as f:
+        if ext == ".jsonl":
+            rows = [json.loads(line) for line in f if line.strip()]
+        elif ext == ".csv":
+            rows = list(csv.DictReader(f))
+        else:
+            rows = [line.strip() for line in f if line.strip() and not line.startswith("#")]
+    return normalize_items(rows)
+
+
+def is_retryable(error: Exception) -> bool:
+    """Rate limits, timeouts and 5xx from the OpenAI client are worth retrying"""
+    return type(error).__name__ in _RETRYABLE_NAMES or getattr(error, "status_code", None) in (429, 500, 502, 503)
+
+
+def retry_delay(error: Exception, attempt: int, base: float = 1.0, cap: float = 30.0) -> float:
+    """Retry-After header if the API sent one, else exponential backoff with full jitter"""
+    response = getattr(error, "response", None)
+    headers = getattr(response, "headers", None) or {}
+    retry_after = headers.get("retry-after") if hasattr(headers, "get") else None
+    if retry_after:
+        try:
+            return min(float(retry_after), cap)
+        except ValueError:
+            pass
+    return random.uniform(0, min(cap, base * 2 ** attempt))
+
+
+async def with_backoff(call: Callable[[], Awaitable[Any]], max_retries: int = 5) -> Any:
+    attempt = 0
+    while True:
+        try:
+            return await call()
+        except Exception as e:
+            if attempt >= max_retries or not is_retryable(e):
+                raise
+            await asyncio.sleep(retry_delay(e, attempt))
+            attempt += 1
+
+
+class ResultWriter:
+    """Appends one row per finished question (CSV or JSONL by file extension)"""
+
+    def __init__(self, path: str):
+        self.path = path
+        self.jsonl = path.lower().endswith(".jsonl")
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        if self.jsonl:
+            self._file = open(path, "w", encoding="utf-8")
+        else:
+            # utf-8-sig like the notebook export, so Excel shows umlauts
+            self._file = open(path, "w", encoding="utf-8-sig", newline="")
+            self._csv = csv.DictWriter(self._file, fieldnames=RESULT_COLUMNS)
+            self._csv.writeheader()
+
+    def write(self, row: Dict[str, Any]):
+        if self.jsonl:
+            self._file.write(json.dumps(row, ensure_ascii=False, default=str) + "\n")
+        else:
+            self._csv.writerow({k: row.get(k, "") for k in RESULT_COLUMNS})
+        self._file.flush()
+
+    def close(self):
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def result_row(item: Dict[str, Any], response: Optional[Dict], error: Optional[str], seconds: float) -> Dict[str, Any]:
+    response = response or {}
+    return {
+        "inputs.question": item["question"],
+        "outputs.answer": response.get("answer", ""),
+        # Same repr as the LangSmith/pandas export of the source dicts
+        "outputs.sources": str(response.get("sources", [])),
+        "error": error or "",
+        "reference.answer": item.get("reference", ""),
+        "feedback.german_relevance": "",
+        "feedback.groundedness": "",
+        "execution_time": round(seconds, 3),
+        "example_id": item["example_id"],
+        "id": response.get("run_id") or str(uuid.uuid4()),
+    }
+
+
+async def run_batch(
+    items: List[Dict[str, Any]],
+    retrieve: Callable[[str], Awaitable[Any]],
+    answer: Callable[[Dict[str, Any], Any], Awaitable[Dict]],
+    retrieval_concurrency: int = 16,
+    llm_concurrency: int = 8,
+    max_retries: int = 5,
+    on_row: Optional[Callable[[Dict[str, Any]], None]] = None,
+) -> List[Dict[str, Any]]:
+    """
+    Run retrieve(question) and answer(item, retrieved) for every item.
+    Retrieval and LLM calls have separate concurrency limits; each item moves
+    on to its LLM call as soon as its own retrieval is done. Rows come back in
+    input order; on_row sees them in completion order.
+    """
+    retrieval_slots = asyncio.Semaphore(retrieval_concurrency)
+    llm_slots = asyncio.Semaphore(llm_concurrency)
+
+    async def _one(item: Dict[str, Any]) -> Dict[str, Any]:
+        started = time.perf_counter()
+        response, error = None, None
+        try:
+            async with retrieval_slots:
+                retrieved = await with_backoff(lambda: retrieve(item["question"]), max_retries)
+            async with llm_slots:
+                response = await with_backoff(lambda: answer(item, retrieved), max_retries)
+        except Exception as e:
+            error = f"{type(e).__name__}: {e}"
+        row = result_row(item, response, error, time.perf_counter() - started)
+        if on_row is not None:
+            on_row(row)
+        return row
+
+    return await asyncio.gather(*(_one(item) for item in items))
+
+
+# ---------------------------
+# CLI: python -m src.batch_qa questions.txt --out results.csv
+# ---------------------------
+def main():
+    parser = argparse.ArgumentParser(description="Answer a file of questions in bulk (evaluation runs)")
+    parser.add_argument("questions", help=".txt (one per line), .jsonl or .csv with a question column")
+    parser.add_argument("--out", default="batch_results.csv", help="Output .csv or .jsonl")
+    parser.add_argument("--llm-concurrency", type=int, default=8)
+    parser.add_argument("--retrieval-concurrency", type=int, default=16)
+    parser.add_argument("--max-retries", type=int, default=5)
+    args = parser.parse_args()
+
+    from backend import ask_gdpr_questions_batch
+
+    items = load_questions(args.questions)
+    started = time.perf_counter()
+    rows = ask_gdpr_questions_batch(
+        items,
+        output_path=args.out,
+        llm_concurrency=args.llm_concurrency,
+        retrieval_concurrency=args.retrieval_concurrency,
+        max_retries=args.max_retries,
+    )
+    seconds = time.perf_counter() - started
+    failed = sum(1 for r in rows if r["error"])
+    print(f"✅ {len(rows)} questions in {seconds:.1f}s ({len(rows) / max(seconds, 1e-9):.1f}/s), {failed} failed -> {args.out}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,292 @@
+# condense.py
+# Cheaper question condensing: skip, cache or speculate around the rewrite LLM call
+import asyncio
+import hashlib
+import re
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Any, Dict, List, Optional, Tuple
+
+from langchain_core.callbacks import (
+    AsyncCallbackManagerForChainRun,
+    AsyncCallbackManagerForRetrieverRun,
+    CallbackManagerForChainRun,
+    CallbackManagerForRetrieverRun,
+)
+from langchain_core.documents import Document
+from langchain_core.retrievers import BaseRetriever
+from langchain.chains.llm import LLMChain
+
+from src.embedding_cache import normalize_text
+
+_TOKEN_RE = re.compile(r"\w+", re.UNICODE)
+
+# Words that point back to an earlier turn (German + English)
+_REFERRING_WORDS = {
+    # German
+    "dies", "diese", "dieser", "dieses", "diesem", "diesen",
+    "dazu", "davon", "darüber", "dafür", "dabei", "damit", "darauf", "daran", "darin", "dagegen",
+    "dort", "es", "er", "sie", "ihr", "ihre", "ihren", "ihrem", "ihn", "ihm", "jene", "jener", "jenes",
+    "oben", "obige", "obigen", "vorher", "vorhin", "genannt", "genannte", "genannten",
+    "erwähnt", "erwähnte", "erwähnten", "gleiche", "gleichen", "selbe", "selben", "vorherige", "letzte",
+    "sonst", "weitere", "weiteren", "nochmal",
+    # English
+    "it", "its", "this", "that", "these", "those", "they", "them", "their", "there",
+    "he", "she", "him", "her", "above", "previous", "earlier", "mentioned", "same",
+    "former", "latter", "else", "again", "another",
+}
+
+# Openers of follow-ups like "Und für Vereine?" / "What about fines?"
+_CONTINUATION_OPENERS = (
+    "und ", "aber ", "oder ", "also ", "auch ", "was ist mit ", "wie ist es mit ", "wie sieht es ",
+    "and ", "but ", "or ", "so ", "also ", "what about ", "how about ", "same ",
+)
+
+# Fixed expressions whose "es" doesn't refer to anything
+_EXPLETIVE_RE = re.compile(r"\b(gibt es|es gibt|geht es um|es geht um)\b", re.IGNORECASE)
+
+MIN_STANDALONE_WORDS = 4
+
+_condense_stats = {"skipped": 0, "rewritten": 0}
+
+
+def needs_rewrite(question: str) -> bool:
+    """
+    Fast check whether a follow-up question depends on earlier turns.
+    Errs on the side of True: a needless rewrite only costs the old latency,
+    a skipped one would retrieve with an incomplete question.
+    """
+    text = " ".join((question or "").split())
+    lowered = _EXPLETIVE_RE.sub(" ", text.lower())
+    if lowered.startswith(_CONTINUATION_OPENERS):
+        return True
+
+    tokens = _TOKEN_RE.findall(text)
+    if len(tokens) < MIN_STANDALONE_WORDS:
+        return True
+
+    for position, token in enumerate(tokens):
+        word = token.lower()
+        if word == "das":
+            # Article before a (capitalized) German noun, e.g. "das BDSG", is fine;
+            # the pronoun ("Gilt das auch ...") refers back
+            following = tokens[position + 1] if position + 1 < len(tokens) else ""
+            if not following[:1].isupper():
+                return True
+        elif word in _REFERRING_WORDS and re.search(rf"\b{re.escape(word)}\b", lowered):
+            return True
+    return False
+
+
+def _same_question(a: str, b: str) -> bool:
+    return normalize_text(a).rstrip("?!. ") == normalize_text(b).rstrip("?!. ")
+
+
+class RewriteCache:
+    """
+    LRU (+ TTL) of condensed questions, keyed by the question and the
+    conversation it was condensed against. Thread-safe; shared by all sessions.
+    """
+
+    def __init__(self, max_entries: int = 1000, ttl: float = 3600.0):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries: "OrderedDict[str, Tuple[str, float]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def key(question: str, chat_history: str) -> str:
+        raw = f"{normalize_text(question)}\0{chat_history or ''}"
+        return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+    def get(self, question: str, chat_history: str) -> Optional[str]:
+        key = self.key(question, chat_history)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or time.time() - entry[1] > self.ttl:
+                self._entries.pop(key, None)
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[0]
+
+    def put(self, question: str, chat_history: str, rewritten: str):
+        key = self.key(question, chat_history)
+        with self._lock:
+            self._entries[key] = (rewritten, time.time())
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {"entries": len(self._entries), "hits": self.hits, "misses": self.misses}
+
+
+class SpeculativeRetriever(BaseRetriever):
+    """
+    Wraps a retriever so a search can be started early (prefetch) and picked
+    up later by the chain's normal retrieval call for the same query.
+    Unclaimed prefetches expire after max_age seconds.
+    """
+
+    retriever: BaseRetriever
+    max_age: float = 30.0
+    max_workers: int = 4
+
+    _pending: Dict[str, Tuple[Future, float]]
+    _apending: Dict[str, Tuple["asyncio.Task", float]]
+    _lock: threading.Lock
+    _executor: ThreadPoolExecutor
+    _stats: Dict[str, int]
+
+    def __init__(self, **kwargs: Any):
+        super().__init__(**kwargs)
+        self._pending = {}
+        self._apending = {}
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="speculative-retrieval")
+        self._stats = {"prefetched": 0, "used": 0, "wasted": 0}
+
+    @staticmethod
+    def _key(query: str) -> str:
+        return normalize_text(query).rstrip("?!. ")
+
+    def _prune(self, pending: Dict[str, Tuple[Any, float]]):
+        now = time.monotonic()
+        for key in [k for k, (_, started) in pending.items() if now - started > self.max_age]:
+            pending.pop(key)[0].cancel()
+            self._stats["wasted"] += 1
+
+    # ---------------------------
+    # Prefetch
+    # ---------------------------
+    def prefetch(self, query: str):
+        """Start retrieving `query` on a worker thread"""
+        key = self._key(query)
+        with self._lock:
+            self._prune(self._pending)
+            if key not in self._pending:
+                self._pending[key] = (self._executor.submit(self.retriever.invoke, query), time.monotonic())
+                self._stats["prefetched"] += 1
+
+    def aprefetch(self, query: str):
+        """Start retrieving `query` as a task on the running event loop"""
+        key = self._key(query)
+        with self._lock:
+            self._prune(self._apending)
+            if key not in self._apending:
+                task = asyncio.ensure_future(self.retriever.ainvoke(query))
+                self._apending[key] = (task, time.monotonic())
+                self._stats["prefetched"] += 1
+
+    def discard(self, query: str):
+        """The prefetched query won't be used (the rewrite changed it)"""
+        key = self._key(query)
+        with self._lock:
+            for pending in (self._pending, self._apending):
+                entry = pending.pop(key, None)
+                if entry is not None:
+                    entry[0].cancel()
+                    self._stats["wasted"] += 1
+
+    # ---------------------------
+    # Retrieval
+    # ---------------------------
+    def _get_relevant_documents(self, query: str, *, run_manager: CallbackManagerForRetrieverRun) -> List[Document]:
+        with self._lock:
+            entry = self._pending.pop(self._key(query), None)
+        if entry is not None:
+            try:
+                docs = entry[0].result()
+                self._stats["used"] += 1
+                return docs
+            except Exception:
+                pass  # fall back to a normal search
+        return self.retriever.invoke(query, config={"callbacks": run_manager.get_child()})
+
+    async def _aget_relevant_documents(
+        self, query: str, *, run_manager: AsyncCallbackManagerForRetrieverRun
+    ) -> List[Document]:
+        with self._lock:
+            entry = self._apending.pop(self._key(query), None)
+        if entry is not None:
+            try:
+                docs = await entry[0]
+                self._stats["used"] += 1
+                return docs
+            except Exception:
+                pass
+        return await self.retriever.ainvoke(query, config={"callbacks": run_manager.get_child()})
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return dict(self._stats)
+
+
+class CondenseQuestionChain(LLMChain):
+    """
+    Drop-in question_generator for ConversationalRetrievalChain.
+
+    - Questions that don't refer back to earlier turns are passed through
+      unchanged (no LLM call).
+    - Rewrites are cached per (question, conversation).
+    - With a SpeculativeRetriever, retrieval for the raw question starts while
+      the rewrite runs; if the LLM returns the question unchanged, the chain's
+      retrieval step picks up the already running search.
+    """
+
+    rewrite_cache: Optional[RewriteCache] = None
+    speculative_retriever: Optional[SpeculativeRetriever] = None
+    use_heuristics: bool = True
+
+    def _shortcut(self, inputs: Dict[str, Any]) -> Optional[str]:
+        question = inputs["question"]
+        if self.use_heuristics and not needs_rewrite(question):
+            _condense_stats["skipped"] += 1
+            return question
+        if self.rewrite_cache is not None:
+            cached = self.rewrite_cache.get(question, inputs.get("chat_history", ""))
+            if cached is not None:
+                return cached
+        return None
+
+    def _remember(self, inputs: Dict[str, Any], rewritten: str):
+        _condense_stats["rewritten"] += 1
+        question = inputs["question"]
+        if self.rewrite_cache is not None:
+            self.rewrite_cache.put(question, inputs.get("chat_history", ""), rewritten)
+        if self.speculative_retriever is not None and not _same_question(question, rewritten):
+            self.speculative_retriever.discard(question)
+
+    def _call(self, inputs: Dict[str, Any], run_manager: Optional[CallbackManagerForChainRun] = None) -> Dict[str, str]:
+        shortcut = self._shortcut(inputs)
+        if shortcut is not None:
+            return {self.output_key: shortcut}
+        if self.speculative_retriever is not None:
+            self.speculative_retriever.prefetch(inputs["question"])
+        outputs = super()._call(inputs, run_manager=run_manager)
+        self._remember(inputs, outputs[self.output_key])
+        return outputs
+
+    async def _acall(
+        self, inputs: Dict[str, Any], run_manager: Optional[AsyncCallbackManagerForChainRun] = None
+    ) -> Dict[str, str]:
+        shortcut = self._shortcut(inputs)
+        if shortcut is not None:
+            return {self.output_key: shortcut}
+        if self.speculative_retriever is not None:
+            self.speculative_retriever.aprefetch(inputs["question"])
+        outputs = await super()._acall(inputs, run_manager=run_manager)
+        self._remember(inputs, outputs[self.output_key])
+        return outputs
+
+
+def condense_stats() -> Dict[str, int]:
+    """Process-wide counters of skipped and LLM-rewritten follow-up questions"""
+    return dict(_condense_stats)
@@ -0,0 +1,201 @@
+# context_packing.py
+# Token-budgeted prompt context: count, merge adjacent chunks, trim overlap, pack
+from functools import lru_cache
+from typing import Any, Dict, List, Optional, Tuple
+
+import tiktoken
+from langchain_core.callbacks import AsyncCallbackManagerForChainRun, CallbackManagerForChainRun
+from langchain_core.documents import Document
+from langchain.chains import ConversationalRetrievalChain
+from langchain.chains.conversational_retrieval.base import _get_chat_history
+
+# Matches CHUNK_OVERLAP in src/ingestion.py (plus slack for separator placement)
+MAX_OVERLAP_CHARS = 160
+MIN_OVERLAP_CHARS = 15
+# "\n\n" between documents in the stuffed context
+SEPARATOR_TOKENS = 2
+
+
+@lru_cache(maxsize=8)
+def _encoding(model: str):
+    try:
+        try:
+            return tiktoken.encoding_for_model(model)
+        except KeyError:
+            return tiktoken.get_encoding("cl100k_base")
+    except Exception as e:
+        # No network for the BPE file: fall back to a ~4 chars/token estimate
+        print(f"⚠️  tiktoken encoding unavailable ({e}), estimating tokens from length")
+        return None
+
+
+def count_tokens(text: str, model: str = "gpt-3.5-turbo") -> int:
+    encoding = _encoding(model)
+    if encoding is None:
+        return (len(text or "") + 3) // 4
+    return len(encoding.encode(text or "", disallowed_special=()))
+
+
+def truncate_to_tokens(text: str, max_tokens: int, model: str = "gpt-3.5-turbo") -> str:
+    """Cut text to at most max_tokens, preferring the last sentence / line end"""
+    encoding = _encoding(model)
+    if encoding is None:
+        if len(text) <= max_tokens * 4:
+            return text
+        cut = text[: max_tokens * 4]
+    else:
+        tokens = encoding.encode(text, disallowed_special=())
+        if len(tokens) <= max_tokens:
+            return text
+        cut = encoding.decode(tokens[:max_tokens])
+    boundary = max(cut.rfind(". "), cut.rfind("\n"))
+    if boundary > len(cut) // 2:
+        cut = cut[: boundary + 1]
+    return cut.rstrip() + " …"
+
+
+def trim_overlap(previous: str, following: str, max_chars: int = MAX_OVERLAP_CHARS) -> str:
+    """Drop the start of `following` that repeats the end of `previous` (chunk_overlap)"""
+    previous = previous.rstrip()
+    following = following.lstrip()
+    for size in range(min(max_chars, len(previous), len(following)), MIN_OVERLAP_CHARS - 1, -1):
+        if previous.endswith(following[:size]):
+            return following[size:].lstrip()
+    return following
+
+
+def _chunk_position(doc: Document) -> Optional[Tuple[str, Any, int]]:
+    metadata = doc.metadata or {}
+    chunk_id = metadata.get("chunk_id")
+    try:
+        chunk_number = int(float(chunk_id))
+    except (TypeError, ValueError):
+        return None
+    return metadata.get("document_name"), metadata.get("page_number"), chunk_number
+
+
+def merge_adjacent(docs: List[Document]) -> List[Document]:
+    """
+    Merge chunks that are neighbours (consecutive chunk_id) on the same page of
+    the same document into one passage, without the repeated overlap. The
+    merged passage takes the rank of its best-ranked part.
+    """
+    positions = [_chunk_position(d) for d in docs]
+    # (document, page) -> [(chunk_number, rank)]
+    groups: Dict[Tuple[str, Any], List[Tuple[int, int]]] = {}
+    for rank, position in enumerate(positions):
+        if position is not None:
+            groups.setdefault(position[:2], []).append((position[2], rank))
+
+    merged_into: Dict[int, int] = {}
+    runs: Dict[int, List[int]] = {}
+    for members in groups.values():
+        members.sort()
+        run = [members[0]]
+        for member in members[1:]:
+            if member[0] == run[-1][0] + 1:
+                run.append(member)
+                continue
+            if len(run) > 1:
+                head = min(rank for _, rank in run)
+                runs[head] = [rank for _, rank in run]
+                merged_into.update({rank: head for _, rank in run})
+            run = [member]
+        if len(run) > 1:
+            head = min(rank for _, rank in run)
+            runs[head] = [rank for _, rank in run]
+            merged_into.update({rank: head for _, rank in run})
+
+    result = []
+    for rank, doc in enumerate(docs):
+        head = merged_into.get(rank)
+        if head is None:
+            result.append(doc)
+        elif head == rank:
+            parts = [docs[r] for r in runs[rank]]  # already in chunk order
+            text = parts[0].page_content.rstrip()
+            for part in parts[1:]:
+                text = f"{text} {trim_overlap(text, part.page_content)}"
+            metadata = {
+                **(parts[0].metadata or {}),
+                "merged_chunk_ids": [p.metadata.get("chunk_id") for p in parts],
+            }
+            ids = [str(p.id) for p in parts if getattr(p, "id", None)]
+            result.append(Document(id="+".join(ids) or None, page_content=text, metadata=metadata))
+    return result
+
+
+class ContextPacker:
+    """
+    Assembles the prompt context within a token budget.
+
+    The budget covers the whole prompt (template + chat history + question +
+    context); what history and question leave over goes to the chunks, but
+    never less than min_context_tokens. Chunks are packed in rank order; the
+    first one that doesn't fit whole is truncated if enough room is left.
+    """
+
+    def __init__(
+        self,
+        prompt_budget: int = 2500,
+        reserved_tokens: int = 0,
+        min_context_tokens: int = 400,
+        min_partial_tokens: int = 120,
+        model: str = "gpt-3.5-turbo",
+    ):
+        self.prompt_budget = prompt_budget
+        self.reserved_tokens = reserved_tokens
+        self.min_context_tokens = min_context_tokens
+        self.min_partial_tokens = min_partial_tokens
+        self.model = model
+
+    def context_budget(self, chat_history: str = "", question: str = "") -> int:
+        used = self.reserved_tokens + count_tokens(chat_history, self.model) + count_tokens(question, self.model)
+        return max(self.prompt_budget - used, self.min_context_tokens)
+
+    def pack(self, docs: List[Document], chat_history: str = "", question: str = "") -> List[Document]:
+        budget = self.context_budget(chat_history, question)
+        packed, used = [], 0
+        for doc in merge_adjacent(docs):
+            tokens = count_tokens(doc.page_content, self.model) + SEPARATOR_TOKENS
+            if used + tokens <= budget:
+                packed.append(doc)
+                used += tokens
+                continue
+            remaining = budget - used - SEPARATOR_TOKENS
+            if remaining >= self.min_partial_tokens:
+                packed.append(Document(
+                    id=getattr(doc, "id", None),
+                    page_content=truncate_to_tokens(doc.page_content, remaining, self.model),
+                    metadata={**(doc.metadata or {}), "truncated": True},
+                ))
+            break
+        return packed
+
+
+class PackedConversationalRetrievalChain(ConversationalRetrievalChain):
+    """
+    ConversationalRetrievalChain whose retrieved documents go through a
+    ContextPacker (token budget, adjacent-chunk merging) before the prompt.
+    The packed documents are also what is returned as source_documents.
+    """
+
+    context_packer: Optional[ContextPacker] = None
+
+    def _pack(self, question: str, inputs: Dict[str, Any], docs: List[Document]) -> List[Document]:
+        if self.context_packer is None:
+            return docs
+        get_chat_history = self.get_chat_history or _get_chat_history
+        return self.context_packer.pack(docs, get_chat_history(inputs.get("chat_history") or []), question)
+
+    def _get_docs(
+        self, question: str, inputs: Dict[str, Any], *, run_manager: CallbackManagerForChainRun
+    ) -> List[Document]:
+        docs = super()._get_docs(question, inputs, run_manager=run_manager)
+        return self._pack(question, inputs, docs)
+
+    async def _aget_docs(
+        self, question: str, inputs: Dict[str, Any], *, run_manager: AsyncCallbackManagerForChainRun
+    ) -> List[Document]:
+        docs = await super()._aget_docs(question, inputs, run_manager=run_manager)
+        return self._pack(question, inputs, docs)
@@ -0,0 +1,90 @@
+# dedup.py
+# Content hashing and SimHash near-duplicate detection for chunks
+import hashlib
+import re
+from typing import Dict, List, Optional
+
+_WORD_RE = re.compile(r"\w+", re.UNICODE)
+
+SIMHASH_BITS = 64
+# 4 bands x 16 bits: two fingerprints within hamming distance <= 3 always
+# share at least one identical band (pigeonhole), so bands are exact lookup keys
+_BANDS = 4
+_BAND_BITS = SIMHASH_BITS // _BANDS
+_BAND_MASK = (1 << _BAND_BITS) - 1
+
+
+def normalize_content(text: str) -> str:
+    """Whitespace-insensitive form of a chunk (PDF extraction varies in line breaks)"""
+    return " ".join((text or "").split())
+
+
+def content_hash(text: str) -> str:
+    """Stable hex digest of the normalized chunk text"""
+    return hashlib.sha256(normalize_content(text).encode("utf-8")).hexdigest()[:32]
+
+
+def simhash(text: str, shingle_size: int = 3) -> int:
+    """64-bit SimHash over lower-cased word shingles"""
+    words = _WORD_RE.findall((text or "").lower())
+    if not words:
+        return 0
+    if len(words) < shingle_size:
+        shingles = [" ".join(words)]
+    else:
+        shingles = [" ".join(words[i:i + shingle_size]) for i in range(len(words) - shingle_size + 1)]
+
+    weights = [0] * SIMHASH_BITS
+    for shingle in shingles:
+        h = int.from_bytes(hashlib.blake2b(shingle.encode("utf-8"), digest_size=8).digest(), "big")
+        for bit in range(SIMHASH_BITS):
+            weights[bit] += 1 if (h >> bit) & 1 else -1
+    fingerprint = 0
+    for bit, weight in enumerate(weights):
+        if weight > 0:
+            fingerprint |= 1 << bit
+    return fingerprint
+
+
+def hamming_distance(a: int, b: int) -> int:
+    return bin(a ^ b).count("1")
+
+
+class NearDuplicateIndex:
+    """
+    Remembers chunk fingerprints and answers "have I seen this (almost) already?".
+
+    Exact duplicates are found by content hash, near-exact ones by SimHash
+    within max_distance bits (default 3 of 64).
+    """
+
+    def __init__(self, max_distance: int = 3):
+        self.max_distance = max_distance
+        self._by_hash: Dict[str, str] = {}
+        self._fingerprints: Dict[str, int] = {}
+        self._bands: List[Dict[int, List[str]]] = [{} for _ in range(_BANDS)]
+
+    def add(self, key: str, text_hash: str, fingerprint: int):
+        self._by_hash.setdefault(text_hash, key)
+        self._fingerprints[key] = fingerprint
+        for band in range(_BANDS):
+            value = (fingerprint >> (band * _BAND_BITS)) & _BAND_MASK
+            self._bands[band].setdefault(value, []).append(key)
+
+    def find(self, text_hash: str, fingerprint: int) -> Optional[str]:
+        """Key of an exact or near duplicate, or None"""
+        if text_hash in self._by_hash:
+            return self._by_hash[text_hash]
+        checked = set()
+        for band in range(_BANDS):
+            value = (fingerprint >> (band * _BAND_BITS)) & _BAND_MASK
+            for key in self._bands[band].get(value, ()):
+                if key in checked:
+                    continue
+                checked.add(key)
+                if hamming_distance(fingerprint, self._fingerprints[key]) <= self.max_distance:
+                    return key
+        return None
+
+    def __len__(self) -> int:
+        return len(self._fingerprints)
@@ -0,0 +1,277 @@
+# embedding_cache.py
+# Two-tier (memory LRU + SQLite) cache in front of an embeddings model
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+import unicodedata
+from collections import OrderedDict
+from typing import Dict, List, Optional, Union
+
+import numpy as np
+from langchain_core.embeddings import Embeddings
+
+from src.quantization import pack_int8, unpack_vector
+
+STORAGE_FORMATS = ("float32", "int8")
+
+
+def normalize_text(text: str) -> str:
+    """Normalize text for cache keys: unicode NFKC, lower case, collapsed whitespace"""
+    text = unicodedata.normalize("NFKC", text or "")
+    return " ".join(text.lower().split())
+
+
+class CachedEmbeddings(Embeddings):
+    """
+    Wraps any LangChain Embeddings object and caches vectors by
+    (model name, normalized text).
+
+    Lookups go: in-memory LRU -> SQLite on disk -> the wrapped model.
+    Vectors are stored as float32 bytes, or with storage="int8" as int8 codes
+    plus one scale (~4x smaller, cosine error ~1e-4); rows of either format
+    are read back. Both tiers are bounded; the disk tier drops the least
+    recently used rows when it grows past max_disk_entries.
+
+    Args:
+        embeddings: The wrapped embeddings model (e.g. OpenAIEmbeddings)
+        model_name: Part of the cache key, so different models never mix
+        path: SQLite file, or None for a memory-only cache
+        max_memory_entries: Size of the in-memory LRU
+        max_disk_entries: Maximum rows kept in SQLite
+        storage: "float32" or "int8" (both tiers)
+    """
+
+    def __init__(
+        self,
+        embeddings: Embeddings,
+        model_name: str = "text-embedding-3-small",
+        path: Optional[str] = None,
+        max_memory_entries: int = 2048,
+        max_disk_entries: int = 100_000,
+        storage: str = "float32",
+    ):
+        if storage not in STORAGE_FORMATS:
+            raise ValueError(f"Unknown embedding cache storage: {storage} (use float32 or int8)")
+        self.embeddings = embeddings
+        self.model_name = model_name
+        self.path = path
+        self.max_memory_entries = max_memory_entries
+        self.max_disk_entries = max_disk_entries
+        self.storage = storage
+
+        # float32 arrays, or pack_int8() bytes with storage="int8"
+        self._memory: "OrderedDict[str, Union[np.ndarray, bytes]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._conn: Optional[sqlite3.Connection] = None
+        self._disk_writes = 0
+
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+
+        if path:
+            self._open_disk(path)
+
+    # ---------------------------
+    # Disk tier
+    # ---------------------------
+    def _open_disk(self, path: str):
+        try:
+            directory = os.path.dirname(path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("PRAGMA synchronous=NORMAL")
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS embeddings ("
+                " key TEXT PRIMARY KEY,"
+                " model TEXT NOT NULL,"
+                " dim INTEGER NOT NULL,"
+                " vector BLOB NOT NULL,"
+                " last_used REAL NOT NULL)"
+            )
+            self._conn.execute("CREATE INDEX IF NOT EXISTS idx_embeddings_last_used ON embeddings(last_used)")
+        except sqlite3.Error as e:
+            print(f"⚠️  Embedding cache disk tier disabled ({path}): {e}")
+            self._conn = None
+
+    def _disk_get(self, keys: List[str]) -> Dict[str, np.ndarray]:
+        if self._conn is None or not keys:
+            return {}
+        found = {}
+        # SQLite limits the number of bound parameters, so query in slices
+        for start in range(0, len(keys), 500):
+            batch = keys[start:start + 500]
+            placeholders = ",".join("?" * len(batch))
+            rows = self._conn.execute(
+                f"SELECT key, dim, vector FROM embeddings WHERE key IN ({placeholders})", batch
+            ).fetchall()
+            for key, dim, blob in rows:
+                found[key] = unpack_vector(blob, dim)
+        if found:
+            now = time.time()
+            self._conn.executemany(
+                "UPDATE embeddings SET last_used = ? WHERE key = ?", [(now, k) for k in found]
+            )
+        return found
+
+    def _disk_put(self, items: Dict[str, np.ndarray]):
+        if self._conn is None or not items:
+            return
+        now = time.time()
+        self._conn.executemany(
+            "INSERT OR REPLACE INTO embeddings (key, model, dim, vector, last_used) VALUES (?, ?, ?, ?, ?)",
+            [(k, self.model_name, int(v.shape[0]), self._to_bytes(v), now) for k, v in items.items()],
+        )
+        self._disk_writes += len(items)
+        # Pruning costs a COUNT(*), so only check every few hundred writes
+        if self._disk_writes >= 256:
+            self._disk_writes = 0
+            self._prune_disk()
+
+    def _prune_disk(self):
+        (count,) = self._conn.execute("SELECT COUNT(*) FROM embeddings").fetchone()
+        overflow = count - self.max_disk_entries
+        if overflow > 0:
+            self._conn.execute(
+                "DELETE FROM embeddings WHERE key IN "
+                "(SELECT key FROM embeddings ORDER BY last_used ASC LIMIT ?)",
+                (overflow,),
+            )
+
+    # ---------------------------
+    # Storage format
+    # ---------------------------
+    def _to_bytes(self, vector: np.ndarray) -> bytes:
+        return pack_int8(vector) if self.storage == "int8" else vector.astype(np.float32).tobytes()
+
+    @staticmethod
+    def _from_memory(stored: Union[np.ndarray, bytes]) -> np.ndarray:
+        return stored if isinstance(stored, np.ndarray) else unpack_vector(stored, len(stored) - 4)
+
+    # ---------------------------
+    # Memory tier
+    # ---------------------------
+    def _memory_put(self, key: str, vector: np.ndarray):
+        self._memory[key] = pack_int8(vector) if self.storage == "int8" else vector
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_memory_entries:
+            self._memory.popitem(last=False)
+
+    def _key(self, text: str) -> str:
+        raw = f"{self.model_name}\x00{normalize_text(text)}"
+        return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+    # ---------------------------
+    # Lookup
+    # ---------------------------
+    def _lookup(self, texts: List[str]):
+        """Return (cache keys, vectors-by-position, positions still missing)"""
+        keys = [self._key(t) for t in texts]
+        result: Dict[int, np.ndarray] = {}
+        missing_keys = []
+        with self._lock:
+            for pos, key in enumerate(keys):
+                stored = self._memory.get(key)
+                if stored is not None:
+                    self._memory.move_to_end(key)
+                    result[pos] = self._from_memory(stored)
+                    self.memory_hits += 1
+                else:
+                    missing_keys.append(key)
+            from_disk = self._disk_get(list(dict.fromkeys(missing_keys)))
+            for pos, key in enumerate(keys):
+                if pos in result:
+                    continue
+                vector = from_disk.get(key)
+                if vector is not None:
+                    self._memory_put(key, vector)
+                    result[pos] = vector
+                    self.disk_hits += 1
+        missing = [pos for pos in range(len(texts)) if pos not in result]
+        return keys, result, missing
+
+    def _store(self, keys: List[str], missing: List[int], positions: List[int], vectors: List[List[float]], result: Dict[int, np.ndarray]):
+        new_items = {}
+        with self._lock:
+            for pos, vector in zip(positions, vectors):
+                array = np.asarray(vector, dtype=np.float32)
+                self._memory_put(keys[pos], array)
+                new_items[keys[pos]] = array
+            # Duplicate texts in the same call share the freshly embedded vector
+            for pos in missing:
+                result[pos] = new_items[keys[pos]]
+            self.misses += len(positions)
+            try:
+                self._disk_put(new_items)
+            except sqlite3.Error as e:
+                print(f"⚠️  Embedding cache write failed: {e}")
+
+    def _unique_missing(self, texts: List[str], keys: List[str], missing: List[int]):
+        """Collapse duplicate texts in one call so each is embedded once"""
+        first_pos: Dict[str, int] = {}
+        for pos in missing:
+            first_pos.setdefault(keys[pos], pos)
+        unique_positions = list(first_pos.values())
+        return unique_positions, [texts[p] for p in unique_positions]
+
+    # ---------------------------
+    # Embeddings interface
+    # ---------------------------
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        keys, result, missing = self._lookup(texts)
+        if missing:
+            positions, to_embed = self._unique_missing(texts, keys, missing)
+            vectors = self.embeddings.embed_documents(to_embed)
+            self._store(keys, missing, positions, vectors, result)
+        return [result[pos].tolist() for pos in range(len(texts))]
+
+    def embed_query(self, text: str) -> List[float]:
+        keys, result, missing = self._lookup([text])
+        if missing:
+            vector = self.embeddings.embed_query(text)
+            self._store(keys, missing, [0], [vector], result)
+        return result[0].tolist()
+
+    async def aembed_documents(self, texts: List[str]) -> List[List[float]]:
+        keys, result, missing = self._lookup(texts)
+        if missing:
+            positions, to_embed = self._unique_missing(texts, keys, missing)
+            vectors = await self.embeddings.aembed_documents(to_embed)
+            self._store(keys, missing, positions, vectors, result)
+        return [result[pos].tolist() for pos in range(len(texts))]
+
+    async def aembed_query(self, text: str) -> List[float]:
+        keys, result, missing = self._lookup([text])
+        if missing:
+            vector = await self.embeddings.aembed_query(text)
+            self._store(keys, missing, [0], [vector], result)
+        return result[0].tolist()
+
+    # ---------------------------
+    # Metrics / maintenance
+    # ---------------------------
+    def stats(self) -> Dict[str, float]:
+        with self._lock:
+            lookups = self.memory_hits + self.disk_hits + self.misses
+            disk_entries = 0
+            if self._conn is not None:
+                (disk_entries,) = self._conn.execute("SELECT COUNT(*) FROM embeddings").fetchone()
+            return {
+                "memory_hits": self.memory_hits,
+                "disk_hits": self.disk_hits,
+                "misses": self.misses,
+                "hit_rate": (self.memory_hits + self.disk_hits) / lookups if lookups else 0.0,
+                "memory_entries": len(self._memory),
+                "memory_bytes": sum(v.nbytes if isinstance(v, np.ndarray) else len(v) for v in self._memory.values()),
+                "disk_entries": disk_entries,
+            }
+
+    def clear(self):
+        with self._lock:
+            self._memory.clear()
+            if self._conn is not None:
+                self._conn.execute("DELETE FROM embeddings")
@@ -0,0 +1,45 @@
+# http_transport.py
+# httpx transport with connection-reuse counters (shared OpenAI HTTP pool)
+import threading
+import weakref
+from typing import Dict
+
+import httpx
+
+
+class CountingTransport(httpx.HTTPTransport):
+    """
+    httpx transport that counts requests and how many of them had to open
+    a NEW connection (the rest reused a pooled keep-alive connection)
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        # Weak references: a closed connection drops out, so a new one that gets
+        # the same memory address (id()) is still counted as new
+        self._seen_connections: "weakref.WeakSet" = weakref.WeakSet()
+        self._counter_lock = threading.Lock()
+        self.requests = 0
+        self.new_connections = 0
+
+    def handle_request(self, request):
+        response = super().handle_request(request)
+        pool = getattr(self, "_pool", None)
+        connections = getattr(pool, "connections", []) if pool is not None else []
+        with self._counter_lock:
+            self.requests += 1
+            for conn in connections:
+                if conn not in self._seen_connections:
+                    self._seen_connections.add(conn)
+                    self.new_connections += 1
+        return response
+
+    def stats(self) -> Dict[str, int]:
+        pool = getattr(self, "_pool", None)
+        with self._counter_lock:
+            return {
+                "requests": self.requests,
+                "new_connections": self.new_connections,
+                "reused_connections": max(self.requests - self.new_connections, 0),
+                "open_connections": len(getattr(pool, "connections", []) or []),
+            }
@@ -0,0 +1,541 @@
+# ingestion.py
+# Batched, parallel, resumable PDF -> chunks -> embeddings -> vector store pipeline
+#
+# Replaces the manual notebook flow (01_text_pdf_processing + 02/04 pinecone upload):
+#   python -m src.ingestion 2_data/raw/new_guide.pdf --document-type new_guide
+import argparse
+import json
+import os
+import pickle
+import random
+import time
+from contextlib import nullcontext
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, ThreadPoolExecutor, wait
+from dataclasses import dataclass, field
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Set, Tuple
+
+import tiktoken
+from langchain_text_splitters import RecursiveCharacterTextSplitter
+
+from src.dedup import NearDuplicateIndex, content_hash, simhash
+
+CHUNK_SIZE = 800
+CHUNK_OVERLAP = 120
+SEPARATORS = ["\n\n", "\n", ". ", "! ", "? ", "; ", ", ", " ", ""]
+
+
+# ---------------------------
+# Metadata helpers (same rules as the processing notebooks)
+# ---------------------------
+def categorize_content(text: str) -> str:
+    """Categorize GDPR content for better filtering"""
+    text_lower = text.lower()
+    if any(k in text_lower for k in ['kunde', 'customer', 'marketing']):
+        return "customer_data"
+    if any(k in text_lower for k in ['mitarbeiter', 'employee', 'personal']):
+        return "employee_data"
+    if any(k in text_lower for k in ['recht', 'law', 'gesetz', 'dsgvo']):
+        return "legal_basis"
+    if any(k in text_lower for k in ['sicherheit', 'security', 'datenschutzverletzung']):
+        return "security"
+    if any(k in text_lower for k in ['speicherung', 'retention', 'aufbewahrung']):
+        return "data_retention"
+    return "general"
+
+
+def identify_section_type(text: str) -> str:
+    """Identify section types for better chunking"""
+    text = text.strip()
+    if len(text) < 200 and any(ind in text for ind in ['KAPITEL', 'ARTIKEL', 'SECTION']):
+        return "section_header"
+    if len(text) < 100 and text.isupper():
+        return "heading"
+    return "content"
+
+
+@dataclass
+class Chunk:
+    id: str
+    text: str
+    metadata: Dict
+    simhash: int = 0
+
+
+# ---------------------------
+# Stage 1: parse PDF pages in parallel
+# ---------------------------
+def _pdf_info(pdf_path: str) -> Tuple[int, Dict]:
+    from pypdf import PdfReader
+
+    reader = PdfReader(pdf_path)
+    info = {}
+    meta = reader.metadata
+    if meta is not None:
+        for key, attr in (("creationdate", "creation_date"), ("moddate", "modification_date")):
+            try:
+                value = getattr(meta, attr)
+            except Exception:
+                value = None
+            if value is not None:
+                info[key] = value.isoformat()
+        if meta.author:
+            info["author"] = meta.author
+    return len(reader.pages), info
+
+
+def _extract_pages(pdf_path: str, start: int, end: int) -> List[Tuple[int, str, str]]:
+    """Worker: extract (page index, page label, text) for pages [start, end)"""
+    from pypdf import PdfReader
+
+    reader = PdfReader(pdf_path)
+    labels = reader.page_labels
+    pages = []
+    for i in range(start, end):
+        label = labels[i] if i < len(labels) else str(i + 1)
+        pages.append((i, label, reader.pages[i].extract_text() or ""))
+    return pages
+
+
+def iter_pdf_pages(
+    pdf_path: str,
+    document_type: str,
+    language: str = "german",
+    workers: int = 4,
+    pages_per_task: int = 8,
+    executor: Optional[ProcessPoolExecutor] = None,
+) -> Iterator[Dict]:
+    """
+    Yield one {"page_content", "metadata"} dict per PDF page, in page order.
+    Page ranges are extracted in a process pool (text extraction is CPU-bound).
+    """
+    total_pages, pdf_meta = _pdf_info(pdf_path)
+    ranges = [(s, min(s + pages_per_task, total_pages)) for s in range(0, total_pages, pages_per_task)]
+
+    own_executor = executor is None and workers > 1
+    if own_executor:
+        executor = ProcessPoolExecutor(max_workers=workers)
+    try:
+        if executor is not None:
+            results = executor.map(_extract_pages, [pdf_path] * len(ranges), *zip(*ranges)) if ranges else []
+        else:
+            results = (_extract_pages(pdf_path, s, e) for s, e in ranges)
+        for page_batch in results:
+            for i, label, text in page_batch:
+                metadata = {
+                    "document_type": document_type,
+                    "document_name": os.path.basename(pdf_path),
+                    "language": language,
+                    "source": pdf_path,
+                    "page_number": i + 1,
+                    "total_pages": total_pages,
+                    "content_length": len(text),
+                    "content_category": categorize_content(text),
+                    "section_type": identify_section_type(text),
+                    **pdf_meta,
+                    "page": i,
+                    "page_label": label,
+                }
+                yield {"page_content": text, "metadata": metadata}
+    finally:
+        if own_executor:
+            executor.shutdown()
+
+
+# ---------------------------
+# Stage 2: stream chunks
+# ---------------------------
+def create_splitter(chunk_size: int = CHUNK_SIZE, chunk_overlap: int = CHUNK_OVERLAP) -> RecursiveCharacterTextSplitter:
+    return RecursiveCharacterTextSplitter(
+        chunk_size=chunk_size,
+        chunk_overlap=chunk_overlap,
+        separators=SEPARATORS,
+        length_function=len,
+    )
+
+
+def chunk_id_for(metadata: Dict, text_hash: str) -> str:
+    """
+    Stable vector id derived from the content hash: unchanged text keeps its
+    id across runs, and the "<document>#" prefix lets us list a document's vectors
+    """
+    stem = os.path.splitext(metadata.get("document_name", "doc"))[0]
+    return f"{stem}#{text_hash}"
+
+
+def iter_chunks(pages: Iterable[Dict], splitter: Optional[RecursiveCharacterTextSplitter] = None) -> Iterator[Chunk]:
+    """Split pages into chunks lazily; chunk_id counts per document"""
+    splitter = splitter or create_splitter()
+    counters: Dict[str, int] = {}
+    for page in pages:
+        metadata = page["metadata"]
+        for text in splitter.split_text(page["page_content"]):
+            doc_name = metadata.get("document_name", "doc")
+            counters[doc_name] = counters.get(doc_name, 0) + 1
+            text_hash = content_hash(text)
+            chunk_meta = {**metadata, "chunk_id": counters[doc_name], "chunk_size": len(text), "content_hash": text_hash}
+            yield Chunk(id=chunk_id_for(chunk_meta, text_hash), text=text, metadata=chunk_meta, simhash=simhash(text))
+
+
+# ---------------------------
+# Stage 3: token-budgeted batches + embedding with retry
+# ---------------------------
+def iter_token_batches(
+    chunks: Iterable[Chunk],
+    max_tokens: int = 100_000,
+    max_items: int = 256,
+    model: str = "text-embedding-3-small",
+) -> Iterator[List[Chunk]]:
+    """Group chunks so each embedding request stays under max_tokens / max_items"""
+    encoding = tiktoken.encoding_for_model(model)
+    batch: List[Chunk] = []
+    batch_tokens = 0
+    for chunk in chunks:
+        tokens = len(encoding.encode(chunk.text))
+        if batch and (batch_tokens + tokens > max_tokens or len(batch) >= max_items):
+            yield batch
+            batch, batch_tokens = [], 0
+        batch.append(chunk)
+        batch_tokens += tokens
+    if batch:
+        yield batch
+
+
+def with_retry(fn: Callable, *args, retries: int = 5, base_delay: float = 1.0, max_delay: float = 30.0):
+    """Call fn(*args), retrying with exponential backoff + jitter (rate limits, timeouts)"""
+    for attempt in range(retries + 1):
+        try:
+            return fn(*args)
+        except Exception as e:
+            if attempt == retries:
+                raise
+            delay = min(max_delay, base_delay * (2 ** attempt)) * (0.5 + random.random())
+            print(f"⚠️  {type(e).__name__}: {e} - retry {attempt + 1}/{retries} in {delay:.1f}s")
+            time.sleep(delay)
+
+
+# ---------------------------
+# Stage 4: sinks + checkpoint
+# ---------------------------
+class PineconeSink:
+    """Upserts (id, vector, metadata + text) into a Pinecone index, PineconeVectorStore-compatible"""
+
+    # Each upsert is durable once it returns, so the manifest can record it right away
+    writes_on_close = False
+
+    def __init__(self, index, text_key: str = "text", namespace: Optional[str] = None):
+        self.index = index
+        self.text_key = text_key
+        self.namespace = namespace
+
+    def upsert(self, chunks: List[Chunk], vectors: List[List[float]]):
+        payload = [
+            {"id": c.id, "values": v, "metadata": {**c.metadata, self.text_key: c.text}}
+            for c, v in zip(chunks, vectors)
+        ]
+        self.index.upsert(vectors=payload, namespace=self.namespace)
+
+    def delete(self, ids: List[str]):
+        for start in range(0, len(ids), 1000):
+            self.index.delete(ids=ids[start:start + 1000], namespace=self.namespace)
+
+    def close(self):
+        pass
+
+
+class LocalIndexSink:
+    """Appends to (or creates) a LocalVectorStore directory; written on close()"""
+
+    # Nothing reaches disk before close(): the manifest records this run's chunks only after it
+    writes_on_close = True
+
+    def __init__(self, directory: str, model: Optional[str] = None):
+        import numpy as np
+        from src.local_index import LocalVectorStore, _normalize_rows
+
+        self._np = np
+        self._normalize_rows = _normalize_rows
+        self.directory = directory
+        self.model = model
+        if os.path.exists(os.path.join(directory, "embeddings.npy")):
+            self.store = LocalVectorStore.load(directory, embedding=None, mmap=False)
+        else:
+            self.store = LocalVectorStore(embedding=None, vectors=np.zeros((0, 0), dtype=np.float32), texts=[], metadatas=[], ids=[])
+
+    def upsert(self, chunks: List[Chunk], vectors: List[List[float]]):
+        self.store.delete(ids=[c.id for c in chunks])
+        new_vectors = self._normalize_rows(vectors)
+        if len(self.store):
+            self.store.vectors = self._np.vstack([self.store.vectors, new_vectors])
+        else:
+            self.store.vectors = new_vectors
+        self.store.texts.extend(c.text for c in chunks)
+        self.store.metadatas.extend(c.metadata for c in chunks)
+        self.store.ids.extend(c.id for c in chunks)
+
+    def delete(self, ids: List[str]):
+        self.store.delete(ids=ids)
+
+    def close(self):
+        self.store.save(self.directory, model=self.model)
+
+
+class IndexManifest:
+    """
+    Append-only JSON-lines record of what is in the index:
+    {"id", "document_name", "simhash"} per upserted chunk, {"id", "deleted": true}
+    per removed one. It doubles as the resume checkpoint: ids listed here are
+    never embedded again.
+    """
+
+    def __init__(self, path: Optional[str]):
+        self.path = path
+        self.entries: Dict[str, Dict] = {}
+        if path and os.path.exists(path):
+            with open(path, "r", encoding="utf-8") as f:
+                for line in f:
+                    line = line.strip()
+                    if not line:
+                        continue
+                    try:
+                        record = json.loads(line)
+                    except json.JSONDecodeError:
+                        # A crash can leave a half-written last line
+                        continue
+                    if record.get("deleted"):
+                        self.entries.pop(record["id"], None)
+                    else:
+                        self.entries[record["id"]] = record
+
+    def __contains__(self, chunk_id: str) -> bool:
+        return chunk_id in self.entries
+
+    def ids_for_document(self, document_name: str) -> Set[str]:
+        return {i for i, r in self.entries.items() if r.get("document_name") == document_name}
+
+    def _append(self, records: List[Dict]):
+        if self.path and records:
+            with open(self.path, "a", encoding="utf-8") as f:
+                f.write("".join(json.dumps(r, ensure_ascii=False) + "\n" for r in records))
+                f.flush()
+                os.fsync(f.fileno())
+
+    def mark(self, chunks: Iterable[Chunk]):
+        records = [
+            {"id": c.id, "document_name": c.metadata.get("document_name"), "simhash": c.simhash}
+            for c in chunks
+        ]
+        for record in records:
+            self.entries[record["id"]] = record
+        self._append(records)
+
+    def remove(self, ids: Iterable[str]):
+        records = [{"id": i, "deleted": True} for i in ids]
+        for record in records:
+            self.entries.pop(record["id"], None)
+        self._append(records)
+
+
+# ---------------------------
+# Pipeline
+# ---------------------------
+@dataclass
+class IngestionStats:
+    pages: int = 0
+    chunks: int = 0
+    skipped: int = 0
+    duplicates: int = 0
+    deleted: int = 0
+    embedded: int = 0
+    embedding_requests: int = 0
+    upserted: int = 0
+    seconds: float = 0.0
+    chunk_records: List[Dict] = field(default_factory=list, repr=False)
+
+
+def ingest(
+    pdf_paths: List[str],
+    embeddings,
+    sink,
+    document_type: str,
+    manifest_path: Optional[str] = None,
+    near_duplicate_distance: int = 3,
+    delete_removed: bool = True,
+    parse_workers: int = 4,
+    embed_concurrency: int = 4,
+    max_batch_tokens: int = 100_000,
+    max_batch_items: int = 256,
+    upsert_batch_size: int = 100,
+    model: str = "text-embedding-3-small",
+    keep_chunks: bool = False,
+) -> IngestionStats:
+    """
+    Run the full pipeline.
+
+    - Chunks whose content-hash id is already in the manifest are not embedded
+      again (resume after a crash; re-running an unchanged PDF makes zero calls)
+    - Exact and near-exact duplicates (SimHash) of chunks already kept are dropped
+    - Vectors of chunks that disappeared from a re-ingested PDF are deleted
+    """
+    started = time.perf_counter()
+    stats = IngestionStats()
+    manifest = IndexManifest(manifest_path)
+    document_names = {os.path.basename(p) for p in pdf_paths}
+    seen_ids: Set[str] = set()
+
+    # Dedup against other documents already in the index; chunks of the PDFs
+    # being re-ingested are (re)added as they are seen in this run
+    duplicates = NearDuplicateIndex(max_distance=near_duplicate_distance)
+    for chunk_id, record in manifest.entries.items():
+        if record.get("document_name") not in document_names and record.get("simhash") is not None:
+            duplicates.add(chunk_id, chunk_id.split("#", 1)[-1], record["simhash"])
+
+    def pages():
+        with ProcessPoolExecutor(max_workers=parse_workers) if parse_workers > 1 else nullcontext() as executor:
+            for path in pdf_paths:
+                print(f"📄 Parsing: {path}")
+                for page in iter_pdf_pages(path, document_type, workers=parse_workers, executor=executor):
+                    stats.pages += 1
+                    yield page
+
+    def pending_chunks():
+        for chunk in iter_chunks(pages()):
+            stats.chunks += 1
+            if chunk.id in seen_ids or duplicates.find(chunk.metadata["content_hash"], chunk.simhash):
+                stats.duplicates += 1
+                continue
+            seen_ids.add(chunk.id)
+            duplicates.add(chunk.id, chunk.metadata["content_hash"], chunk.simhash)
+            if keep_chunks:
+                stats.chunk_records.append({"id": chunk.id, "page_content": chunk.text, "metadata": chunk.metadata})
+            if chunk.id in manifest:
+                stats.skipped += 1
+                continue
+            yield chunk
+
+    def embed_batch(batch: List[Chunk]):
+        vectors = with_retry(embeddings.embed_documents, [c.text for c in batch])
+        return batch, vectors
+
+    # Sinks that write on close() get their manifest records after it succeeded,
+    # so a crash never leaves the checkpoint listing chunks that are not stored
+    deferred = getattr(sink, "writes_on_close", False)
+    unmarked: List[Chunk] = []
+
+    def flush(buffer: List[Tuple[Chunk, List[float]]]):
+        for start in range(0, len(buffer), upsert_batch_size):
+            part = buffer[start:start + upsert_batch_size]
+            with_retry(sink.upsert, [c for c, _ in part], [v for _, v in part])
+            if deferred:
+                unmarked.extend(c for c, _ in part)
+            else:
+                manifest.mark(c for c, _ in part)
+            stats.upserted += len(part)
+
+    buffer: List[Tuple[Chunk, List[float]]] = []
+    with ThreadPoolExecutor(max_workers=embed_concurrency) as pool:
+        in_flight = set()
+        for batch in iter_token_batches(pending_chunks(), max_batch_tokens, max_batch_items, model):
+            # Bounded concurrency: never more than embed_concurrency requests in flight
+            if len(in_flight) >= embed_concurrency:
+                done, in_flight = wait(in_flight, return_when=FIRST_COMPLETED)
+                for future in done:
+                    chunks, vectors = future.result()
+                    stats.embedding_requests += 1
+                    stats.embedded += len(chunks)
+                    buffer.extend(zip(chunks, vectors))
+                if len(buffer) >= upsert_batch_size:
+                    flush(buffer)
+                    buffer = []
+            in_flight.add(pool.submit(embed_batch, batch))
+        for future in in_flight:
+            chunks, vectors = future.result()
+            stats.embedding_requests += 1
+            stats.embedded += len(chunks)
+            buffer.extend(zip(chunks, vectors))
+    if buffer:
+        flush(buffer)
+
+    # Chunks that no longer exist in the re-ingested PDFs
+    stale: List[str] = []
+    if delete_removed:
+        stale = sorted(
+            chunk_id
+            for name in document_names
+            for chunk_id in manifest.ids_for_document(name)
+            if chunk_id not in seen_ids
+        )
+        if stale:
+            with_retry(sink.delete, stale)
+            if not deferred:
+                manifest.remove(stale)
+            stats.deleted = len(stale)
+    sink.close()
+    if deferred:
+        manifest.mark(unmarked)
+        manifest.remove(stale)
+
+    stats.seconds = time.perf_counter() - started
+    return stats
+
+
+# ---------------------------
+# CLI
+# ---------------------------
+def main():
+    from dotenv import load_dotenv
+    from langchain_openai import OpenAIEmbeddings
+
+    parser = argparse.ArgumentParser(description="Ingest PDF guides into the GDPR vector index")
+    parser.add_argument("pdfs", nargs="+", help="PDF files to ingest")
+    parser.add_argument("--document-type", required=True, help="Metadata document_type, e.g. bitkom_ai_gdpr_handbook")
+    parser.add_argument("--sink", choices=["pinecone", "local"], default="pinecone")
+    parser.add_argument("--index-name", default="gdpr-compliance-openai", help="Pinecone index name")
+    parser.add_argument("--local-dir", default="2_data/processed/local_index", help="Local index directory")
+    parser.add_argument("--manifest", default="2_data/processed/index_manifest.jsonl", help="Index manifest / resume file")
+    parser.add_argument("--keep-removed", action="store_true", help="Do not delete vectors of chunks removed from a PDF")
+    parser.add_argument("--chunks-out", default=None, help="Also write chunks as a chunks.pkl-style pickle")
+    parser.add_argument("--model", default="text-embedding-3-small")
+    parser.add_argument("--parse-workers", type=int, default=4)
+    parser.add_argument("--embed-concurrency", type=int, default=4)
+    parser.add_argument("--batch-tokens", type=int, default=100_000)
+    parser.add_argument("--batch-items", type=int, default=256)
+    parser.add_argument("--upsert-batch", type=int, default=100)
+    args = parser.parse_args()
+
+    load_dotenv()
+    embeddings = OpenAIEmbeddings(model=args.model, openai_api_key=os.getenv("OPENAI_API_KEY"))
+
+    if args.sink == "pinecone":
+        from pinecone import Pinecone
+        pc = Pinecone(api_key=os.getenv("PINECONE_API_KEY"))
+        sink = PineconeSink(pc.Index(args.index_name))
+    else:
+        sink = LocalIndexSink(args.local_dir, model=args.model)
+
+    stats = ingest(
+        args.pdfs,
+        embeddings,
+        sink,
+        document_type=args.document_type,
+        manifest_path=args.manifest or None,
+        delete_removed=not args.keep_removed,
+        parse_workers=args.parse_workers,
+        embed_concurrency=args.embed_concurrency,
+        max_batch_tokens=args.batch_tokens,
+        max_batch_items=args.batch_items,
+        upsert_batch_size=args.upsert_batch,
+        model=args.model,
+        keep_chunks=bool(args.chunks_out),
+    )
+
+    if args.chunks_out:
+        with open(args.chunks_out, "wb") as f:
+            pickle.dump(stats.chunk_records, f)
+        print(f"💾 Saved {len(stats.chunk_records)} chunks to {args.chunks_out}")
+
+    print("✅ Ingestion complete")
+    print(json.dumps({k: v for k, v in stats.__dict__.items() if k != "chunk_records"}, indent=2))
+
+
+if __name__ == "__main__":
+    main()
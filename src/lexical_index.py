@@ -0,0 +1,376 @@
+# lexical_index.py
+# BM25 inverted index over the chunk texts, with German decompounding and
+# statute-reference tokens ("Art. 6 Abs. 4 DSGVO", "§ 26 BDSG", "Anlage 17")
+import argparse
+import json
+import os
+import pickle
+import re
+import time
+from collections import Counter
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Set, Tuple
+
+import numpy as np
+from langchain_core.documents import Document
+
+DOCS_FILE = "postings_docs.npy"
+TF_FILE = "postings_tf.npy"
+OFFSETS_FILE = "term_offsets.npy"
+LENGTHS_FILE = "doc_lengths.npy"
+VOCAB_FILE = "vocab.json"
+DOCUMENTS_FILE = "documents.pkl"
+
+_WORD_RE = re.compile(r"\w+", re.UNICODE)
+# PDF line-break hyphenation ("Verar- beitung"), but not "Bundes- und Landesrecht"
+_HYPHENATION_RE = re.compile(r"(\w)-\s+(?!(?:und|oder|bzw|sowie|bis)\b)([a-zäöüß])")
+_UMLAUTS = str.maketrans({"ä": "ae", "ö": "oe", "ü": "ue", "ß": "ss"})
+
+# Statute references become single tokens, e.g. "art_6", "art_6_abs_4", "par_26", "anlage_17"
+_ARTICLE_RE = re.compile(r"\bart(?:ikel|\.)?\s*(\d+[a-z]?)(?:\s*abs(?:atz|\.)?\s*(\d+))?", re.IGNORECASE)
+_PARAGRAPH_RE = re.compile(r"§+\s*(\d+[a-z]?)(?:\s*abs(?:atz|\.)?\s*(\d+))?", re.IGNORECASE)
+_ANNEX_RE = re.compile(r"\b(anlage|anhang|annex)\s*(\d+)", re.IGNORECASE)
+
+_ALIASES = {
+    "gdpr": "dsgvo",
+    "datenschutzgrundverordnung": "dsgvo",
+    "bundesdatenschutzgesetz": "bdsg",
+}
+
+_STOPWORDS = {
+    # German
+    "der", "die", "das", "den", "dem", "des", "ein", "eine", "einer", "eines", "einem", "einen",
+    "und", "oder", "aber", "auch", "als", "am", "an", "auf", "aus", "bei", "bis", "durch", "fuer",
+    "im", "in", "ist", "sind", "war", "wird", "werden", "wurde", "kann", "koennen", "muss", "muessen",
+    "mit", "nach", "nicht", "noch", "nur", "ob", "so", "sich", "sie", "es", "er", "wir", "ich", "zu",
+    "zum", "zur", "von", "vom", "vor", "wie", "was", "wer", "wenn", "dass", "ueber", "unter", "um",
+    "hat", "haben", "sein", "diese", "dieser", "dieses", "welche", "welcher", "welches", "man",
+    # English
+    "the", "a", "an", "and", "or", "of", "to", "in", "on", "for", "is", "are", "be", "by", "with",
+    "what", "which", "who", "how", "do", "does", "can", "must", "it", "this", "that", "as", "at",
+}
+
+_SUFFIXES = ("ungen", "innen", "ung", "en", "er", "es", "e", "s", "n")
+# Linking elements between compound parts ("Arbeitnehmer|daten", "Verarbeitung|s|verzeichnis")
+_LINKING = ("", "s", "es", "n", "en")
+
+MIN_PART_LENGTH = 4
+MIN_COMPOUND_LENGTH = 9
+
+
+def normalize_word(word: str) -> str:
+    """Lower case, fold umlauts / ß, resolve aliases"""
+    word = word.lower().translate(_UMLAUTS)
+    return _ALIASES.get(word, word)
+
+
+def stem(word: str) -> str:
+    """Very light German/English suffix stripping (keeps at least 4 characters)"""
+    if word.isdigit() or "_" in word:
+        return word
+    for suffix in _SUFFIXES:
+        if word.endswith(suffix) and len(word) - len(suffix) >= 4:
+            return word[: -len(suffix)]
+    return word
+
+
+def reference_tokens(text: str) -> List[str]:
+    """Tokens for statute references in the raw text"""
+    tokens = []
+    for match in _ARTICLE_RE.finditer(text):
+        tokens.append(f"art_{match.group(1).lower()}")
+        if match.group(2):
+            tokens.append(f"art_{match.group(1).lower()}_abs_{match.group(2)}")
+    for match in _PARAGRAPH_RE.finditer(text):
+        tokens.append(f"par_{match.group(1).lower()}")
+        if match.group(2):
+            tokens.append(f"par_{match.group(1).lower()}_abs_{match.group(2)}")
+    for match in _ANNEX_RE.finditer(text):
+        tokens.append(f"anlage_{match.group(2)}")
+    return tokens
+
+
+class Decompounder:
+    """
+    Splits German compounds into parts that occur as words in the corpus,
+    e.g. "datenschutzbeauftragter" -> ["daten", "schutz", "beauftragter"].
+    """
+
+    def __init__(self, vocabulary: Iterable[str]):
+        self.vocabulary: Set[str] = {w for w in vocabulary if len(w) >= MIN_PART_LENGTH}
+        self._cache: Dict[str, List[str]] = {}
+
+    def split(self, word: str) -> List[str]:
+        if len(word) < MIN_COMPOUND_LENGTH or not word.isalpha():
+            return [word]
+        cached = self._cache.get(word)
+        if cached is None:
+            cached = self._split(word) or [word]
+            self._cache[word] = cached
+        return cached
+
+    def _split(self, word: str) -> Optional[List[str]]:
+        # Of all decompositions into known words, take the one with the fewest
+        # parts, then the longest shortest part ("verarbeitung|s|verzeichnis"
+        # beats OCR fragments like "vera|rbeitung|verzeichnis")
+        best = None
+        for cut in range(MIN_PART_LENGTH, len(word) - MIN_PART_LENGTH + 1):
+            head, tail = word[:cut], word[cut:]
+            for link in _LINKING:
+                if link and not head.endswith(link):
+                    continue
+                stem_head = head[: len(head) - len(link)] if link else head
+                if len(stem_head) < MIN_PART_LENGTH or stem_head not in self.vocabulary:
+                    continue
+                if tail in self.vocabulary:
+                    candidate = [stem_head, tail]
+                elif len(tail) >= MIN_COMPOUND_LENGTH:
+                    rest = self.split(tail)
+                    candidate = [stem_head] + rest if len(rest) > 1 else None
+                else:
+                    candidate = None
+                if candidate and (best is None or _split_rank(candidate) < _split_rank(best)):
+                    best = candidate
+        return best
+
+
+def _split_rank(parts: List[str]) -> Tuple[int, int]:
+    return len(parts), -min(len(p) for p in parts)
+
+
+def words(text: str) -> List[str]:
+    """Raw words of a text, with PDF line-break hyphenation undone"""
+    return _WORD_RE.findall(_HYPHENATION_RE.sub(r"\1\2", text or ""))
+
+
+def tokenize(text: str, decompounder: Optional[Decompounder] = None) -> List[str]:
+    """Index/query terms: stemmed words, compound parts and statute references"""
+    terms = reference_tokens(text or "")
+    for raw in words(text):
+        word = normalize_word(raw)
+        if word in _STOPWORDS or (len(word) < 2 and not word.isdigit()):
+            continue
+        terms.append(stem(word))
+        if decompounder is not None:
+            parts = decompounder.split(word)
+            if len(parts) > 1:
+                terms.extend(stem(part) for part in parts)
+    return terms
+
+
+def document_types(metadatas: Iterable[Dict]) -> Set[str]:
+    return {str(m["document_type"]) for m in metadatas if (m or {}).get("document_type") is not None}
+
+
+def iter_pinecone_chunks(index, text_key: str = "text", batch_size: int = 100, with_values: bool = False) -> Iterable[Dict]:
+    """chunks.pkl-style dicts for every vector of a Pinecone index (text from the metadata, optionally the vector)"""
+    for ids in index.list(limit=batch_size):
+        vectors = index.fetch(ids=list(ids)).vectors
+        for vector_id in ids:
+            vector = vectors.get(vector_id)
+            if vector is None:
+                continue
+            metadata = dict(vector.metadata or {})
+            chunk = {"id": vector_id, "page_content": metadata.pop(text_key, ""), "metadata": metadata}
+            if with_values:
+                chunk["values"] = list(vector.values)
+            yield chunk
+
+
+class LexicalIndex:
+    """
+    BM25 over a CSR-style inverted index stored as flat numpy arrays
+    (postings doc ids + term frequencies, per-term offsets, document lengths),
+    so loading is a few np.load calls plus one small JSON file.
+    """
+
+    def __init__(
+        self,
+        terms: Sequence[str],
+        offsets: np.ndarray,
+        postings_docs: np.ndarray,
+        postings_tf: np.ndarray,
+        doc_lengths: np.ndarray,
+        records: List[Dict],
+        vocabulary: Iterable[str] = (),
+        k1: float = 1.5,
+        b: float = 0.75,
+    ):
+        self.term_ids = {term: i for i, term in enumerate(terms)}
+        self.offsets = offsets
+        self.postings_docs = postings_docs
+        self.postings_tf = postings_tf
+        self.doc_lengths = doc_lengths
+        self.records = records
+        self.decompounder = Decompounder(vocabulary)
+        self.k1 = k1
+        self.b = b
+
+        n_docs = len(doc_lengths)
+        self.avg_length = float(doc_lengths.mean()) if n_docs else 0.0
+        doc_freq = np.diff(offsets).astype(np.float32)
+        self.idf = np.log(1.0 + (n_docs - doc_freq + 0.5) / (doc_freq + 0.5)).astype(np.float32)
+        self._norm = (k1 * (1.0 - b + b * doc_lengths / max(self.avg_length, 1e-9))).astype(np.float32)
+
+    def __len__(self) -> int:
+        return len(self.records)
+
+    @property
+    def document_types(self) -> Set[str]:
+        """Source documents the index covers (hybrid search needs the same corpus as the dense index)"""
+        return document_types(r["metadata"] for r in self.records)
+
+    # ---------------------------
+    # Build / persistence
+    # ---------------------------
+    @classmethod
+    def build(cls, documents: Iterable[Any], directory: Optional[str] = None) -> "LexicalIndex":
+        """Index Document objects or chunks.pkl-style dicts (and save if directory is given)"""
+        records = []
+        for doc in documents:
+            if isinstance(doc, dict):
+                text, metadata, doc_id = doc["page_content"], dict(doc.get("metadata") or {}), doc.get("id")
+            else:
+                text, metadata, doc_id = doc.page_content, dict(doc.metadata or {}), getattr(doc, "id", None)
+            if not doc_id:
+                doc_id = f"{metadata.get('document_name', 'doc')}:{metadata.get('chunk_id', len(records) + 1)}"
+            records.append({"id": str(doc_id), "page_content": text, "metadata": metadata})
+
+        # Words of the corpus are the dictionary for decompounding
+        vocabulary = {
+            w for r in records for w in (normalize_word(x) for x in words(r["page_content"]))
+            if w.isalpha() and w not in _STOPWORDS
+        }
+        decompounder = Decompounder(vocabulary)
+
+        doc_terms = [Counter(tokenize(r["page_content"], decompounder)) for r in records]
+        terms = sorted({t for counts in doc_terms for t in counts})
+        term_ids = {t: i for i, t in enumerate(terms)}
+
+        postings: List[List[Tuple[int, int]]] = [[] for _ in terms]
+        for doc_id, counts in enumerate(doc_terms):
+            for term, tf in counts.items():
+                postings[term_ids[term]].append((doc_id, tf))
+        offsets = np.zeros(len(terms) + 1, dtype=np.int64)
+        offsets[1:] = np.cumsum([len(p) for p in postings])
+        postings_docs = np.fromiter((d for p in postings for d, _ in p), dtype=np.int32, count=int(offsets[-1]))
+        postings_tf = np.fromiter((tf for p in postings for _, tf in p), dtype=np.float32, count=int(offsets[-1]))
+        doc_lengths = np.array([sum(c.values()) for c in doc_terms], dtype=np.float32)
+
+        index = cls(terms, offsets, postings_docs, postings_tf, doc_lengths, records, vocabulary=decompounder.vocabulary)
+        if directory:
+            index.save(directory, terms=terms)
+        return index
+
+    def save(self, directory: str, terms: Optional[Sequence[str]] = None):
+        os.makedirs(directory, exist_ok=True)
+        terms = terms or sorted(self.term_ids, key=self.term_ids.get)
+        np.save(os.path.join(directory, OFFSETS_FILE), self.offsets)
+        np.save(os.path.join(directory, DOCS_FILE), self.postings_docs)
+        np.save(os.path.join(directory, TF_FILE), self.postings_tf)
+        np.save(os.path.join(directory, LENGTHS_FILE), self.doc_lengths)
+        with open(os.path.join(directory, VOCAB_FILE), "w", encoding="utf-8") as f:
+            json.dump(
+                {
+                    "terms": list(terms),
+                    "vocabulary": sorted(self.decompounder.vocabulary),
+                    "k1": self.k1,
+                    "b": self.b,
+                    "count": len(self.records),
+                    "document_types": sorted(self.document_types),
+                    "built_at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+                },
+                f,
+                ensure_ascii=False,
+            )
+        with open(os.path.join(directory, DOCUMENTS_FILE), "wb") as f:
+            pickle.dump(self.records, f)
+
+    @classmethod
+    def load(cls, directory: str, mmap: bool = True) -> "LexicalIndex":
+        """Load an index written by save()/build()"""
+        mode = "r" if mmap else None
+        with open(os.path.join(directory, VOCAB_FILE), "r", encoding="utf-8") as f:
+            vocab = json.load(f)
+        with open(os.path.join(directory, DOCUMENTS_FILE), "rb") as f:
+            records = pickle.load(f)
+        return cls(
+            terms=vocab["terms"],
+            offsets=np.load(os.path.join(directory, OFFSETS_FILE)),
+            postings_docs=np.load(os.path.join(directory, DOCS_FILE), mmap_mode=mode),
+            postings_tf=np.load(os.path.join(directory, TF_FILE), mmap_mode=mode),
+            doc_lengths=np.load(os.path.join(directory, LENGTHS_FILE)),
+            records=records,
+            vocabulary=vocab.get("vocabulary", ()),
+            k1=vocab.get("k1", 1.5),
+            b=vocab.get("b", 0.75),
+        )
+
+    # ---------------------------
+    # Search
+    # ---------------------------
+    def search_with_score(self, query: str, k: int = 8) -> List[Tuple[Document, float]]:
+        scores = np.zeros(len(self.records), dtype=np.float32)
+        for term in set(tokenize(query, self.decompounder)):
+            term_id = self.term_ids.get(term)
+            if term_id is None:
+                continue
+            start, end = self.offsets[term_id], self.offsets[term_id + 1]
+            docs = self.postings_docs[start:end]
+            tf = self.postings_tf[start:end]
+            scores[docs] += self.idf[term_id] * tf * (self.k1 + 1.0) / (tf + self._norm[docs])
+
+        hits = int(np.count_nonzero(scores))
+        k = min(k, hits)
+        if k <= 0:
+            return []
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top])]
+        return [(self._to_document(int(i)), float(scores[i])) for i in top]
+
+    def search(self, query: str, k: int = 8) -> List[Document]:
+        return [doc for doc, _ in self.search_with_score(query, k)]
+
+    def _to_document(self, row: int) -> Document:
+        record = self.records[row]
+        return Document(id=record["id"], page_content=record["page_content"], metadata=dict(record["metadata"]))
+
+
+# ---------------------------
+# CLI: build the lexical index from 2_data/processed/chunks.pkl
+# ---------------------------
+def main():
+    parser = argparse.ArgumentParser(
+        description="Build the BM25 lexical index from the same corpus as the dense index"
+    )
+    parser.add_argument(
+        "--chunks", nargs="+", default=["2_data/processed/chunks.pkl"],
+        help="Pickled lists of chunk dicts (one per ingested guide, see ingestion --chunks-out)",
+    )
+    parser.add_argument("--pinecone-index", default=None, help="Export the chunks from this Pinecone index instead")
+    parser.add_argument("--out", default="2_data/processed/lexical_index", help="Output directory")
+    args = parser.parse_args()
+
+    if args.pinecone_index:
+        from dotenv import load_dotenv
+        from pinecone import Pinecone
+
+        load_dotenv()
+        index = Pinecone(api_key=os.getenv("PINECONE_API_KEY")).Index(args.pinecone_index)
+        chunks = list(iter_pinecone_chunks(index))
+    else:
+        chunks = []
+        for path in args.chunks:
+            with open(path, "rb") as f:
+                chunks.extend(pickle.load(f))
+
+    started = time.perf_counter()
+    index = LexicalIndex.build(chunks, directory=args.out)
+    print(
+        f"✅ Lexical index built: {len(index)} chunks, {len(index.term_ids)} terms -> {args.out} "
+        f"({time.perf_counter() - started:.1f}s)"
+    )
+    print(f"   document types: {', '.join(sorted(index.document_types)) or '-'}")
+
+
+if __name__ == "__main__":
+    main()
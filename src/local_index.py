@@ -0,0 +1,438 @@
+# local_index.py
+# In-process exact vector index (memory-mapped float32 matrix) as a Pinecone alternative
+import argparse
+import json
+import os
+import pickle
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple
+
+import numpy as np
+from langchain_core.documents import Document
+from langchain_core.embeddings import Embeddings
+from langchain_core.vectorstores import VectorStore
+
+from src.quantization import VectorCodec, top_candidates
+
+EMBEDDINGS_FILE = "embeddings.npy"
+DOCUMENTS_FILE = "documents.pkl"
+MANIFEST_FILE = "manifest.json"
+# Distinct metadata filters whose sub-matrix is kept in memory
+SUBINDEX_CACHE_SIZE = 32
+# Candidates per requested result that a quantized scan hands to the float32 rescoring
+DEFAULT_RESCORE_FACTOR = 10
+
+
+def _normalize_rows(matrix: np.ndarray) -> np.ndarray:
+    matrix = np.asarray(matrix, dtype=np.float32)
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return matrix / norms
+
+
+def _matches(value: Any, condition: Any) -> bool:
+    """Evaluate one Pinecone-style metadata condition"""
+    if isinstance(condition, dict):
+        for op, operand in condition.items():
+            if op == "$eq" and value != operand:
+                return False
+            if op == "$ne" and value == operand:
+                return False
+            if op == "$in" and value not in operand:
+                return False
+            if op == "$nin" and value in operand:
+                return False
+            if op == "$gt" and not (value is not None and value > operand):
+                return False
+            if op == "$gte" and not (value is not None and value >= operand):
+                return False
+            if op == "$lt" and not (value is not None and value < operand):
+                return False
+            if op == "$lte" and not (value is not None and value <= operand):
+                return False
+        return True
+    return value == condition
+
+
+class LocalVectorStore(VectorStore):
+    """
+    Exact cosine-similarity search over a contiguous float32 matrix.
+
+    Rows are L2-normalized at build time, so a query is one BLAS
+    matrix-vector product plus an argpartition for the top-k. The matrix is
+    loaded with np.load(mmap_mode="r"), so several processes share the same
+    pages. Metadata filters use the same syntax as Pinecone
+    ({"document_type": "zdh_gdpr_handbook"}, {"page_number": {"$lte": 10}}, ...).
+
+    Optionally (quantize()) the scan runs over a compact copy of the vectors
+    (truncated dimensions and/or int8 / binary codes) and only the best
+    k * rescore_factor candidates are rescored with the full float32 rows,
+    which then stay on disk except for the pages those candidates touch.
+    """
+
+    def __init__(
+        self,
+        embedding: Embeddings,
+        vectors: np.ndarray,
+        texts: List[str],
+        metadatas: List[Dict],
+        ids: List[str],
+        manifest: Optional[Dict] = None,
+    ):
+        self._embedding = embedding
+        self.vectors = vectors
+        self.texts = texts
+        self.metadatas = metadatas
+        self.ids = ids
+        self.manifest = manifest or {}
+        self._field_cache: Dict[str, np.ndarray] = {}
+        # filter -> (row ids, contiguous sub-matrix): filtered queries only
+        # score the matching rows (see _subindex)
+        self._subindex_cache: "OrderedDict[str, Tuple[np.ndarray, np.ndarray]]" = OrderedDict()
+        self._subindex_lock = threading.Lock()
+        # Compact scan copy (see quantize); None = exact search over self.vectors
+        self.codec: Optional[VectorCodec] = None
+        self.codes: Optional[np.ndarray] = None
+        self.rescore_factor = DEFAULT_RESCORE_FACTOR
+
+    @property
+    def embeddings(self) -> Optional[Embeddings]:
+        return self._embedding
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    # ---------------------------
+    # Persistence
+    # ---------------------------
+    @classmethod
+    def load(
+        cls,
+        directory: str,
+        embedding: Embeddings,
+        mmap: bool = True,
+        quantization: Optional[str] = None,
+        dimensions: Optional[int] = None,
+        rescore_factor: int = DEFAULT_RESCORE_FACTOR,
+    ) -> "LocalVectorStore":
+        """Load an index written by save()/build() (optionally quantized, see quantize())"""
+        vectors = np.load(os.path.join(directory, EMBEDDINGS_FILE), mmap_mode="r" if mmap else None)
+        with open(os.path.join(directory, DOCUMENTS_FILE), "rb") as f:
+            records = pickle.load(f)
+        manifest = {}
+        manifest_path = os.path.join(directory, MANIFEST_FILE)
+        if os.path.exists(manifest_path):
+            with open(manifest_path, "r", encoding="utf-8") as f:
+                manifest = json.load(f)
+        store = cls(
+            embedding=embedding,
+            vectors=vectors,
+            texts=[r["page_content"] for r in records],
+            metadatas=[r["metadata"] for r in records],
+            ids=[r["id"] for r in records],
+            manifest=manifest,
+        )
+        if (quantization and quantization != "none") or dimensions:
+            store.quantize(quantization or "none", dimensions, rescore_factor, directory=directory)
+        return store
+
+    def save(self, directory: str, model: Optional[str] = None):
+        os.makedirs(directory, exist_ok=True)
+        # Quantized codes of the previous build no longer match the vectors
+        for name in os.listdir(directory):
+            if name.startswith("codes-") and name.endswith(".npz"):
+                os.remove(os.path.join(directory, name))
+        np.save(os.path.join(directory, EMBEDDINGS_FILE), np.ascontiguousarray(self.vectors, dtype=np.float32))
+        records = [
+            {"id": i, "page_content": t, "metadata": m}
+            for i, t, m in zip(self.ids, self.texts, self.metadatas)
+        ]
+        with open(os.path.join(directory, DOCUMENTS_FILE), "wb") as f:
+            pickle.dump(records, f)
+        self.manifest = {
+            "model": model or self.manifest.get("model"),
+            "dimension": int(self.vectors.shape[1]) if len(self.ids) else 0,
+            "count": len(self.ids),
+            "built_at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        }
+        with open(os.path.join(directory, MANIFEST_FILE), "w", encoding="utf-8") as f:
+            json.dump(self.manifest, f, indent=2)
+
+    def quantize(
+        self,
+        kind: str = "int8",
+        dimensions: Optional[int] = None,
+        rescore_factor: int = DEFAULT_RESCORE_FACTOR,
+        directory: Optional[str] = None,
+    ):
+        """
+        Scan compact codes instead of the float32 matrix: kind none (truncation
+        only) / int8 / binary, dimensions = leading components kept (None = all).
+        rescore_factor 0 returns the approximate scores without rescoring.
+        With a directory the codes are cached there (codes-<kind>-<dims>.npz).
+        """
+        codec = VectorCodec(kind, dimensions)
+        if codec.kind == "none" and not codec.dimensions:
+            codes, codec = None, None
+        else:
+            version = str(self.manifest.get("built_at", ""))
+            codes = codec.load(directory, len(self.ids), version) if directory else None
+            if codes is None:
+                codes = codec.encode(self.vectors)
+                if directory:
+                    try:
+                        codec.save(directory, codes, version)
+                    except OSError as e:
+                        print(f"⚠️  Could not cache quantized codes in {directory}: {e}")
+        with self._subindex_lock:
+            self.codec, self.codes = codec, codes
+            self.rescore_factor = rescore_factor
+            self._subindex_cache.clear()
+
+    def index_bytes(self) -> int:
+        """Bytes the scan stage keeps in memory (codes, or the float32 matrix)"""
+        if self.codec is None:
+            return int(np.asarray(self.vectors).nbytes)
+        return int(self.codes.nbytes + (self.codec.scale.nbytes if self.codec.scale is not None else 0))
+
+    @classmethod
+    def build(
+        cls,
+        documents: Iterable[Any],
+        embedding: Embeddings,
+        directory: Optional[str] = None,
+        batch_size: int = 128,
+        model: Optional[str] = None,
+    ) -> "LocalVectorStore":
+        """
+        Embed documents (Document objects or chunks.pkl-style dicts) and
+        optionally save the index to directory
+        """
+        texts, metadatas, ids = [], [], []
+        for doc in documents:
+            if isinstance(doc, dict):
+                text, metadata, doc_id = doc["page_content"], dict(doc.get("metadata") or {}), doc.get("id")
+            else:
+                text, metadata, doc_id = doc.page_content, dict(doc.metadata or {}), getattr(doc, "id", None)
+            if not doc_id:
+                doc_id = f"{metadata.get('document_name', 'doc')}:{metadata.get('chunk_id', len(ids) + 1)}"
+            texts.append(text)
+            metadatas.append(metadata)
+            ids.append(str(doc_id))
+
+        batches = []
+        for start in range(0, len(texts), batch_size):
+            batches.append(np.asarray(embedding.embed_documents(texts[start:start + batch_size]), dtype=np.float32))
+        vectors = _normalize_rows(np.vstack(batches)) if batches else np.zeros((0, 0), dtype=np.float32)
+
+        store = cls(embedding=embedding, vectors=vectors, texts=texts, metadatas=metadatas, ids=ids)
+        if directory:
+            store.save(directory, model=model)
+        return store
+
+    # ---------------------------
+    # Search
+    # ---------------------------
+    def _field_values(self, field: str) -> np.ndarray:
+        values = self._field_cache.get(field)
+        if values is None:
+            values = np.empty(len(self.metadatas), dtype=object)
+            values[:] = [m.get(field) for m in self.metadatas]
+            self._field_cache[field] = values
+        return values
+
+    def filter_mask(self, filter: Optional[Dict]) -> Optional[np.ndarray]:
+        """Boolean row mask for a Pinecone-style metadata filter (None = no filter)"""
+        if not filter:
+            return None
+        mask = np.ones(len(self.ids), dtype=bool)
+        for field, condition in filter.items():
+            if field == "$and":
+                for sub in condition:
+                    mask &= self.filter_mask(sub)
+                continue
+            if field == "$or":
+                any_mask = np.zeros(len(self.ids), dtype=bool)
+                for sub in condition:
+                    any_mask |= self.filter_mask(sub)
+                mask &= any_mask
+                continue
+            values = self._field_values(field)
+            if isinstance(condition, dict) and set(condition) == {"$in"}:
+                wanted = set(condition["$in"])
+                mask &= np.fromiter((v in wanted for v in values), dtype=bool, count=len(values))
+            elif not isinstance(condition, dict):
+                mask &= values == condition
+            else:
+                mask &= np.fromiter((_matches(v, condition) for v in values), dtype=bool, count=len(values))
+        return mask
+
+    def _scan_matrix(self) -> np.ndarray:
+        return self.vectors if self.codec is None else self.codes
+
+    def _subindex(self, filter: Dict) -> Tuple[np.ndarray, np.ndarray]:
+        """Row ids matching filter and their scan rows (vectors or codes) as one contiguous matrix (cached per filter)"""
+        key = json.dumps(filter, sort_keys=True, default=str)
+        with self._subindex_lock:
+            cached = self._subindex_cache.get(key)
+            if cached is not None:
+                self._subindex_cache.move_to_end(key)
+                return cached
+        rows = np.flatnonzero(self.filter_mask(filter))
+        matrix = self._scan_matrix()
+        cached = (rows, np.ascontiguousarray(matrix[rows]))
+        with self._subindex_lock:
+            self._subindex_cache[key] = cached
+            if len(self._subindex_cache) > SUBINDEX_CACHE_SIZE:
+                self._subindex_cache.popitem(last=False)
+        return cached
+
+    def _top_k(self, query: np.ndarray, k: int, filter: Optional[Dict] = None) -> List[Tuple[int, float]]:
+        rows, matrix = self._subindex(filter) if filter else (None, self._scan_matrix())
+        if not len(matrix):
+            return []
+        q = np.asarray(query, dtype=np.float32)
+        norm = np.linalg.norm(q)
+        if norm > 0:
+            q = q / norm
+        codec = self.codec
+        if codec is None:
+            scores = matrix @ q
+        else:
+            scores = codec.scores(matrix, codec.prepare_query(q))
+        k = min(k, len(scores))
+        if k <= 0:
+            return []
+        if codec is not None and self.rescore_factor > 0:
+            # Two-stage: compact scan -> float32 rescoring of the best candidates
+            top = top_candidates(scores, k * self.rescore_factor)
+            top = np.sort(top)  # ascending rows: sequential reads from the memory map
+            candidates = rows[top] if rows is not None else top
+            exact = np.asarray(self.vectors[candidates], dtype=np.float32) @ q
+            best = np.argsort(-exact)[:k]
+            return [(int(candidates[i]), float(exact[i])) for i in best]
+        top = top_candidates(scores, k)
+        top = top[np.argsort(-scores[top])]
+        if rows is not None:
+            return [(int(rows[i]), float(scores[i])) for i in top]
+        return [(int(i), float(scores[i])) for i in top]
+
+    def _to_document(self, row: int) -> Document:
+        return Document(id=self.ids[row], page_content=self.texts[row], metadata=dict(self.metadatas[row]))
+
+    def similarity_search_by_vector_with_score(
+        self, embedding: Sequence[float], k: int = 4, filter: Optional[Dict] = None, **kwargs: Any
+    ) -> List[Tuple[Document, float]]:
+        return [(self._to_document(i), s) for i, s in self._top_k(embedding, k, filter)]
+
+    def similarity_search_by_vector(
+        self, embedding: List[float], k: int = 4, filter: Optional[Dict] = None, **kwargs: Any
+    ) -> List[Document]:
+        return [doc for doc, _ in self.similarity_search_by_vector_with_score(embedding, k, filter)]
+
+    async def asimilarity_search_by_vector(
+        self, embedding: List[float], k: int = 4, filter: Optional[Dict] = None, **kwargs: Any
+    ) -> List[Document]:
+        # Sub-millisecond: no need for the default executor hop
+        return self.similarity_search_by_vector(embedding, k, filter)
+
+    def similarity_search_with_score(
+        self, query: str, k: int = 4, filter: Optional[Dict] = None, **kwargs: Any
+    ) -> List[Tuple[Document, float]]:
+        return self.similarity_search_by_vector_with_score(self._embedding.embed_query(query), k, filter)
+
+    def similarity_search(self, query: str, k: int = 4, filter: Optional[Dict] = None, **kwargs: Any) -> List[Document]:
+        return [doc for doc, _ in self.similarity_search_with_score(query, k, filter)]
+
+    async def asimilarity_search_with_score(
+        self, query: str, k: int = 4, filter: Optional[Dict] = None, **kwargs: Any
+    ) -> List[Tuple[Document, float]]:
+        # Only the query embedding is I/O; the search itself is sub-millisecond
+        embedding = await self._embedding.aembed_query(query)
+        return self.similarity_search_by_vector_with_score(embedding, k, filter)
+
+    async def asimilarity_search(
+        self, query: str, k: int = 4, filter: Optional[Dict] = None, **kwargs: Any
+    ) -> List[Document]:
+        return [doc for doc, _ in await self.asimilarity_search_with_score(query, k, filter)]
+
+    def _select_relevance_score_fn(self):
+        # Scores are already cosine similarities
+        return lambda score: score
+
+    # ---------------------------
+    # Writes
+    # ---------------------------
+    def add_texts(
+        self, texts: Iterable[str], metadatas: Optional[List[Dict]] = None, ids: Optional[List[str]] = None, **kwargs: Any
+    ) -> List[str]:
+        texts = list(texts)
+        metadatas = metadatas or [{} for _ in texts]
+        ids = ids or [f"local:{len(self.ids) + i + 1}" for i in range(len(texts))]
+        new_vectors = _normalize_rows(self._embedding.embed_documents(texts))
+        if len(self.ids):
+            self.vectors = np.vstack([np.asarray(self.vectors), new_vectors])
+        else:
+            self.vectors = new_vectors
+        self.texts.extend(texts)
+        self.metadatas.extend(metadatas)
+        self.ids.extend(ids)
+        self._field_cache.clear()
+        self._subindex_cache.clear()
+        if self.codec is not None:
+            # Keep the fitted int8 scale; new rows outside it are clipped
+            self.codes = np.vstack([self.codes, self.codec.encode(new_vectors)])
+        return ids
+
+    def delete(self, ids: Optional[List[str]] = None, **kwargs: Any) -> Optional[bool]:
+        if not ids:
+            return False
+        drop = set(ids)
+        keep = [i for i, doc_id in enumerate(self.ids) if doc_id not in drop]
+        self.vectors = np.asarray(self.vectors)[keep]
+        self.texts = [self.texts[i] for i in keep]
+        self.metadatas = [self.metadatas[i] for i in keep]
+        self.ids = [self.ids[i] for i in keep]
+        if self.codes is not None:
+            self.codes = self.codes[keep]
+        self._field_cache.clear()
+        self._subindex_cache.clear()
+        return True
+
+    @classmethod
+    def from_texts(
+        cls, texts: List[str], embedding: Embeddings, metadatas: Optional[List[Dict]] = None, **kwargs: Any
+    ) -> "LocalVectorStore":
+        metadatas = metadatas or [{} for _ in texts]
+        docs = [{"page_content": t, "metadata": m} for t, m in zip(texts, metadatas)]
+        return cls.build(docs, embedding, directory=kwargs.get("directory"))
+
+
+# ---------------------------
+# CLI: build the local index from 2_data/processed/chunks.pkl
+# ---------------------------
+def main():
+    from dotenv import load_dotenv
+    from langchain_openai import OpenAIEmbeddings
+
+    parser = argparse.ArgumentParser(description="Build the local vector index from processed chunks")
+    parser.add_argument("--chunks", default="2_data/processed/chunks.pkl", help="Pickled list of chunk dicts")
+    parser.add_argument("--out", default="2_data/processed/local_index", help="Output directory")
+    parser.add_argument("--model", default="text-embedding-3-small", help="OpenAI embedding model")
+    parser.add_argument("--batch-size", type=int, default=128)
+    args = parser.parse_args()
+
+    load_dotenv()
+    with open(args.chunks, "rb") as f:
+        chunks = pickle.load(f)
+
+    embeddings = OpenAIEmbeddings(model=args.model, openai_api_key=os.getenv("OPENAI_API_KEY"))
+    started = time.perf_counter()
+    store = LocalVectorStore.build(chunks, embeddings, directory=args.out, batch_size=args.batch_size, model=args.model)
+    print(f"✅ Local index built: {len(store)} vectors -> {args.out} ({time.perf_counter() - started:.1f}s)")
+
+
+if __name__ == "__main__":
+    main()
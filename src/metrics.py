@@ -0,0 +1,317 @@
+# metrics.py
+# Per-stage latency histograms (condense, embed, vector search, prompt build,
+# LLM first token / completion, source post-processing), exposed as
+# Prometheus text or JSON
+import json
+import threading
+import time
+from bisect import bisect_left
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, List, Optional, Sequence
+
+# Only the base class: the callback manager (and with it langsmith) is
+# imported when a timing event is actually dispatched
+from langchain_core.callbacks.base import BaseCallbackHandler
+
+# Breakdown order in responses and dumps
+STAGES = (
+    "condense",
+    "expand",
+    "embed",
+    "route",
+    "vector_search",
+    "retrieval",
+    "prompt_build",
+    "llm_first_token",
+    "llm_completion",
+    "postprocess",
+    "total",
+)
+# Observed where they happen (also for batch runs and speculative prefetches),
+# the per-request timer only adds them to the breakdown
+SOURCE_STAGES = ("expand", "embed", "route", "vector_search")
+
+# Upper bounds in seconds (Prometheus "le" labels), +Inf is implicit
+DEFAULT_BUCKETS = (
+    0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5,
+    1.0, 2.5, 5.0, 10.0, 30.0, 60.0,
+)
+
+TIMING_EVENT = "stage_timing"
+
+
+class LatencyHistogram:
+    """Cumulative-bucket histogram like a Prometheus histogram (no samples kept)"""
+
+    def __init__(self, buckets: Sequence[float] = DEFAULT_BUCKETS):
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.count = 0
+        self.sum = 0.0
+        self.max = 0.0
+
+    def observe(self, seconds: float):
+        self.counts[bisect_left(self.buckets, seconds)] += 1
+        self.count += 1
+        self.sum += seconds
+        self.max = max(self.max, seconds)
+
+    def quantile(self, q: float) -> float:
+        """Estimate by linear interpolation inside the bucket (like histogram_quantile)"""
+        if not self.count:
+            return 0.0
+        rank = q * self.count
+        seen = 0
+        for position, count in enumerate(self.counts):
+            if count and seen + count >= rank:
+                lower = self.buckets[position - 1] if position else 0.0
+                upper = self.buckets[position] if position < len(self.buckets) else self.max
+                # Never report more than was actually observed
+                upper = min(upper, self.max)
+                lower = min(lower, upper)
+                return lower + (upper - lower) * (rank - seen) / count
+            seen += count
+        return self.max
+
+
+class MetricsRegistry:
+    """Thread-safe set of per-stage latency histograms"""
+
+    def __init__(self, buckets: Sequence[float] = DEFAULT_BUCKETS, prefix: str = "gdpr_rag"):
+        self.buckets = tuple(buckets)
+        self.prefix = prefix
+        self._histograms: Dict[str, LatencyHistogram] = {}
+        self._lock = threading.Lock()
+        self.started_at = time.time()
+
+    def observe(self, stage: str, seconds: float):
+        with self._lock:
+            histogram = self._histograms.get(stage)
+            if histogram is None:
+                histogram = self._histograms[stage] = LatencyHistogram(self.buckets)
+            histogram.observe(seconds)
+
+    def observe_many(self, timings: Dict[str, float]):
+        for stage, seconds in timings.items():
+            self.observe(stage, seconds)
+
+    def _ordered(self) -> List[str]:
+        return sorted(self._histograms, key=lambda s: (STAGES.index(s) if s in STAGES else len(STAGES), s))
+
+    def snapshot(self) -> Dict[str, Any]:
+        """JSON-friendly summary per stage (percentiles are bucket estimates)"""
+        with self._lock:
+            stages = {}
+            for stage in self._ordered():
+                h = self._histograms[stage]
+                stages[stage] = {
+                    "count": h.count,
+                    "mean_ms": round(h.sum / h.count * 1000, 2) if h.count else 0.0,
+                    "p50_ms": round(h.quantile(0.50) * 1000, 2),
+                    "p95_ms": round(h.quantile(0.95) * 1000, 2),
+                    "p99_ms": round(h.quantile(0.99) * 1000, 2),
+                    "max_ms": round(h.max * 1000, 2),
+                }
+            return {"since": self.started_at, "stages": stages}
+
+    def to_json(self) -> str:
+        return json.dumps(self.snapshot(), indent=2)
+
+    def prometheus_text(self) -> str:
+        """Prometheus text exposition format (one histogram, stage as label)"""
+        name = f"{self.prefix}_stage_latency_seconds"
+        lines = [
+            f"# HELP {name} Latency of each question-answering stage.",
+            f"# TYPE {name} histogram",
+        ]
+        with self._lock:
+            for stage in self._ordered():
+                h = self._histograms[stage]
+                cumulative = 0
+                for upper, count in zip(self.buckets, h.counts):
+                    cumulative += count
+                    lines.append(f'{name}_bucket{{stage="{stage}",le="{upper:g}"}} {cumulative}')
+                lines.append(f'{name}_bucket{{stage="{stage}",le="+Inf"}} {h.count}')
+                lines.append(f'{name}_sum{{stage="{stage}"}} {h.sum:.6f}')
+                lines.append(f'{name}_count{{stage="{stage}"}} {h.count}')
+        return "\n".join(lines) + "\n"
+
+    def reset(self):
+        with self._lock:
+            self._histograms.clear()
+            self.started_at = time.time()
+
+
+# One registry per process
+stage_metrics = MetricsRegistry()
+
+
+# ---------------------------
+# Reporting from inside chain components
+# ---------------------------
+def report_timings(timings: Dict[str, float], run_manager=None):
+    """
+    Record source-stage timings (seconds) in the histograms and pass them to
+    the request's StageTimer via a custom callback event (if there is one)
+    """
+    stage_metrics.observe_many(timings)
+    if run_manager is not None:
+        from langchain_core.callbacks.manager import dispatch_custom_event
+        try:
+            dispatch_custom_event(TIMING_EVENT, timings, config={"callbacks": run_manager.get_child()})
+        except Exception:
+            pass  # timing must never break retrieval
+
+
+async def areport_timings(timings: Dict[str, float], run_manager=None):
+    stage_metrics.observe_many(timings)
+    if run_manager is not None:
+        from langchain_core.callbacks.manager import adispatch_custom_event
+        try:
+            await adispatch_custom_event(TIMING_EVENT, timings, config={"callbacks": run_manager.get_child()})
+        except Exception:
+            pass
+
+
+# ---------------------------
+# Per-request timer
+# ---------------------------
+class StageTimer(BaseCallbackHandler):
+    """
+    Callback handler that times the stages of one chain call:
+      condense         question-condensing chain (only with chat history)
+      retrieval        outermost retriever (incl. hybrid / re-ranking)
+      embed, route, vector_search   reported by the dense retriever
+      prompt_build     end of retrieval -> answering LLM call (packing, prompt)
+      llm_first_token  answering LLM start -> first streamed token
+      llm_completion   answering LLM start -> end
+    postprocess and total are added by the caller (see stage / finish).
+    """
+
+    def __init__(self, registry: MetricsRegistry = stage_metrics):
+        self.registry = registry
+        self.started = time.perf_counter()
+        self.timings: Dict[str, float] = {}
+        self._condense_runs: Dict[Any, float] = {}
+        self._retriever_runs = set()
+        self._outer_retriever: Optional[tuple] = None  # (run_id, started)
+        self._retrieved_at: Optional[float] = None
+        self._llm_run: Optional[tuple] = None  # (run_id, started)
+        self._first_token = False
+
+    def _add(self, stage: str, seconds: float):
+        self.timings[stage] = self.timings.get(stage, 0.0) + seconds
+
+    def on_chain_start(self, serialized, inputs, *, run_id, **kwargs):
+        if kwargs.get("name") == "CondenseQuestionChain":
+            self._condense_runs[run_id] = time.perf_counter()
+
+    def on_chain_end(self, outputs, *, run_id, **kwargs):
+        started = self._condense_runs.pop(run_id, None)
+        if started is not None:
+            self._add("condense", time.perf_counter() - started)
+
+    def on_retriever_start(self, serialized, query, *, run_id, parent_run_id=None, **kwargs):
+        if parent_run_id not in self._retriever_runs:
+            self._outer_retriever = (run_id, time.perf_counter())
+        self._retriever_runs.add(run_id)
+
+    def on_retriever_end(self, documents, *, run_id, **kwargs):
+        if self._outer_retriever and run_id == self._outer_retriever[0]:
+            now = time.perf_counter()
+            self._add("retrieval", now - self._outer_retriever[1])
+            self._retrieved_at = now
+
+    def on_custom_event(self, name, data, *, run_id, **kwargs):
+        if name == TIMING_EVENT:
+            for stage, seconds in data.items():
+                self._add(stage, seconds)
+
+    def _llm_start(self, run_id):
+        # The condensing LLM call runs before retrieval, the answering one after
+        if self._retrieved_at is None or self._llm_run is not None:
+            return
+        now = time.perf_counter()
+        self._add("prompt_build", now - self._retrieved_at)
+        self._llm_run = (run_id, now)
+
+    def on_llm_start(self, serialized, prompts, *, run_id, **kwargs):
+        self._llm_start(run_id)
+
+    def on_chat_model_start(self, serialized, messages, *, run_id, **kwargs):
+        self._llm_start(run_id)
+
+    def on_llm_new_token(self, token, *, run_id, **kwargs):
+        if not self._first_token and self._llm_run and run_id == self._llm_run[0]:
+            self._first_token = True
+            self._add("llm_first_token", time.perf_counter() - self._llm_run[1])
+
+    def on_llm_end(self, response, *, run_id, **kwargs):
+        if self._llm_run and run_id == self._llm_run[0]:
+            self._add("llm_completion", time.perf_counter() - self._llm_run[1])
+
+    def stage(self, name: str):
+        """Context manager timing a block of the caller as stage `name`"""
+        return _Span(self, name)
+
+    def finish(self) -> Dict[str, float]:
+        """Record the request in the histograms; returns the breakdown in ms"""
+        self._add("total", time.perf_counter() - self.started)
+        self.registry.observe_many({s: v for s, v in self.timings.items() if s not in SOURCE_STAGES})
+        return breakdown_ms(self.timings)
+
+
+class _Span:
+    def __init__(self, timer: StageTimer, name: str):
+        self.timer = timer
+        self.name = name
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.timer._add(self.name, time.perf_counter() - self.started)
+
+
+def breakdown_ms(timings: Dict[str, float]) -> Dict[str, float]:
+    """Compact {stage: ms} in pipeline order"""
+    ordered = [s for s in STAGES if s in timings] + sorted(s for s in timings if s not in STAGES)
+    return {s: round(timings[s] * 1000, 1) for s in ordered}
+
+
+# ---------------------------
+# Optional scrape endpoint
+# ---------------------------
+class _MetricsHandler(BaseHTTPRequestHandler):
+    registry: MetricsRegistry = stage_metrics
+
+    def do_GET(self):
+        if self.path.startswith("/metrics.json"):
+            body, content_type = self.registry.to_json(), "application/json"
+        elif self.path.startswith("/metrics"):
+            body, content_type = self.registry.prometheus_text(), "text/plain; version=0.0.4"
+        else:
+            self.send_error(404)
+            return
+        payload = body.encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def log_message(self, format, *args):
+        pass  # no access log on stderr
+
+
+def start_metrics_server(port: int, host: str = "127.0.0.1") -> Optional[ThreadingHTTPServer]:
+    """Serve /metrics (Prometheus text) and /metrics.json on a daemon thread"""
+    try:
+        server = ThreadingHTTPServer((host, port), _MetricsHandler)
+    except OSError as e:
+        print(f"⚠️  Metrics endpoint not started on {host}:{port}: {e}")
+        return None
+    threading.Thread(target=server.serve_forever, name="metrics-http", daemon=True).start()
+    print(f"✅ Metrics endpoint on http://{host}:{port}/metrics")
+    return server
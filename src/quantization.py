@@ -0,0 +1,162 @@
+# quantization.py
+# Compact vector storage: Matryoshka-style truncation (first d dimensions,
+# re-normalized) and int8 / binary codes. The local index scans these codes
+# and rescores the best candidates with the full-precision vectors
+import os
+from typing import Optional
+
+import numpy as np
+
+QUANTIZATIONS = ("none", "int8", "binary")
+
+# Rows scored per step: the float32 copy of a block stays in the CPU cache and
+# a scan never materializes a float copy of all codes
+SCAN_BLOCK = 128
+
+# Byte value -> its 8 bits as +-1 (np.packbits order, most significant bit first)
+_BYTE_SIGNS = np.unpackbits(np.arange(256, dtype=np.uint8)[:, None], axis=1).astype(np.float32) * 2 - 1
+
+
+def _normalize_rows(matrix: np.ndarray) -> np.ndarray:
+    matrix = np.asarray(matrix, dtype=np.float32)
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return matrix / norms
+
+
+def truncate(vectors: np.ndarray, dimensions: Optional[int]) -> np.ndarray:
+    """First `dimensions` components, re-normalized (text-embedding-3 models are trained for this)"""
+    vectors = np.asarray(vectors, dtype=np.float32)
+    if dimensions and dimensions < vectors.shape[-1]:
+        vectors = vectors[..., :dimensions]
+    if vectors.ndim == 1:
+        norm = np.linalg.norm(vectors)
+        return vectors / norm if norm > 0 else vectors
+    return _normalize_rows(vectors)
+
+
+class VectorCodec:
+    """
+    Compact copy of L2-normalized vectors for the first (scan) stage.
+
+      none     float32, optionally truncated (4 bytes / dim)
+      int8     symmetric per-dimension scale (1 byte / dim)
+      binary   sign bits, scored asymmetrically against the float query (1 bit / dim)
+
+    scores() returns approximate cosine similarities (higher is better).
+    """
+
+    def __init__(self, kind: str = "int8", dimensions: Optional[int] = None):
+        if kind not in QUANTIZATIONS:
+            raise ValueError(f"Unknown quantization: {kind} (use one of {', '.join(QUANTIZATIONS)})")
+        self.kind = kind
+        self.dimensions = dimensions or None
+        self.scale: Optional[np.ndarray] = None  # int8 only
+
+    @property
+    def name(self) -> str:
+        return f"{self.kind}-{self.dimensions or 'full'}"
+
+    def _blocks(self, vectors: np.ndarray):
+        for start in range(0, len(vectors), SCAN_BLOCK):
+            yield truncate(vectors[start:start + SCAN_BLOCK], self.dimensions)
+
+    def encode(self, vectors: np.ndarray) -> np.ndarray:
+        """Codes for all rows (read block by block, so a memory-mapped source stays mostly on disk)"""
+        if self.kind == "int8" and self.scale is None:
+            peak = None
+            for block in self._blocks(vectors):
+                block_peak = np.abs(block).max(axis=0) if len(block) else None
+                peak = block_peak if peak is None else np.maximum(peak, block_peak)
+            self.scale = np.where(peak > 0, peak / 127.0, 1.0).astype(np.float32) if peak is not None else None
+        parts = [self._encode_block(block) for block in self._blocks(vectors)]
+        if not parts:
+            return np.zeros((0, 0), dtype=np.uint8 if self.kind == "binary" else np.int8)
+        return np.ascontiguousarray(np.vstack(parts))
+
+    def _encode_block(self, block: np.ndarray) -> np.ndarray:
+        if self.kind == "int8":
+            return np.clip(np.rint(block / self.scale), -127, 127).astype(np.int8)
+        if self.kind == "binary":
+            return np.packbits(block > 0, axis=1)
+        return block.astype(np.float32)
+
+    def prepare_query(self, query: np.ndarray) -> np.ndarray:
+        q = truncate(query, self.dimensions)
+        if self.kind == "int8":
+            # codes * scale . q == codes . (scale * q)
+            return (q * self.scale).astype(np.float32)
+        if self.kind == "binary":
+            # Asymmetric scoring: per code byte, a 256-entry table of its +-1 bits . q
+            # (+-1 vectors have norm sqrt(d), folded in for a cosine-like range)
+            padded = np.zeros(-(-len(q) // 8) * 8, dtype=np.float32)
+            padded[:len(q)] = q / np.sqrt(len(q))
+            return np.ascontiguousarray(padded.reshape(-1, 8) @ _BYTE_SIGNS.T).ravel()
+        return q
+
+    def scores(self, codes: np.ndarray, prepared: np.ndarray) -> np.ndarray:
+        """Approximate cosine similarity of every code row with a prepare_query() result"""
+        out = np.empty(len(codes), dtype=np.float32)
+        if self.kind == "binary":
+            # Flat table offset of each code byte position
+            offsets = np.arange(codes.shape[1], dtype=np.intp) * 256
+        for start in range(0, len(codes), SCAN_BLOCK):
+            block = codes[start:start + SCAN_BLOCK]
+            if self.kind == "binary":
+                out[start:start + len(block)] = np.take(prepared, block + offsets).sum(axis=1)
+            else:
+                out[start:start + len(block)] = block.astype(np.float32, copy=False) @ prepared
+        return out
+
+    # ---------------------------
+    # Persistence (codes next to the index, so replicas don't re-encode)
+    # ---------------------------
+    def path(self, directory: str) -> str:
+        return os.path.join(directory, f"codes-{self.name}.npz")
+
+    def save(self, directory: str, codes: np.ndarray, version: str = ""):
+        """version identifies the index build the codes belong to (its manifest's built_at)"""
+        arrays = {"codes": codes, "version": np.asarray(version)}
+        if self.scale is not None:
+            arrays["scale"] = self.scale
+        np.savez(self.path(directory), **arrays)
+
+    def load(self, directory: str, count: int, version: str = "") -> Optional[np.ndarray]:
+        path = self.path(directory)
+        if not os.path.exists(path):
+            return None
+        data = np.load(path, allow_pickle=False)
+        stored = str(data["version"]) if "version" in data.files else None
+        if stored != version or len(data["codes"]) != count:
+            return None  # stale: the index was rebuilt
+        if "scale" in data.files:
+            self.scale = data["scale"]
+        return data["codes"]
+
+
+def top_candidates(scores: np.ndarray, n: int) -> np.ndarray:
+    """Positions of the n best scores (unordered)"""
+    n = min(n, len(scores))
+    if n <= 0:
+        return np.zeros(0, dtype=np.int64)
+    return np.argpartition(-scores, n - 1)[:n]
+
+
+# ---------------------------
+# Single vectors (embedding cache)
+# ---------------------------
+def pack_int8(vector: np.ndarray) -> bytes:
+    """int8 codes + one float32 scale: about 4x smaller than float32 bytes"""
+    vector = np.asarray(vector, dtype=np.float32)
+    peak = float(np.abs(vector).max()) if len(vector) else 0.0
+    scale = peak / 127.0 if peak > 0 else 1.0
+    codes = np.clip(np.rint(vector / scale), -127, 127).astype(np.int8)
+    return np.float32(scale).tobytes() + codes.tobytes()
+
+
+def unpack_vector(blob: bytes, dim: int) -> np.ndarray:
+    """Decode a stored vector: float32 bytes or pack_int8 output (told apart by size)"""
+    if len(blob) == 4 * dim:
+        return np.frombuffer(blob, dtype=np.float32)
+    scale = np.frombuffer(blob[:4], dtype=np.float32)[0]
+    return np.frombuffer(blob[4:], dtype=np.int8).astype(np.float32) * scale
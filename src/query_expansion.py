@@ -0,0 +1,367 @@
+# query_expansion.py
+# Local cross-lingual query expansion: the corpus is German, users also ask in
+# English, Italian, French or Spanish. A stopword-based language ID and an
+# offline glossary of key GDPR terms add German query variants before
+# retrieval (no LLM round-trip).
+import re
+import threading
+import time
+import unicodedata
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+# Language of the indexed documents: queries in it are not expanded
+CORPUS_LANGUAGE = "de"
+
+# Frequent function words per language (lower-case)
+STOPWORDS: Dict[str, frozenset] = {
+    "de": frozenset((
+        "der die das den dem des ein eine einen einem einer und oder ist sind wir ich sie es muss müssen "
+        "darf dürfen kann können wie was wann welche welcher welches wer für mit von zu im in auf bei nicht "
+        "auch noch nach über unter wenn ob mein meine unsere unser sich habe haben hat werden wird"
+    ).split()),
+    "en": frozenset((
+        "the a an and or is are was were we i you it they my our your do does did can could should must "
+        "what when which who how why for with of to in on at by from not be been have has this that these "
+        "those if there any about"
+    ).split()),
+    "it": frozenset((
+        "il lo la i gli le un una uno e o è sono di del della dei delle degli da dal nella nelle nel per con "
+        "su che come quali quale quando cosa non mi ci si posso devo deve possono nostro nostra mio mia "
+        "sui alle ai al l' dell' nell' all' dall' sull' un'"
+    ).split()),
+    "fr": frozenset((
+        "le la les un une des et ou est sont de du au aux en dans pour avec sur que qui quels quelle quelles "
+        "quand comment ne pas je nous vous il elle mon ma mes notre nos dois doit peut peuvent ce cette ces "
+        "l' d' qu' j' n' s' c'"
+    ).split()),
+    "es": frozenset((
+        "el la los las un una unos unas y o es son de del al en para con por sobre que qué cuál cuáles cuando "
+        "cómo no yo nosotros mi mis nuestro nuestra debo debe puedo pueden este esta estos estas"
+    ).split()),
+}
+
+# Characters that only (or mostly) occur in one of the languages
+_CHAR_HINTS: Tuple[Tuple[str, str], ...] = (
+    ("äöüß", "de"),
+    ("ñ¿¡", "es"),
+    ("çœêâîûë", "fr"),
+    ("ìò", "it"),
+)
+
+# term (token stems, see _phrase_matches) -> German terms as used in the guides
+GLOSSARY: Dict[str, Dict[str, Tuple[str, ...]]] = {
+    "en": {
+        "data breach": ("Datenpanne", "Verletzung des Schutzes personenbezogener Daten"),
+        "breach": ("Datenpanne",),
+        "retention": ("Aufbewahrungsfrist",),
+        "retain": ("aufbewahren", "Aufbewahrungsfrist"),
+        "data protection officer": ("Datenschutzbeauftragter",),
+        "dpo": ("Datenschutzbeauftragter",),
+        "consent": ("Einwilligung",),
+        "legitimate interest": ("berechtigtes Interesse",),
+        "legal basis": ("Rechtsgrundlage",),
+        "personal data": ("personenbezogene Daten",),
+        "customer data": ("Kundendaten",),
+        "employee": ("Beschäftigtendaten", "Mitarbeiter"),
+        "applicant": ("Bewerber", "Bewerbungsunterlagen"),
+        "controller": ("Verantwortlicher",),
+        "processor": ("Auftragsverarbeiter",),
+        "data processing agreement": ("Auftragsverarbeitungsvertrag",),
+        "processing": ("Verarbeitung",),
+        "delet": ("Löschung", "löschen"),
+        "erasure": ("Recht auf Löschung",),
+        "right of access": ("Auskunftsrecht",),
+        "access request": ("Auskunftsrecht",),
+        "data subject": ("betroffene Person",),
+        "records of processing": ("Verzeichnis von Verarbeitungstätigkeiten",),
+        "impact assessment": ("Datenschutz-Folgenabschätzung",),
+        "privacy policy": ("Datenschutzerklärung",),
+        "privacy notice": ("Datenschutzhinweise", "Informationspflichten"),
+        "information obligation": ("Informationspflichten",),
+        "supervisory authority": ("Aufsichtsbehörde",),
+        "fines": ("Bußgeld",),
+        "penalt": ("Bußgeld", "Sanktionen"),
+        "video surveillance": ("Videoüberwachung",),
+        "cctv": ("Videoüberwachung",),
+        "technical and organizational measures": ("technische und organisatorische Maßnahmen",),
+        "security measure": ("technische und organisatorische Maßnahmen",),
+        "encrypt": ("Verschlüsselung",),
+        "anonymi": ("Anonymisierung",),
+        "pseudonymi": ("Pseudonymisierung",),
+        "artificial intelligence": ("Künstliche Intelligenz", "KI"),
+        "ai": ("KI",),
+        "training data": ("Trainingsdaten",),
+        "small business": ("kleine Betriebe", "Handwerksbetrieb"),
+        "craft": ("Handwerk", "Handwerksbetrieb"),
+    },
+    "it": {
+        "violazion dei dati": ("Datenpanne", "Verletzung des Schutzes personenbezogener Daten"),
+        "violazion": ("Datenpanne",),
+        "data breach": ("Datenpanne",),
+        "conservazion": ("Aufbewahrungsfrist",),
+        "conservare": ("aufbewahren", "Aufbewahrungsfrist"),
+        "responsabile della protezione dei dati": ("Datenschutzbeauftragter",),
+        "consenso": ("Einwilligung",),
+        "interesse legittimo": ("berechtigtes Interesse",),
+        "base giuridica": ("Rechtsgrundlage",),
+        "dati personali": ("personenbezogene Daten",),
+        "dati dei clienti": ("Kundendaten",),
+        "clienti": ("Kundendaten",),
+        "dati dei dipendent": ("Beschäftigtendaten",),
+        "dipendent": ("Beschäftigtendaten", "Mitarbeiter"),
+        "candidat": ("Bewerber", "Bewerbungsunterlagen"),
+        "titolare del trattamento": ("Verantwortlicher",),
+        "responsabile del trattamento": ("Auftragsverarbeiter",),
+        "trattamento": ("Verarbeitung",),
+        "cancellazion": ("Löschung",),
+        "diritto di accesso": ("Auskunftsrecht",),
+        "interessat": ("betroffene Person",),
+        "registro dei trattamenti": ("Verzeichnis von Verarbeitungstätigkeiten",),
+        "valutazione d'impatto": ("Datenschutz-Folgenabschätzung",),
+        "informativa": ("Datenschutzerklärung", "Informationspflichten"),
+        "autorità di controllo": ("Aufsichtsbehörde",),
+        "garante": ("Aufsichtsbehörde",),
+        "sanzion": ("Bußgeld", "Sanktionen"),
+        "videosorveglianza": ("Videoüberwachung",),
+        "misure tecniche": ("technische und organisatorische Maßnahmen",),
+        "crittograf": ("Verschlüsselung",),
+        "intelligenza artificiale": ("Künstliche Intelligenz", "KI"),
+        "ia": ("KI",),
+        "dati di addestramento": ("Trainingsdaten",),
+        "piccole imprese": ("kleine Betriebe", "Handwerksbetrieb"),
+        "artigian": ("Handwerk", "Handwerksbetrieb"),
+    },
+    "fr": {
+        "violation de données": ("Datenpanne", "Verletzung des Schutzes personenbezogener Daten"),
+        "violation": ("Datenpanne",),
+        "conservation": ("Aufbewahrungsfrist",),
+        "délégué à la protection des données": ("Datenschutzbeauftragter",),
+        "consentement": ("Einwilligung",),
+        "intérêt légitime": ("berechtigtes Interesse",),
+        "données personnelles": ("personenbezogene Daten",),
+        "données à caractère personnel": ("personenbezogene Daten",),
+        "données des salarié": ("Beschäftigtendaten",),
+        "salarié": ("Beschäftigtendaten", "Mitarbeiter"),
+        "employé": ("Beschäftigtendaten", "Mitarbeiter"),
+        "responsable du traitement": ("Verantwortlicher",),
+        "sous-traitant": ("Auftragsverarbeiter",),
+        "traitement": ("Verarbeitung",),
+        "effacement": ("Löschung",),
+        "suppression": ("Löschung",),
+        "droit d'accès": ("Auskunftsrecht",),
+        "analyse d'impact": ("Datenschutz-Folgenabschätzung",),
+        "autorité de contrôle": ("Aufsichtsbehörde",),
+        "amende": ("Bußgeld",),
+        "sanction": ("Bußgeld", "Sanktionen"),
+        "vidéosurveillance": ("Videoüberwachung",),
+        "intelligence artificielle": ("Künstliche Intelligenz", "KI"),
+        "ia": ("KI",),
+        "artisan": ("Handwerk", "Handwerksbetrieb"),
+    },
+    "es": {
+        "brecha de datos": ("Datenpanne", "Verletzung des Schutzes personenbezogener Daten"),
+        "violación de datos": ("Datenpanne",),
+        "brecha": ("Datenpanne",),
+        "conservación": ("Aufbewahrungsfrist",),
+        "conservar": ("aufbewahren", "Aufbewahrungsfrist"),
+        "delegado de protección de datos": ("Datenschutzbeauftragter",),
+        "consentimiento": ("Einwilligung",),
+        "interés legítimo": ("berechtigtes Interesse",),
+        "datos personales": ("personenbezogene Daten",),
+        "datos de los emplead": ("Beschäftigtendaten",),
+        "emplead": ("Beschäftigtendaten", "Mitarbeiter"),
+        "responsable del tratamiento": ("Verantwortlicher",),
+        "encargado del tratamiento": ("Auftragsverarbeiter",),
+        "tratamiento": ("Verarbeitung",),
+        "supresión": ("Löschung",),
+        "derecho de acceso": ("Auskunftsrecht",),
+        "evaluación de impacto": ("Datenschutz-Folgenabschätzung",),
+        "autoridad de control": ("Aufsichtsbehörde",),
+        "multa": ("Bußgeld",),
+        "sanci": ("Bußgeld", "Sanktionen"),
+        "videovigilancia": ("Videoüberwachung",),
+        "inteligencia artificial": ("Künstliche Intelligenz", "KI"),
+        "ia": ("KI",),
+        "artesan": ("Handwerk", "Handwerksbetrieb"),
+    },
+}
+
+_WORD_RE = re.compile(r"[\w'-]+", re.UNICODE)
+
+# Elided articles and prepositions (it / fr) split off as their own token:
+# "dell'IA" -> "dell'", "IA"; glossary phrases are tokenized the same way
+_ELISIONS = frozenset((
+    "l", "d", "dell", "nell", "all", "dall", "sull", "coll", "un", "quest",
+    "qu", "j", "n", "s", "c", "m", "t", "jusqu", "lorsqu", "puisqu",
+))
+
+# "data" right after a term whose German compound already says it
+# ("employee data" -> "Beschäftigtendaten", not "Beschäftigtendaten data")
+_DATA_WORDS = frozenset(("data", "dati", "données", "datos"))
+
+
+def _tokens(text: str, lower: bool = True) -> List[str]:
+    text = unicodedata.normalize("NFC", text or "").replace("\u2019", "'")
+    tokens = []
+    for token in _WORD_RE.findall(text.lower() if lower else text):
+        head, apostrophe, rest = token.partition("'")
+        if apostrophe and rest and head.lower() in _ELISIONS:
+            tokens.extend((head + apostrophe, rest))
+        else:
+            tokens.append(token)
+    return tokens
+
+
+def _join(tokens: Sequence[str]) -> str:
+    """Tokens back to text, elided words attached again ("dell'" + "KI" -> "dell'KI")"""
+    return " ".join(tokens).replace("' ", "'")
+
+
+def detect_language(text: str) -> Tuple[str, float]:
+    """
+    (language code, confidence) from stopword and character counts, or
+    ("unknown", 0.0) when nothing decides (e.g. a bare keyword query)
+    """
+    tokens = _tokens(text)
+    scores = {lang: sum(t in words for t in tokens) for lang, words in STOPWORDS.items()}
+    lowered = (text or "").lower()
+    for chars, lang in _CHAR_HINTS:
+        scores[lang] += 2 * sum(lowered.count(c) for c in chars)
+    total = sum(scores.values())
+    best = max(scores, key=scores.get)
+    if not total or list(scores.values()).count(scores[best]) > 1:
+        return "unknown", 0.0
+    return best, round(scores[best] / total, 2)
+
+
+def _bucket(token: str) -> str:
+    return token[:4]
+
+
+def _phrase_matches(tokens: Sequence[str], start: int, phrase: Sequence[str]) -> bool:
+    """Short phrase tokens must match whole words, longer ones match as prefixes (inflections)"""
+    if start + len(phrase) > len(tokens):
+        return False
+    return all(
+        tokens[start + i] == p if len(p) < 4 else tokens[start + i].startswith(p) for i, p in enumerate(phrase)
+    )
+
+
+@dataclass
+class Expansion:
+    language: str
+    confidence: float
+    terms: List[str] = field(default_factory=list)  # German glossary terms found
+    variants: List[str] = field(default_factory=list)  # extra queries (original not included)
+
+
+class QueryExpander:
+    """
+    Adds German variants of a non-German question:
+
+      1. the question with every glossary term replaced by its German term
+      2. the German terms alone (a compact keyword query)
+
+    Longer glossary phrases win over their parts ("data breach" before
+    "breach"). German and unmatched questions get no variants. Pure Python
+    over a few dozen tokens: microseconds per query.
+    """
+
+    def __init__(
+        self,
+        glossary: Optional[Dict[str, Dict[str, Sequence[str]]]] = None,
+        max_variants: int = 2,
+        corpus_language: str = CORPUS_LANGUAGE,
+    ):
+        glossary = GLOSSARY if glossary is None else glossary
+        # Per language: first-token bucket -> [(phrase tokens, German terms)]
+        self.glossary: Dict[str, Dict[str, List[Tuple[List[str], Tuple[str, ...]]]]] = {}
+        for lang, terms in glossary.items():
+            buckets = self.glossary.setdefault(lang, {})
+            for term, german in terms.items():
+                phrase = _tokens(term)
+                buckets.setdefault(_bucket(phrase[0]), []).append((phrase, tuple(german)))
+        self.max_variants = max_variants
+        self.corpus_language = corpus_language
+        self._lock = threading.Lock()
+        self._stats = {"queries": 0, "expanded": 0, "variants": 0, "expand_us": 0.0}
+        self._languages: Dict[str, int] = {}
+
+    def _lookup(self, tokens: List[str], language: str) -> Tuple[List[str], List[Tuple[int, int, Tuple[str, ...]]]]:
+        """German terms and the token spans they replace (non-overlapping)"""
+        # A language we can't tell apart: try every glossary
+        languages = [language] if language in self.glossary else list(self.glossary)
+        candidates = []
+        for lang in languages:
+            buckets = self.glossary[lang]
+            for start, token in enumerate(tokens):
+                for phrase, german in buckets.get(_bucket(token), ()):
+                    if _phrase_matches(tokens, start, phrase):
+                        candidates.append((start, start + len(phrase), german))
+        # Longer phrases win over their parts ("data breach" before "breach")
+        candidates.sort(key=lambda c: (c[0] - c[1], c[0]))
+        taken = [False] * len(tokens)
+        terms: List[str] = []
+        spans = []
+        for start, end, german in candidates:
+            if any(taken[start:end]):
+                continue
+            taken[start:end] = [True] * (end - start)
+            spans.append((start, end, german))
+            terms.extend(t for t in german if t not in terms)
+        # The replacement covers a trailing "data" its German compound already contains
+        for position, (start, end, german) in enumerate(spans):
+            if end < len(tokens) and not taken[end] and tokens[end] in _DATA_WORDS and german[0].lower().endswith("daten"):
+                taken[end] = True
+                spans[position] = (start, end + 1, german)
+        return terms, sorted(spans)
+
+    def expand(self, query: str, record: bool = True) -> Expansion:
+        """Language and German variants of query (record=False: don't count it in stats)"""
+        started = time.perf_counter()
+        language, confidence = detect_language(query)
+        expansion = Expansion(language=language, confidence=confidence)
+        if language != self.corpus_language and self.max_variants > 0:
+            tokens = _tokens(query)
+            terms, spans = self._lookup(tokens, language)
+            if terms:
+                expansion.terms = terms
+                # Same tokenization, original casing for the rewritten question
+                original = _tokens(query, lower=False)
+                parts, position = [], 0
+                for start, end, german in spans:
+                    parts.extend(original[position:start])
+                    if parts and parts[-1].endswith("'"):
+                        parts.pop()  # "dell'" + German term: drop the elided article
+                    parts.append(german[0])
+                    position = end
+                parts.extend(original[position:])
+                variants = [_join(parts), " ".join(terms)]
+                expansion.variants = list(dict.fromkeys(v for v in variants if v != query))[:self.max_variants]
+        if record:
+            with self._lock:
+                self._stats["queries"] += 1
+                self._stats["expand_us"] += (time.perf_counter() - started) * 1e6
+                self._languages[language] = self._languages.get(language, 0) + 1
+                if expansion.variants:
+                    self._stats["expanded"] += 1
+                    self._stats["variants"] += len(expansion.variants)
+        return expansion
+
+    def lexical_query(self, query: str) -> str:
+        """Query for the BM25 leg: the question plus its German terms"""
+        terms = self.expand(query, record=False).terms
+        return f"{query} {' '.join(terms)}" if terms else query
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            queries = self._stats["queries"]
+            return {
+                "queries": queries,
+                "expanded": self._stats["expanded"],
+                "expanded_rate": round(self._stats["expanded"] / queries, 3) if queries else 0.0,
+                "variants": self._stats["variants"],
+                "mean_expand_us": round(self._stats["expand_us"] / queries, 1) if queries else 0.0,
+                "languages": dict(self._languages),
+            }
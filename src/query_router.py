@@ -0,0 +1,283 @@
+# query_router.py
+# Local query router: predicts the likely source document (document_type) and
+# topic (content_category) of a question and turns it into a Pinecone-style
+# metadata filter, so vector search runs over a smaller, more precise set.
+#
+#   python -m src.query_router   # precompute label centroids from the local index
+import argparse
+import re
+import threading
+import time
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+# Keyword cues per source document (lower-case, see _keyword_hits)
+DOCUMENT_KEYWORDS: Dict[str, Tuple[str, ...]] = {
+    "bitkom_ai_gdpr_handbook": (
+        "ki", "ki-", "künstliche intelligenz", "ai", "artificial intelligence", "machine learning",
+        "maschinelles lernen", "llm", "sprachmodell", "language model", "chatbot", "chatgpt",
+        "trainingsdaten", "training data", "algorithm", "neuronal", "neural", "ai act", "ki-verordnung",
+        "generative", "prompt",
+    ),
+    # Craft-specific words only: "betrieb", "angebot", "rechnung" occur in any business question
+    "zdh_gdpr_handbook": (
+        "handwerk", "craft", "werkstatt", "meister", "innung", "handwerkskammer",
+        "geselle", "azubi", "auszubildende", "baustelle",
+    ),
+}
+
+# Fields a centroid classifier is built for (labels present in the index)
+ROUTED_FIELDS = ("document_type", "content_category")
+
+_WORD_RE = re.compile(r"[\wäöüß-]+", re.UNICODE)
+
+
+def _keyword_hits(query: str, keywords: Sequence[str]) -> int:
+    text = " " + " ".join(_WORD_RE.findall(query.lower())) + " "
+    hits = 0
+    for k in keywords:
+        # Short cues ("ki", "ai", "llm") must be whole words, longer ones match as prefixes
+        needle = f" {k}" if len(k) >= 5 or k.endswith("-") else f" {k} "
+        hits += needle in text
+    return hits
+
+
+# ---------------------------
+# Label centroids (embedding-space classifier)
+# ---------------------------
+def build_centroids(
+    vectors: np.ndarray, metadatas: Sequence[Dict], fields: Sequence[str] = ROUTED_FIELDS, min_count: int = 3
+) -> Dict[str, Tuple[List[str], np.ndarray]]:
+    """
+    Mean (L2-normalized) vector per metadata label: {field: (labels, matrix)}.
+    Fields with fewer than two labels of min_count chunks are skipped.
+    """
+    vectors = np.asarray(vectors, dtype=np.float32)
+    centroids = {}
+    for field in fields:
+        rows: Dict[str, List[int]] = {}
+        for position, metadata in enumerate(metadatas):
+            label = (metadata or {}).get(field)
+            if label is not None:
+                rows.setdefault(str(label), []).append(position)
+        labels = sorted(label for label, idx in rows.items() if len(idx) >= min_count)
+        if len(labels) < 2:
+            continue
+        matrix = np.vstack([vectors[rows[label]].mean(axis=0) for label in labels])
+        norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+        norms[norms == 0] = 1.0
+        centroids[field] = (labels, np.ascontiguousarray(matrix / norms, dtype=np.float32))
+    return centroids
+
+
+def index_labels(metadatas: Sequence[Dict], fields: Sequence[str] = ROUTED_FIELDS) -> Dict[str, set]:
+    """Labels present in the index per field (the router never routes elsewhere)"""
+    labels: Dict[str, set] = {field: set() for field in fields}
+    for metadata in metadatas:
+        for field in fields:
+            value = (metadata or {}).get(field)
+            if value is not None:
+                labels[field].add(str(value))
+    return labels
+
+
+def save_centroids(path: str, centroids: Dict[str, Tuple[List[str], np.ndarray]], document_types: Iterable[str] = ()):
+    """Centroids plus the source documents they were built from (checked against the searched index)"""
+    arrays = {"__document_types": np.asarray(sorted(document_types), dtype=str)}
+    for field, (labels, matrix) in centroids.items():
+        arrays[f"{field}__labels"] = np.asarray(labels)
+        arrays[f"{field}__matrix"] = matrix
+    np.savez(path, **arrays)
+
+
+def centroid_document_types(path: str) -> set:
+    """Source documents a centroids file was built from (empty for files without that record)"""
+    data = np.load(path, allow_pickle=False)
+    if "__document_types" not in data.files:
+        return set()
+    return {str(label) for label in data["__document_types"]}
+
+
+def load_centroids(path: str) -> Dict[str, Tuple[List[str], np.ndarray]]:
+    data = np.load(path, allow_pickle=False)
+    centroids = {}
+    for key in data.files:
+        if key.endswith("__labels"):
+            field = key[: -len("__labels")]
+            centroids[field] = ([str(label) for label in data[key]], data[f"{field}__matrix"].astype(np.float32))
+    return centroids
+
+
+class QueryRouter:
+    """
+    Predicts metadata labels of a question and returns a metadata filter
+    (or None when unsure, which keeps the unfiltered search).
+
+      document_type      keyword cues (AI vs. craft-business vocabulary): at
+                         least min_keyword_hits cues, or fewer when the nearest
+                         document centroid agrees; without cues the nearest
+                         document centroid
+      content_category   nearest category centroid
+
+    A centroid label is only used when it beats the runner-up by `margin`
+    (cosine), and only labels that exist in the index are routed to. Both
+    checks are a handful of dot products: microseconds per query.
+    """
+
+    def __init__(
+        self,
+        centroids: Optional[Dict[str, Tuple[List[str], np.ndarray]]] = None,
+        document_keywords: Optional[Dict[str, Sequence[str]]] = None,
+        margin: float = 0.05,
+        fields: Sequence[str] = ROUTED_FIELDS,
+        known_labels: Optional[Dict[str, set]] = None,
+        min_keyword_hits: int = 2,
+    ):
+        self.centroids = centroids or {}
+        self.min_keyword_hits = min_keyword_hits
+        self.known_labels = known_labels or {}
+        self.document_keywords = DOCUMENT_KEYWORDS if document_keywords is None else document_keywords
+        self.margin = margin
+        self.fields = tuple(fields)
+        self._lock = threading.Lock()
+        self._stats = {"queries": 0, "routed": 0, "fallbacks": 0, "route_us": 0.0}
+        self._labels: Dict[str, int] = {}
+
+    def _known(self, field: str) -> Optional[set]:
+        if field in self.known_labels:
+            return set(self.known_labels[field])
+        if field in self.centroids:
+            return set(self.centroids[field][0])
+        return None  # unknown index content (Pinecone): trust the keyword table
+
+    def _by_keywords(self, query: str) -> Tuple[Optional[str], int]:
+        """(document type, cue hits), or (None, 0) without an unambiguous cue"""
+        known = self._known("document_type")
+        if known is not None and len(known) < 2:
+            return None, 0  # a filter on the only document would not narrow anything
+        hits = {
+            label: _keyword_hits(query, keywords)
+            for label, keywords in self.document_keywords.items()
+            if known is None or label in known
+        }
+        hits = {label: n for label, n in hits.items() if n}
+        # Only an unambiguous cue routes (one document type mentioned)
+        return next(iter(hits.items())) if len(hits) == 1 else (None, 0)
+
+    def _by_centroid(self, field: str, vector: np.ndarray) -> Optional[str]:
+        labels, matrix = self.centroids[field]
+        scores = matrix @ vector
+        if len(scores) < 2:
+            return None
+        second, best = np.partition(scores, -2)[-2:]
+        return labels[int(np.argmax(scores))] if best - second >= self.margin else None
+
+    def predict(self, query: str, vector: Optional[Sequence[float]] = None) -> Dict[str, str]:
+        """{field: label} for the fields the router is confident about"""
+        labels: Dict[str, str] = {}
+        q = None
+        if vector is not None and self.centroids:
+            q = np.asarray(vector, dtype=np.float32)
+            norm = np.linalg.norm(q)
+            q = q / norm if norm > 0 else q
+        for field in self.fields:
+            label, hits = self._by_keywords(query) if field == "document_type" else (None, 0)
+            if label is not None and hits < self.min_keyword_hits:
+                # A single cue is weak evidence: it routes only if the nearest centroid agrees
+                if q is None or field not in self.centroids:
+                    continue
+                centroid_labels, matrix = self.centroids[field]
+                if centroid_labels[int(np.argmax(matrix @ q))] != label:
+                    continue
+            if label is None and q is not None and field in self.centroids:
+                label = self._by_centroid(field, q)
+            if label is not None:
+                labels[field] = label
+        return labels
+
+    def route(self, query: str, vector: Optional[Sequence[float]] = None) -> Optional[Dict[str, Any]]:
+        """Pinecone-style metadata filter for the question, or None"""
+        started = time.perf_counter()
+        labels = self.predict(query, vector)
+        with self._lock:
+            self._stats["queries"] += 1
+            self._stats["route_us"] += (time.perf_counter() - started) * 1e6
+            if labels:
+                self._stats["routed"] += 1
+                for field, label in labels.items():
+                    key = f"{field}={label}"
+                    self._labels[key] = self._labels.get(key, 0) + 1
+        return dict(labels) or None
+
+    def record_fallback(self):
+        """The filtered search returned too few chunks and was widened"""
+        with self._lock:
+            self._stats["fallbacks"] += 1
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            queries = self._stats["queries"]
+            return {
+                "queries": queries,
+                "routed": self._stats["routed"],
+                "routed_rate": round(self._stats["routed"] / queries, 3) if queries else 0.0,
+                "fallbacks": self._stats["fallbacks"],
+                "mean_route_us": round(self._stats["route_us"] / queries, 1) if queries else 0.0,
+                "labels": dict(self._labels),
+                "centroid_fields": sorted(self.centroids),
+            }
+
+
+def merge_filters(base: Optional[Dict], extra: Optional[Dict]) -> Optional[Dict]:
+    """AND two metadata filters (either may be None)"""
+    if not base:
+        return extra or None
+    if not extra:
+        return base
+    return {"$and": [base, extra]}
+
+
+# ---------------------------
+# CLI: centroids from the local index, or from the Pinecone index itself.
+# The backend only routes by centroid when they cover every source document
+# of the searched index
+# ---------------------------
+def _pinecone_vectors(name: str) -> Tuple[np.ndarray, List[Dict]]:
+    from pinecone import Pinecone
+
+    from src.lexical_index import iter_pinecone_chunks
+
+    index = Pinecone().Index(name)
+    chunks = list(iter_pinecone_chunks(index, with_values=True))
+    return np.asarray([chunk["values"] for chunk in chunks], dtype=np.float32), [chunk["metadata"] for chunk in chunks]
+
+
+def main():
+    from src.lexical_index import document_types
+
+    parser = argparse.ArgumentParser(description="Precompute query-router label centroids")
+    parser.add_argument("--index", default="2_data/processed/local_index", help="Local index directory")
+    parser.add_argument("--pinecone-index", help="Build from this Pinecone index instead (needs PINECONE_API_KEY)")
+    parser.add_argument("--out", default="2_data/processed/router_centroids.npz", help="Output file")
+    parser.add_argument("--min-count", type=int, default=3, help="Chunks a label needs to get a centroid")
+    args = parser.parse_args()
+
+    if args.pinecone_index:
+        vectors, metadatas = _pinecone_vectors(args.pinecone_index)
+    else:
+        from src.local_index import LocalVectorStore
+
+        store = LocalVectorStore.load(args.index, embedding=None)
+        vectors, metadatas = store.vectors, store.metadatas
+    centroids = build_centroids(vectors, metadatas, min_count=args.min_count)
+    sources = document_types(metadatas)
+    save_centroids(args.out, centroids, sources)
+    for field, (labels, _) in centroids.items():
+        print(f"   {field}: {', '.join(labels)}")
+    print(f"   built from: {', '.join(sorted(sources)) or '(no document_type)'}")
+    print(f"✅ Router centroids for {len(centroids)} field(s) -> {args.out}")
+
+
+if __name__ == "__main__":
+    main()
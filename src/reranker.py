@@ -0,0 +1,205 @@
+# reranker.py
+# Local cross-encoder re-ranking (ONNX Runtime, quantized) with a per-query time budget
+import argparse
+import glob
+import importlib.util
+import os
+import pickle
+import platform
+import threading
+import time
+from typing import Dict, List, Optional, Sequence
+
+import numpy as np
+from langchain_core.documents import Document
+
+DEFAULT_REPO = "cross-encoder/mmarco-mMiniLMv2-L12-H384-v1"
+TOKENIZER_FILE = "tokenizer.json"
+
+
+def _find_model_file(model_dir: str) -> Optional[str]:
+    """
+    Prefer a quantized ONNX export over fp32: model_quantized.onnx, then the
+    qint8 build for this CPU (arm64 / avx2), then any other .onnx file
+    """
+    candidates = sorted(glob.glob(os.path.join(model_dir, "**", "*.onnx"), recursive=True))
+    if not candidates:
+        return None
+    arch = "arm64" if platform.machine().lower() in ("arm64", "aarch64") else "avx2"
+
+    def preference(path: str) -> int:
+        name = os.path.basename(path)
+        if "quantized" in name:
+            return 0
+        if "qint8" in name:
+            return 1 if arch in name else 3
+        if name == "model.onnx":
+            return 2
+        return 4
+
+    return min(candidates, key=preference)
+
+
+def _find_tokenizer_file(model_dir: str) -> Optional[str]:
+    matches = sorted(glob.glob(os.path.join(model_dir, "**", TOKENIZER_FILE), recursive=True))
+    return matches[0] if matches else None
+
+
+def reranker_available(model_dir: str) -> bool:
+    """True if onnxruntime + tokenizers are installed and model_dir holds a model and tokenizer"""
+    if importlib.util.find_spec("onnxruntime") is None or importlib.util.find_spec("tokenizers") is None:
+        return False
+    return os.path.isdir(model_dir) and _find_model_file(model_dir) is not None and _find_tokenizer_file(model_dir) is not None
+
+
+class CrossEncoderReranker:
+    """
+    Scores (query, passage) pairs with a small multilingual cross-encoder
+    exported to ONNX (default: mmarco-mMiniLMv2-L12, int8-quantized).
+
+    Pairs are sorted by length and scored in batches to keep padding low.
+    If the time budget (checked before and after every batch) runs out before
+    every pair is scored, the original retrieval order is returned unchanged
+    (a partial re-ranking would mix two incomparable orders).
+    """
+
+    def __init__(
+        self,
+        model_dir: str,
+        batch_size: int = 8,
+        max_length: int = 384,
+        max_passage_chars: int = 2000,
+        threads: int = 2,
+    ):
+        import onnxruntime as ort
+        from tokenizers import Tokenizer
+
+        model_file = _find_model_file(model_dir)
+        tokenizer_file = _find_tokenizer_file(model_dir)
+        if model_file is None or tokenizer_file is None:
+            raise ValueError(f"No ONNX model / {TOKENIZER_FILE} found in {model_dir}")
+
+        options = ort.SessionOptions()
+        options.intra_op_num_threads = threads
+        options.inter_op_num_threads = 1
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        self.session = ort.InferenceSession(model_file, options, providers=["CPUExecutionProvider"])
+        self.input_names = {i.name for i in self.session.get_inputs()}
+
+        self.tokenizer = Tokenizer.from_file(tokenizer_file)
+        self.tokenizer.enable_truncation(max_length=max_length)
+        self.tokenizer.enable_padding()
+
+        self.model_file = model_file
+        self.batch_size = batch_size
+        self.max_passage_chars = max_passage_chars
+
+        self._stats_lock = threading.Lock()
+        self._stats = {"queries": 0, "reranked": 0, "budget_exceeded": 0, "errors": 0, "total_ms": 0.0}
+
+    # ---------------------------
+    # Scoring
+    # ---------------------------
+    def _score_batch(self, query: str, passages: Sequence[str]) -> np.ndarray:
+        encodings = self.tokenizer.encode_batch([(query, p[:self.max_passage_chars]) for p in passages])
+        feed = {
+            "input_ids": np.array([e.ids for e in encodings], dtype=np.int64),
+            "attention_mask": np.array([e.attention_mask for e in encodings], dtype=np.int64),
+        }
+        if "token_type_ids" in self.input_names:
+            feed["token_type_ids"] = np.array([e.type_ids for e in encodings], dtype=np.int64)
+        logits = self.session.run(None, feed)[0]
+        return np.asarray(logits, dtype=np.float32).reshape(len(passages), -1)[:, -1]
+
+    def score(self, query: str, passages: Sequence[str], deadline: Optional[float] = None) -> Optional[np.ndarray]:
+        """Relevance score per passage, or None if the deadline (time.monotonic()) passed"""
+        scores = np.zeros(len(passages), dtype=np.float32)
+        by_length = sorted(range(len(passages)), key=lambda i: len(passages[i]))
+        for start in range(0, len(by_length), self.batch_size):
+            if deadline is not None and time.monotonic() > deadline:
+                return None
+            batch = by_length[start:start + self.batch_size]
+            scores[batch] = self._score_batch(query, [passages[i] for i in batch])
+            # A batch that started in time but finished late still misses the budget
+            if deadline is not None and time.monotonic() > deadline:
+                return None
+        return scores
+
+    def rerank(
+        self, query: str, docs: List[Document], top_n: int = 4, budget_ms: Optional[float] = None
+    ) -> List[Document]:
+        """Best top_n documents by cross-encoder score (original order on timeout / error)"""
+        if len(docs) <= 1:
+            return docs[:top_n]
+        started = time.monotonic()
+        deadline = started + budget_ms / 1000.0 if budget_ms else None
+        outcome = "reranked"
+        try:
+            scores = self.score(query, [d.page_content for d in docs], deadline)
+        except Exception as e:
+            print(f"⚠️  Re-ranking failed, keeping retrieval order: {e}")
+            scores, outcome = None, "errors"
+        if scores is None and outcome == "reranked":
+            outcome = "budget_exceeded"
+
+        with self._stats_lock:
+            self._stats["queries"] += 1
+            self._stats[outcome] += 1
+            self._stats["total_ms"] += (time.monotonic() - started) * 1000
+
+        if scores is None:
+            return docs[:top_n]
+        order = np.argsort(-scores, kind="stable")[:top_n]
+        reranked = []
+        for i in order:
+            doc = docs[int(i)]
+            reranked.append(Document(
+                id=getattr(doc, "id", None),
+                page_content=doc.page_content,
+                metadata={**(doc.metadata or {}), "rerank_score": float(scores[int(i)])},
+            ))
+        return reranked
+
+    def stats(self) -> Dict[str, float]:
+        with self._stats_lock:
+            stats = dict(self._stats)
+        stats["avg_ms"] = stats["total_ms"] / stats["queries"] if stats["queries"] else 0.0
+        return stats
+
+
+# ---------------------------
+# CLI: fetch an ONNX export of the cross-encoder and time it
+# ---------------------------
+def main():
+    parser = argparse.ArgumentParser(description="Download and benchmark the local cross-encoder re-ranker")
+    parser.add_argument("--repo", default=DEFAULT_REPO, help="Hugging Face repo with an onnx/ export")
+    parser.add_argument("--out", default="2_data/models/reranker", help="Model directory")
+    parser.add_argument("--skip-download", action="store_true")
+    parser.add_argument("--query", default="Wann braucht ein Handwerksbetrieb einen Datenschutzbeauftragten?")
+    parser.add_argument("--chunks", default="2_data/processed/chunks.pkl")
+    parser.add_argument("--n", type=int, default=20, help="Passages per query")
+    args = parser.parse_args()
+
+    if not args.skip_download:
+        from huggingface_hub import snapshot_download
+        snapshot_download(
+            repo_id=args.repo,
+            local_dir=args.out,
+            allow_patterns=["tokenizer.json", "config.json", "onnx/model_quantized.onnx", "onnx/*qint8*.onnx", "onnx/model.onnx"],
+        )
+
+    with open(args.chunks, "rb") as f:
+        chunks = pickle.load(f)
+    docs = [Document(page_content=c["page_content"], metadata=c["metadata"]) for c in chunks[:args.n]]
+
+    reranker = CrossEncoderReranker(args.out)
+    reranker.rerank(args.query, docs)  # warm-up
+    started = time.perf_counter()
+    top = reranker.rerank(args.query, docs, top_n=3)
+    print(f"✅ {os.path.basename(reranker.model_file)}: {len(docs)} passages in {(time.perf_counter() - started) * 1000:.0f} ms")
+    for doc in top:
+        print(f"   {doc.metadata['rerank_score']:.3f}  p.{doc.metadata.get('page_number')}  {doc.page_content[:80]!r}")
+
+
+if __name__ == "__main__":
+    main()
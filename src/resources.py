@@ -0,0 +1,217 @@
+# resources.py
+# Process-wide pool of warm clients: Pinecone, OpenAI embeddings and chat LLM
+# The SDKs (pinecone, langchain_openai, httpx) are imported when a client is
+# first created, so importing this module stays cheap
+import threading
+import time
+from typing import TYPE_CHECKING, Any, Dict, Optional
+
+if TYPE_CHECKING:
+    import httpx
+    from langchain_openai import ChatOpenAI, OpenAIEmbeddings
+    from pinecone import Pinecone
+
+    from src.http_transport import CountingTransport
+
+
+class ResourcePool:
+    """
+    Creates the expensive clients once per process and hands out the same
+    instances on every call. All OpenAI traffic (embeddings + chat) goes
+    through one shared httpx connection pool, and the Pinecone index handle
+    keeps its own keep-alive pool, so TLS handshakes are paid once.
+
+    Index readiness (list_indexes / describe_index) is checked on a
+    background thread instead of on the request path.
+    """
+
+    def __init__(
+        self,
+        openai_api_key: Optional[str],
+        pinecone_api_key: Optional[str],
+        index_name: str = "gdpr-compliance-openai",
+        index_host: Optional[str] = None,
+        embedding_model: str = "text-embedding-3-small",
+        llm_model: str = "gpt-3.5-turbo",
+        max_connections: int = 20,
+        pinecone_pool_threads: int = 4,
+    ):
+        self.openai_api_key = openai_api_key
+        self.pinecone_api_key = pinecone_api_key
+        self.index_name = index_name
+        self.index_host = index_host
+        self.embedding_model = embedding_model
+        self.llm_model = llm_model
+        self.max_connections = max_connections
+        self.pinecone_pool_threads = pinecone_pool_threads
+
+        self._lock = threading.RLock()
+        self._instances: Dict[str, Any] = {}
+        self._counters: Dict[str, Dict[str, int]] = {}
+        self._transport: Optional["CountingTransport"] = None
+
+        # Background readiness state
+        self._ready = threading.Event()
+        self._readiness_thread: Optional[threading.Thread] = None
+        self._index_status = "unknown"  # unknown | checking | ready | missing | error
+        self._index_error: Optional[str] = None
+        self._checked_at: Optional[float] = None
+
+    # ---------------------------
+    # Generic get-or-create with reuse counters
+    # ---------------------------
+    def _get_or_create(self, name: str, factory):
+        instance = self._instances.get(name)
+        if instance is not None:
+            # Lock-free lookup, but counters are only ever changed under the lock
+            with self._lock:
+                self._counters[name]["reused"] += 1
+            return instance
+        with self._lock:
+            counters = self._counters.setdefault(name, {"created": 0, "reused": 0})
+            instance = self._instances.get(name)
+            if instance is None:
+                instance = factory()
+                self._instances[name] = instance
+                counters["created"] += 1
+            else:
+                counters["reused"] += 1
+            return instance
+
+    # ---------------------------
+    # Clients
+    # ---------------------------
+    def http_client(self) -> "httpx.Client":
+        """Shared keep-alive HTTP client for all OpenAI calls"""
+        def _build():
+            import httpx
+            from src.http_transport import CountingTransport
+
+            self._transport = CountingTransport(
+                limits=httpx.Limits(
+                    max_connections=self.max_connections,
+                    max_keepalive_connections=self.max_connections,
+                    keepalive_expiry=120,
+                ),
+            )
+            return httpx.Client(transport=self._transport, timeout=httpx.Timeout(60.0, connect=10.0))
+        return self._get_or_create("http_client", _build)
+
+    def pinecone_client(self) -> "Pinecone":
+        if not self.pinecone_api_key:
+            raise ValueError("PINECONE_API_KEY is missing!")
+
+        def _build():
+            from pinecone import Pinecone
+            return Pinecone(api_key=self.pinecone_api_key, pool_threads=self.pinecone_pool_threads)
+        return self._get_or_create("pinecone_client", _build)
+
+    def index(self):
+        """Pinecone index handle (no control-plane round-trip when index_host is set)"""
+        def _build():
+            pc = self.pinecone_client()
+            if self.index_host:
+                return pc.Index(host=self.index_host)
+            return pc.Index(self.index_name)
+        return self._get_or_create("index", _build)
+
+    def embeddings(self) -> "OpenAIEmbeddings":
+        if not self.openai_api_key:
+            raise ValueError("OPENAI_API_KEY is missing!")
+
+        def _build():
+            from langchain_openai import OpenAIEmbeddings
+            return OpenAIEmbeddings(
+                model=self.embedding_model,
+                openai_api_key=self.openai_api_key,
+                http_client=self.http_client(),
+            )
+        return self._get_or_create("embeddings", _build)
+
+    def llm(self) -> "ChatOpenAI":
+        if not self.openai_api_key:
+            raise ValueError("OPENAI_API_KEY is missing!")
+
+        def _build():
+            from langchain_openai import ChatOpenAI
+            return ChatOpenAI(
+                openai_api_key=self.openai_api_key,
+                model_name=self.llm_model,
+                temperature=0.0,
+                max_tokens=500,
+                # Stream from the API so callers can forward tokens as they arrive;
+                # invoke() still returns the full message
+                streaming=True,
+                http_client=self.http_client(),
+            )
+        return self._get_or_create("llm", _build)
+
+    # ---------------------------
+    # Readiness
+    # ---------------------------
+    def start_readiness_check(self, poll_interval: float = 1.0, timeout: float = 120.0) -> threading.Thread:
+        """Check (once) in the background that the Pinecone index exists and is ready"""
+        with self._lock:
+            if self._readiness_thread is not None:
+                return self._readiness_thread
+            self._readiness_thread = threading.Thread(
+                target=self._check_readiness,
+                args=(poll_interval, timeout),
+                name="pinecone-readiness",
+                daemon=True,
+            )
+            self._index_status = "checking"
+            self._readiness_thread.start()
+            return self._readiness_thread
+
+    def _check_readiness(self, poll_interval: float, timeout: float):
+        try:
+            pc = self.pinecone_client()
+            if self.index_name not in pc.list_indexes().names():
+                print(f"⚠️  Index '{self.index_name}' not found.")
+                self._index_status = "missing"
+                return
+            deadline = time.monotonic() + timeout
+            while not pc.describe_index(self.index_name).status.ready:
+                if time.monotonic() > deadline:
+                    self._index_status = "error"
+                    self._index_error = f"Index not ready after {timeout:.0f}s"
+                    return
+                time.sleep(poll_interval)
+            self._index_status = "ready"
+        except Exception as e:
+            self._index_status = "error"
+            self._index_error = str(e)
+            print(f"❌ Pinecone readiness check failed: {e}")
+        finally:
+            self._checked_at = time.time()
+            self._ready.set()
+
+    def wait_until_ready(self, timeout: Optional[float] = None) -> bool:
+        """Block until the readiness check finished; True if the index is ready"""
+        self._ready.wait(timeout)
+        return self._index_status == "ready"
+
+    # ---------------------------
+    # Health / metrics
+    # ---------------------------
+    def health(self) -> Dict[str, Any]:
+        with self._lock:
+            resources = {name: dict(c) for name, c in self._counters.items()}
+        return {
+            "index_name": self.index_name,
+            "index_status": self._index_status,
+            "index_error": self._index_error,
+            "checked_at": self._checked_at,
+            "resources": resources,
+            "http": self._transport.stats() if self._transport is not None else {},
+        }
+
+    def close(self):
+        """Close pooled connections (mainly for tests and shutdown hooks)"""
+        with self._lock:
+            client = self._instances.pop("http_client", None)
+            if client is not None:
+                client.close()
+            self._instances.clear()
+            self._transport = None
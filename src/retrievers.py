@@ -0,0 +1,261 @@
+# retrievers.py
+# Retriever stages that plug into ConversationalRetrievalChain
+import asyncio
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List, Optional, Sequence
+
+from langchain_core.callbacks import AsyncCallbackManagerForRetrieverRun, CallbackManagerForRetrieverRun
+from langchain_core.documents import Document
+from langchain_core.retrievers import BaseRetriever
+from langchain_core.vectorstores import VectorStore
+
+from src.dedup import NearDuplicateIndex, content_hash, simhash
+from src.lexical_index import LexicalIndex
+from src.metrics import areport_timings, report_timings
+from src.query_router import merge_filters
+
+
+def drop_duplicates(docs: List[Document], max_distance: int = 3) -> List[Document]:
+    """Keep the first (best ranked) of any exact / near-exact duplicate chunks"""
+    seen = NearDuplicateIndex(max_distance=max_distance)
+    unique = []
+    for position, doc in enumerate(docs):
+        text_hash = (doc.metadata or {}).get("content_hash") or content_hash(doc.page_content)
+        fingerprint = simhash(doc.page_content)
+        if seen.find(text_hash, fingerprint) is None:
+            seen.add(str(position), text_hash, fingerprint)
+            unique.append(doc)
+    return unique
+
+
+class DedupRetriever(BaseRetriever):
+    """
+    Similarity search that over-fetches (fetch_k) and removes duplicate
+    chunks, so every one of the k returned slots holds distinct content.
+    With a router, the search is restricted by the metadata filter it
+    predicts (document_type / content_category); when that leaves fewer
+    than k chunks, the rest comes from the unfiltered index.
+    With an expander, German variants of a foreign-language question are
+    embedded in the same batch as the question, searched as well, and the
+    result lists merged by reciprocal rank fusion.
+    """
+
+    vector_store: VectorStore
+    k: int = 3
+    fetch_k: int = 8
+    search_kwargs: Dict[str, Any] = {}
+    router: Optional[Any] = None  # src.query_router.QueryRouter
+    expander: Optional[Any] = None  # src.query_expansion.QueryExpander
+
+    _executor: ThreadPoolExecutor
+
+    def __init__(self, **kwargs: Any):
+        super().__init__(**kwargs)
+        # Variant searches run in parallel with the question's own search
+        self._executor = ThreadPoolExecutor(max_workers=4, thread_name_prefix="variant-search")
+
+    def _parallel(self, search, items: List[Any]) -> List[Document]:
+        """Run search(item) for every item (all but the first on the executor) and merge the lists"""
+        futures = [self._executor.submit(search, item) for item in items[1:]]
+        first = search(items[0])
+        return self._merge([first] + [future.result() for future in futures])
+
+    def _expand(self, query: str) -> List[str]:
+        """The question followed by its German variants"""
+        if self.expander is None:
+            return [query]
+        return [query] + self.expander.expand(query).variants
+
+    def _route(self, query: str, vector: Optional[List[float]] = None) -> Optional[Dict[str, Any]]:
+        return self.router.route(query, vector) if self.router is not None else None
+
+    def _search_kwargs(self, route: Optional[Dict[str, Any]]) -> Dict[str, Any]:
+        if not route:
+            return self.search_kwargs
+        return {**self.search_kwargs, "filter": merge_filters(self.search_kwargs.get("filter"), route)}
+
+    def _too_few(self, docs: List[Document], route: Optional[Dict[str, Any]]) -> bool:
+        """True (and counted) if the routed search left fewer than k distinct chunks"""
+        if route and len(drop_duplicates(docs)) < self.k:
+            self.router.record_fallback()
+            return True
+        return False
+
+    def _timings(self, started: float, expanded: float, embedded: float, routed: float) -> Dict[str, float]:
+        timings = {"embed": embedded - expanded, "vector_search": time.perf_counter() - routed}
+        if self.expander is not None:
+            timings["expand"] = expanded - started
+        if self.router is not None:
+            timings["route"] = routed - embedded
+        return timings
+
+    @staticmethod
+    def _merge(rankings: List[List[Document]]) -> List[Document]:
+        return rankings[0] if len(rankings) == 1 else reciprocal_rank_fusion(rankings)
+
+    def _search(self, vectors: List[List[float]], search_kwargs: Dict[str, Any]) -> List[Document]:
+        return self._parallel(
+            lambda vector: self.vector_store.similarity_search_by_vector(vector, k=self.fetch_k, **search_kwargs),
+            vectors,
+        )
+
+    async def _asearch(self, vectors: List[List[float]], search_kwargs: Dict[str, Any]) -> List[Document]:
+        return self._merge(list(await asyncio.gather(*(
+            self.vector_store.asimilarity_search_by_vector(vector, k=self.fetch_k, **search_kwargs) for vector in vectors
+        ))))
+
+    def _get_relevant_documents(self, query: str, *, run_manager: CallbackManagerForRetrieverRun) -> List[Document]:
+        embeddings = self.vector_store.embeddings
+        started = time.perf_counter()
+        queries = self._expand(query)
+        expanded = time.perf_counter()
+        if embeddings is None:
+            route = self._route(query)
+            search_kwargs = self._search_kwargs(route)
+            docs = self._parallel(
+                lambda q: self.vector_store.similarity_search(q, k=self.fetch_k, **search_kwargs), queries
+            )
+            if self._too_few(docs, route):
+                docs = docs + self.vector_store.similarity_search(query, k=self.fetch_k, **self.search_kwargs)
+            return drop_duplicates(docs)[:self.k]
+        # Embed and search as two steps, so their latencies can be told apart;
+        # the question and its variants go to the embedding API in one batch
+        vectors = embeddings.embed_documents(queries) if len(queries) > 1 else [embeddings.embed_query(query)]
+        embedded = time.perf_counter()
+        route = self._route(query, vectors[0])
+        routed = time.perf_counter()
+        docs = self._search(vectors, self._search_kwargs(route))
+        if self._too_few(docs, route):
+            # Filter too narrow (or a wrong guess): fill up from the whole index
+            docs = docs + self._search(vectors, self.search_kwargs)
+        report_timings(self._timings(started, expanded, embedded, routed), run_manager)
+        return drop_duplicates(docs)[:self.k]
+
+    async def _aget_relevant_documents(
+        self, query: str, *, run_manager: AsyncCallbackManagerForRetrieverRun
+    ) -> List[Document]:
+        embeddings = self.vector_store.embeddings
+        started = time.perf_counter()
+        queries = self._expand(query)
+        expanded = time.perf_counter()
+        if embeddings is None:
+            route = self._route(query)
+            docs = self._merge(list(await asyncio.gather(*(
+                self.vector_store.asimilarity_search(q, k=self.fetch_k, **self._search_kwargs(route)) for q in queries
+            ))))
+            if self._too_few(docs, route):
+                docs = docs + await self.vector_store.asimilarity_search(query, k=self.fetch_k, **self.search_kwargs)
+            return drop_duplicates(docs)[:self.k]
+        if len(queries) > 1:
+            vectors = await embeddings.aembed_documents(queries)
+        else:
+            vectors = [await embeddings.aembed_query(query)]
+        embedded = time.perf_counter()
+        route = self._route(query, vectors[0])
+        routed = time.perf_counter()
+        docs = await self._asearch(vectors, self._search_kwargs(route))
+        if self._too_few(docs, route):
+            docs = docs + await self._asearch(vectors, self.search_kwargs)
+        await areport_timings(self._timings(started, expanded, embedded, routed), run_manager)
+        return drop_duplicates(docs)[:self.k]
+
+
+def fusion_key(doc: Document) -> str:
+    """Same chunk from different backends (Pinecone / local / lexical) -> same key"""
+    return (doc.metadata or {}).get("content_hash") or content_hash(doc.page_content)
+
+
+def reciprocal_rank_fusion(
+    rankings: Sequence[List[Document]], weights: Sequence[float] = (), rrf_k: int = 60
+) -> List[Document]:
+    """Merge ranked lists: score(doc) = sum(weight / (rrf_k + rank))"""
+    scores: Dict[str, float] = {}
+    first_seen: Dict[str, Document] = {}
+    for position, docs in enumerate(rankings):
+        weight = weights[position] if position < len(weights) else 1.0
+        for rank, doc in enumerate(docs, start=1):
+            key = fusion_key(doc)
+            scores[key] = scores.get(key, 0.0) + weight / (rrf_k + rank)
+            first_seen.setdefault(key, doc)
+    ordered = sorted(scores, key=scores.get, reverse=True)
+    return [first_seen[key] for key in ordered]
+
+
+class HybridRetriever(BaseRetriever):
+    """
+    Dense retrieval + BM25 (LexicalIndex) fused by reciprocal rank fusion.
+    Both legs run in parallel; exact statute references ("Art. 6 Abs. 4
+    DSGVO", "§ 26 BDSG") are found by the lexical leg even when dense
+    similarity misses them.
+    """
+
+    dense_retriever: BaseRetriever
+    lexical_index: LexicalIndex
+    k: int = 3
+    lexical_k: int = 8
+    rrf_k: int = 60
+    dense_weight: float = 1.0
+    lexical_weight: float = 1.0
+    expander: Optional[Any] = None  # src.query_expansion.QueryExpander (German terms for BM25)
+
+    _executor: ThreadPoolExecutor
+
+    def __init__(self, **kwargs: Any):
+        super().__init__(**kwargs)
+        self._executor = ThreadPoolExecutor(max_workers=4, thread_name_prefix="lexical-search")
+
+    def _lexical_query(self, query: str) -> str:
+        # A foreign-language question shares no words with the German chunks
+        return self.expander.lexical_query(query) if self.expander is not None else query
+
+    def _fuse(self, dense: List[Document], lexical: List[Document]) -> List[Document]:
+        fused = reciprocal_rank_fusion(
+            [dense, lexical], weights=(self.dense_weight, self.lexical_weight), rrf_k=self.rrf_k
+        )
+        return drop_duplicates(fused)[:self.k]
+
+    def _get_relevant_documents(self, query: str, *, run_manager: CallbackManagerForRetrieverRun) -> List[Document]:
+        lexical = self._executor.submit(self.lexical_index.search, self._lexical_query(query), self.lexical_k)
+        dense = self.dense_retriever.invoke(query, config={"callbacks": run_manager.get_child()})
+        return self._fuse(dense, lexical.result())
+
+    async def _aget_relevant_documents(
+        self, query: str, *, run_manager: AsyncCallbackManagerForRetrieverRun
+    ) -> List[Document]:
+        dense, lexical = await asyncio.gather(
+            self.dense_retriever.ainvoke(query, config={"callbacks": run_manager.get_child()}),
+            asyncio.get_running_loop().run_in_executor(
+                self._executor, self.lexical_index.search, self._lexical_query(query), self.lexical_k
+            ),
+        )
+        return self._fuse(dense, lexical)
+
+
+class RerankRetriever(BaseRetriever):
+    """
+    Over-fetches candidates from base_retriever (e.g. k=20) and keeps the
+    top_n after cross-encoder re-ranking. Without a reranker, or when it
+    runs out of its time budget, the first top_n in retrieval order are kept.
+    """
+
+    base_retriever: BaseRetriever
+    reranker: Optional[Any] = None  # src.reranker.CrossEncoderReranker
+    top_n: int = 4
+    budget_ms: Optional[float] = 300.0
+
+    def _rerank(self, query: str, docs: List[Document]) -> List[Document]:
+        if self.reranker is None:
+            return docs[:self.top_n]
+        return self.reranker.rerank(query, docs, top_n=self.top_n, budget_ms=self.budget_ms)
+
+    def _get_relevant_documents(self, query: str, *, run_manager: CallbackManagerForRetrieverRun) -> List[Document]:
+        docs = self.base_retriever.invoke(query, config={"callbacks": run_manager.get_child()})
+        return self._rerank(query, docs)
+
+    async def _aget_relevant_documents(
+        self, query: str, *, run_manager: AsyncCallbackManagerForRetrieverRun
+    ) -> List[Document]:
+        docs = await self.base_retriever.ainvoke(query, config={"callbacks": run_manager.get_child()})
+        # Scoring is CPU-bound: keep it off the event loop
+        return await asyncio.to_thread(self._rerank, query, docs)
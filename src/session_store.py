@@ -0,0 +1,115 @@
+# session_store.py
+# Session-keyed registry for per-user QA chains and conversation memory
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, Optional, Tuple
+
+
+@dataclass
+class ChatSession:
+    """One user's QA chain and memory, plus bookkeeping for eviction"""
+    chain: Any
+    memory: Any
+    created_at: float = field(default_factory=time.monotonic)
+    last_used: float = field(default_factory=time.monotonic)
+    # Serializes requests of the SAME session; different sessions run concurrently
+    lock: threading.Lock = field(default_factory=threading.Lock)
+
+    def touch(self):
+        self.last_used = time.monotonic()
+
+
+class SessionRegistry:
+    """
+    Thread-safe LRU registry of ChatSession objects keyed by session id.
+
+    Args:
+        factory: Callable returning a (chain, memory) tuple for a new session
+        max_sessions: Upper bound on live sessions (least recently used is evicted)
+        idle_ttl: Seconds of inactivity after which a session is dropped
+    """
+
+    def __init__(
+        self,
+        factory: Callable[[], Tuple[Any, Any]],
+        max_sessions: int = 200,
+        idle_ttl: float = 30 * 60,
+    ):
+        self._factory = factory
+        self.max_sessions = max_sessions
+        self.idle_ttl = idle_ttl
+        self._sessions: "OrderedDict[str, ChatSession]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.evictions = 0
+
+    def get(self, session_id: str) -> ChatSession:
+        """Return the session for session_id, creating it if needed"""
+        with self._lock:
+            self._evict_idle_locked()
+            session = self._sessions.get(session_id)
+            if session is not None:
+                self._sessions.move_to_end(session_id)
+                session.touch()
+                return session
+
+        # Build outside the registry lock so a slow factory doesn't block other sessions
+        chain, memory = self._factory()
+        new_session = ChatSession(chain=chain, memory=memory)
+
+        with self._lock:
+            # Another thread may have created it in the meantime - keep the first one
+            session = self._sessions.get(session_id)
+            if session is None:
+                session = new_session
+                self._sessions[session_id] = session
+                while len(self._sessions) > self.max_sessions:
+                    self._sessions.popitem(last=False)
+                    self.evictions += 1
+            self._sessions.move_to_end(session_id)
+            session.touch()
+            return session
+
+    def peek(self, session_id: str) -> Optional[ChatSession]:
+        """Return the session if it exists, without creating or refreshing it"""
+        with self._lock:
+            return self._sessions.get(session_id)
+
+    def drop(self, session_id: str) -> bool:
+        """Remove a session; returns True if it existed"""
+        with self._lock:
+            return self._sessions.pop(session_id, None) is not None
+
+    def evict_idle(self) -> int:
+        """Drop all sessions idle for longer than idle_ttl; returns the number removed"""
+        with self._lock:
+            return self._evict_idle_locked()
+
+    def _evict_idle_locked(self) -> int:
+        if not self.idle_ttl:
+            return 0
+        cutoff = time.monotonic() - self.idle_ttl
+        # OrderedDict is in LRU order, so stale sessions sit at the front
+        removed = 0
+        while self._sessions:
+            oldest_id, oldest = next(iter(self._sessions.items()))
+            if oldest.last_used >= cutoff:
+                break
+            del self._sessions[oldest_id]
+            removed += 1
+        self.evictions += removed
+        return removed
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "active_sessions": len(self._sessions),
+                "max_sessions": self.max_sessions,
+                "idle_ttl": self.idle_ttl,
+                "evictions": self.evictions,
+            }
+
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self._sessions)
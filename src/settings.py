@@ -0,0 +1,208 @@
+# settings.py
+# App configuration (API keys from Streamlit secrets or the environment, GDPR_*
+# tuning variables), resolved ONCE into an immutable Settings object
+import os
+from dataclasses import dataclass
+from functools import lru_cache
+from typing import Optional, Tuple
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DEFAULT_INDEX_NAME = "gdpr-compliance-openai"
+
+
+def _env_flag(name: str, default: str) -> bool:
+    return os.getenv(name, default).lower() in ("1", "true", "yes")
+
+
+def _data_path(*parts: str) -> str:
+    return os.path.join(ROOT, "2_data", *parts)
+
+
+def _read_secrets() -> dict:
+    """
+    Streamlit secrets as a plain dict ({} without a secrets.toml, e.g. in CLIs / benchmarks)
+    """
+    try:
+        import streamlit as st
+        return dict(st.secrets) if st.secrets else {}
+    except Exception:
+        return {}
+
+
+@dataclass(frozen=True)
+class Settings:
+    # API keys / index
+    openai_api_key: Optional[str]
+    pinecone_api_key: Optional[str]
+    index_name: Optional[str]
+    index_host: Optional[str]
+
+    # LangSmith (only set when they come from Streamlit secrets, see apply_langsmith_env)
+    langsmith_api_key: Optional[str]
+    langsmith_tracing: str
+    langsmith_project: str
+
+    # Retrieval backend / indexes
+    vector_backend: str
+    local_index_dir: str
+    index_quantization: str
+    index_dimensions: int
+    index_rescore_factor: int
+    index_manifest_path: str
+    hybrid_search: bool
+    lexical_index_dir: str
+    # document_type values in the Pinecone index (the local index knows its own)
+    corpus_document_types: Tuple[str, ...]
+
+    # Query routing (metadata-filtered retrieval)
+    query_router: bool
+    router_margin: float
+    router_centroids_path: str
+
+    # Cross-lingual query expansion (German variants of foreign-language questions)
+    query_expansion: bool
+    expansion_max_variants: int
+
+    # Re-ranking
+    rerank_enabled: bool
+    rerank_model_dir: str
+    rerank_fetch_k: int
+    rerank_top_n: int
+    rerank_budget_ms: float
+
+    # Caches
+    embedding_cache_path: str
+    embedding_cache_memory_size: int
+    embedding_cache_disk_size: int
+    embedding_cache_storage: str
+    answer_cache_enabled: bool
+    answer_cache_threshold: float
+    answer_cache_ttl: float
+    answer_cache_size: int
+
+    # Question condensing
+    condense_heuristics: bool
+    speculative_retrieval: bool
+    rewrite_cache_size: int
+    rewrite_cache_ttl: float
+
+    # Prompt token budget
+    prompt_token_budget: int
+    context_min_tokens: int
+    history_token_budget: int
+
+    # Sessions
+    max_sessions: int
+    session_idle_ttl: float
+
+    # Background warm-up at app start (home_app.py)
+    warmup: bool
+    warmup_wait_timeout: float
+
+    # Metrics / telemetry
+    metrics_port: int
+    metrics_host: str
+    telemetry_spool_path: str
+    telemetry_queue_size: int
+
+    @property
+    def api_keys_configured(self) -> bool:
+        """True if the keys needed by the selected vector backend are present"""
+        return bool(self.openai_api_key) and (bool(self.pinecone_api_key) or self.vector_backend != "pinecone")
+
+
+def load_settings() -> Settings:
+    """
+    Read secrets and environment variables (use get_settings() for the shared instance)
+    """
+    secrets = _read_secrets()
+    vector_backend = os.getenv("GDPR_VECTOR_BACKEND", "pinecone").lower()
+
+    # Streamlit secrets first (both keys), then environment variables
+    if "OPENAI_API_KEY" in secrets and "PINECONE_API_KEY" in secrets:
+        openai_api_key, pinecone_api_key = secrets["OPENAI_API_KEY"], secrets["PINECONE_API_KEY"]
+    else:
+        openai_api_key, pinecone_api_key = os.getenv("OPENAI_API_KEY"), os.getenv("PINECONE_API_KEY")
+        # The local index only needs OpenAI (for query embeddings and the LLM)
+        if not (openai_api_key and (pinecone_api_key or vector_backend == "local")):
+            print("❌ API keys not found in secrets or environment variables")
+            openai_api_key = pinecone_api_key = None
+    index_name = DEFAULT_INDEX_NAME if openai_api_key else None
+
+    return Settings(
+        openai_api_key=openai_api_key,
+        pinecone_api_key=pinecone_api_key,
+        index_name=index_name,
+        index_host=os.getenv("PINECONE_INDEX_HOST"),
+        langsmith_api_key=secrets.get("LANGSMITH_API_KEY"),
+        langsmith_tracing=str(secrets.get("LANGSMITH_TRACING", "true")),
+        langsmith_project=str(secrets.get("LANGSMITH_PROJECT", "GDPR-Compliance-Assistant")),
+        vector_backend=vector_backend,
+        local_index_dir=os.getenv("GDPR_LOCAL_INDEX_DIR", _data_path("processed", "local_index")),
+        index_quantization=os.getenv("GDPR_INDEX_QUANTIZATION", "none").lower(),
+        index_dimensions=int(os.getenv("GDPR_INDEX_DIMENSIONS", "0")),
+        index_rescore_factor=int(os.getenv("GDPR_INDEX_RESCORE_FACTOR", "10")),
+        index_manifest_path=os.getenv("GDPR_INDEX_MANIFEST", _data_path("processed", "index_manifest.jsonl")),
+        hybrid_search=_env_flag("GDPR_HYBRID_SEARCH", "true"),
+        lexical_index_dir=os.getenv("GDPR_LEXICAL_INDEX_DIR", _data_path("processed", "lexical_index")),
+        corpus_document_types=tuple(
+            t.strip()
+            for t in os.getenv("GDPR_CORPUS_DOCUMENT_TYPES", "bitkom_ai_gdpr_handbook,zdh_gdpr_handbook").split(",")
+            if t.strip()
+        ),
+        query_router=_env_flag("GDPR_QUERY_ROUTER", "true"),
+        router_margin=float(os.getenv("GDPR_ROUTER_MARGIN", "0.05")),
+        router_centroids_path=os.getenv("GDPR_ROUTER_CENTROIDS", _data_path("processed", "router_centroids.npz")),
+        query_expansion=_env_flag("GDPR_QUERY_EXPANSION", "true"),
+        expansion_max_variants=int(os.getenv("GDPR_EXPANSION_MAX_VARIANTS", "2")),
+        rerank_enabled=_env_flag("GDPR_RERANK", "true"),
+        rerank_model_dir=os.getenv("GDPR_RERANK_MODEL_DIR", _data_path("models", "reranker")),
+        rerank_fetch_k=int(os.getenv("GDPR_RERANK_FETCH_K", "20")),
+        rerank_top_n=int(os.getenv("GDPR_RERANK_TOP_N", "4")),
+        rerank_budget_ms=float(os.getenv("GDPR_RERANK_BUDGET_MS", "300")),
+        embedding_cache_path=os.getenv("GDPR_EMBEDDING_CACHE_PATH", _data_path("cache", "embeddings.sqlite")),
+        embedding_cache_memory_size=int(os.getenv("GDPR_EMBEDDING_CACHE_MEMORY_SIZE", "2048")),
+        embedding_cache_disk_size=int(os.getenv("GDPR_EMBEDDING_CACHE_DISK_SIZE", "100000")),
+        embedding_cache_storage=os.getenv("GDPR_EMBEDDING_CACHE_STORAGE", "float32").lower(),
+        answer_cache_enabled=_env_flag("GDPR_ANSWER_CACHE", "true"),
+        answer_cache_threshold=float(os.getenv("GDPR_ANSWER_CACHE_THRESHOLD", "0.95")),
+        answer_cache_ttl=float(os.getenv("GDPR_ANSWER_CACHE_TTL", str(24 * 3600))),
+        answer_cache_size=int(os.getenv("GDPR_ANSWER_CACHE_SIZE", "1000")),
+        condense_heuristics=_env_flag("GDPR_CONDENSE_HEURISTICS", "true"),
+        speculative_retrieval=_env_flag("GDPR_SPECULATIVE_RETRIEVAL", "true"),
+        rewrite_cache_size=int(os.getenv("GDPR_REWRITE_CACHE_SIZE", "1000")),
+        rewrite_cache_ttl=float(os.getenv("GDPR_REWRITE_CACHE_TTL", "3600")),
+        prompt_token_budget=int(os.getenv("GDPR_PROMPT_TOKEN_BUDGET", "2500")),
+        context_min_tokens=int(os.getenv("GDPR_CONTEXT_MIN_TOKENS", "400")),
+        history_token_budget=int(os.getenv("GDPR_HISTORY_TOKEN_BUDGET", "800")),
+        max_sessions=int(os.getenv("GDPR_MAX_SESSIONS", "200")),
+        session_idle_ttl=float(os.getenv("GDPR_SESSION_IDLE_TTL", str(30 * 60))),
+        warmup=_env_flag("GDPR_WARMUP", "false"),
+        warmup_wait_timeout=float(os.getenv("GDPR_WARMUP_WAIT_TIMEOUT", "60")),
+        metrics_port=int(os.getenv("GDPR_METRICS_PORT", "0")),
+        metrics_host=os.getenv("GDPR_METRICS_HOST", "127.0.0.1"),
+        telemetry_spool_path=os.getenv("GDPR_TELEMETRY_SPOOL_PATH", _data_path("cache", "telemetry_spool.jsonl")),
+        telemetry_queue_size=int(os.getenv("GDPR_TELEMETRY_QUEUE_SIZE", "1000")),
+    )
+
+
+@lru_cache(maxsize=1)
+def get_settings() -> Settings:
+    """The process-wide settings (resolved on first call)"""
+    return load_settings()
+
+
+def apply_langsmith_env(settings: Settings) -> bool:
+    """
+    Export LangSmith keys from Streamlit secrets as the environment variables the
+    tracer reads; True if tracing is configured (secrets or environment)
+    """
+    if settings.langsmith_api_key:
+        os.environ["LANGSMITH_TRACING"] = settings.langsmith_tracing
+        os.environ["LANGSMITH_API_KEY"] = settings.langsmith_api_key
+        os.environ["LANGSMITH_PROJECT"] = settings.langsmith_project
+        return True
+    if os.getenv("LANGSMITH_API_KEY"):
+        return True
+    print("⚠️  LangSmith API key not found - tracing disabled")
+    return False
@@ -0,0 +1,34 @@
+# stream_events.py
+# Callback handler that feeds stream_gdpr_question_with_memory (retrieval
+# results first, then the answer tokens)
+from langchain_core.callbacks.base import BaseCallbackHandler
+
+
+class StreamEventHandler(BaseCallbackHandler):
+    """
+    Forwards retrieval results and answer tokens from the chain to a queue.
+    Tokens of the question-condensing LLM call (which runs BEFORE retrieval)
+    are not forwarded, only those of the answering call. Retrievers wrapping
+    other retrievers report once, with the outermost (final) documents.
+    """
+
+    def __init__(self, events):
+        self.events = events
+        self.retrieved = False
+        self.retriever_runs = set()
+        self.outer_retriever_run = None
+
+    def on_retriever_start(self, serialized, query, *, run_id, parent_run_id=None, **kwargs):
+        if parent_run_id not in self.retriever_runs:
+            self.outer_retriever_run = run_id
+        self.retriever_runs.add(run_id)
+
+    def on_retriever_end(self, documents, *, run_id=None, **kwargs):
+        if run_id != self.outer_retriever_run:
+            return
+        self.retrieved = True
+        self.events.put(("retrieval", documents))
+
+    def on_llm_new_token(self, token, **kwargs):
+        if self.retrieved and token:
+            self.events.put(("token", token))
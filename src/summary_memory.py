@@ -0,0 +1,210 @@
+# summary_memory.py
+# Conversation memory with a token budget: recent turns verbatim, older turns
+# folded into a rolling summary that is updated in the background
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List
+
+from langchain_core.language_models import BaseLanguageModel
+from langchain_core.messages import BaseMessage, SystemMessage, get_buffer_string
+from langchain.memory.chat_memory import BaseChatMemory
+
+from src.context_packing import count_tokens, truncate_to_tokens
+
+SUMMARY_PROMPT = """Progressively summarize the conversation between a user and a GDPR compliance assistant.
+Extend the existing summary with the new lines. Keep facts the user stated about their business,
+the topics and legal references discussed, and open questions. Write in the language of the conversation,
+at most {max_words} words.
+
+Existing summary:
+{summary}
+
+New lines:
+{new_lines}
+
+New summary:"""
+
+# One small pool for all sessions: summaries never run on the request path
+_summary_executor = ThreadPoolExecutor(max_workers=2, thread_name_prefix="memory-summary")
+
+
+class TokenBudgetMemory(BaseChatMemory):
+    """
+    Keeps the chat history within max_history_tokens.
+
+    The newest exchanges stay verbatim; when they exceed the budget, the oldest
+    ones move to a pending list and a background job folds them into a rolling
+    summary (one LLM call per fold, incremental). Until the job finishes, the
+    pending turns are shown shortened, so no turn silently disappears.
+    """
+
+    llm: BaseLanguageModel
+    memory_key: str = "chat_history"
+    max_history_tokens: int = 800
+    max_summary_words: int = 120
+    pending_message_tokens: int = 60
+    min_verbatim_messages: int = 2
+    summary_retries: int = 3
+    summary_retry_backoff: float = 2.0  # seconds, doubled per failed attempt
+
+    summary: str = ""
+    summarized_messages: int = 0
+
+    _pending: List[BaseMessage]
+    _lock: threading.RLock
+    _generation: int
+    _folded_tokens: int
+    _summarizing: bool
+    _failures: int
+    _retry_at: float
+
+    def __init__(self, **kwargs: Any):
+        super().__init__(**kwargs)
+        self._pending = []
+        self._lock = threading.RLock()
+        self._generation = 0
+        self._folded_tokens = 0
+        self._summarizing = False
+        self._failures = 0
+        self._retry_at = 0.0
+
+    @property
+    def memory_variables(self) -> List[str]:
+        return [self.memory_key]
+
+    # ---------------------------
+    # Read
+    # ---------------------------
+    def _history_messages(self) -> List[BaseMessage]:
+        with self._lock:
+            messages: List[BaseMessage] = []
+            if self.summary:
+                messages.append(SystemMessage(content=f"Summary of the earlier conversation: {self.summary}"))
+            for message in self._pending:
+                shortened = truncate_to_tokens(message.content, self.pending_message_tokens)
+                messages.append(message.__class__(content=shortened))
+            messages.extend(self.chat_memory.messages)
+            return messages
+
+    def load_memory_variables(self, inputs: Dict[str, Any]) -> Dict[str, Any]:
+        with self._lock:
+            self._schedule_summary()  # retries a failed fold once its backoff has passed
+        messages = self._history_messages()
+        if self.return_messages:
+            return {self.memory_key: messages}
+        return {self.memory_key: get_buffer_string(messages)}
+
+    # ---------------------------
+    # Write
+    # ---------------------------
+    def save_context(self, inputs: Dict[str, Any], outputs: Dict[str, str]) -> None:
+        with self._lock:
+            super().save_context(inputs, outputs)
+            self._enforce_budget()
+            self._schedule_summary()
+
+    async def asave_context(self, inputs: Dict[str, Any], outputs: Dict[str, str]) -> None:
+        # Cheap (the summary runs in the background), so no need for an executor
+        self.save_context(inputs, outputs)
+
+    def _enforce_budget(self):
+        messages = list(self.chat_memory.messages)
+        moved = 0
+        while (
+            len(messages) - moved > self.min_verbatim_messages
+            and count_tokens(get_buffer_string(messages[moved:])) > self.max_history_tokens
+        ):
+            moved += 2  # one exchange = human + AI message
+        if not moved:
+            return
+        self._pending.extend(messages[:moved])
+        self.chat_memory.clear()
+        self.chat_memory.add_messages(messages[moved:])
+        # New turns to fold: earlier failures no longer count against the cap
+        self._failures = 0
+        self._retry_at = 0.0
+        self._schedule_summary()
+
+    def _schedule_summary(self):
+        if self._summarizing or not self._pending:
+            return
+        if self._failures > self.summary_retries or time.monotonic() < self._retry_at:
+            return
+        self._summarizing = True
+        _summary_executor.submit(self._summarize, self._generation)
+
+    def _summarize(self, generation: int):
+        with self._lock:
+            batch = list(self._pending)
+            previous = self.summary
+        try:
+            new_lines = get_buffer_string(batch)
+            prompt = SUMMARY_PROMPT.format(
+                max_words=self.max_summary_words,
+                summary=previous or "(none)",
+                new_lines=new_lines,
+            )
+            result = self.llm.invoke(prompt)
+            summary = getattr(result, "content", result).strip()
+        except Exception as e:
+            with self._lock:
+                if generation == self._generation:
+                    self._summarizing = False
+                    self._failures += 1
+                    if self._failures <= self.summary_retries:
+                        delay = self.summary_retry_backoff * 2 ** (self._failures - 1)
+                        self._retry_at = time.monotonic() + delay
+                        print(f"⚠️  Memory summary failed, retrying in {delay:g}s: {e}")
+                    else:
+                        print(f"⚠️  Memory summary failed {self._failures} times, keeping shortened turns: {e}")
+            return
+
+        with self._lock:
+            if generation != self._generation:
+                return  # memory was cleared meanwhile
+            self._summarizing = False
+            self.summary = summary
+            self._pending = self._pending[len(batch):]
+            self.summarized_messages += len(batch)
+            self._folded_tokens += count_tokens(new_lines)
+            self._failures = 0
+            # Turns that arrived while this job ran get their own fold
+            self._schedule_summary()
+
+    def clear(self) -> None:
+        with self._lock:
+            super().clear()
+            self.summary = ""
+            self.summarized_messages = 0
+            self._pending = []
+            self._folded_tokens = 0
+            self._generation += 1
+            self._summarizing = False
+            self._failures = 0
+            self._retry_at = 0.0
+
+    # ---------------------------
+    # Stats
+    # ---------------------------
+    @property
+    def message_count(self) -> int:
+        """All messages remembered: summarized, pending and verbatim"""
+        with self._lock:
+            return self.summarized_messages + len(self._pending) + len(self.chat_memory.messages)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            history_tokens = count_tokens(get_buffer_string(self._history_messages()))
+            summary_tokens = count_tokens(self.summary)
+            return {
+                "verbatim_messages": len(self.chat_memory.messages),
+                "pending_messages": len(self._pending),
+                "summary_failures": self._failures,
+                "summarized_messages": self.summarized_messages,
+                "summary": self.summary,
+                "summary_tokens": summary_tokens,
+                "history_tokens": history_tokens,
+                "history_token_budget": self.max_history_tokens,
+                "tokens_saved": max(self._folded_tokens - summary_tokens, 0),
+            }
@@ -0,0 +1,255 @@
+# telemetry.py
+# Background dispatch of LangSmith feedback: bounded queue, one worker thread,
+# batching, retry with backoff, and a JSONL spool file while offline
+import atexit
+import json
+import os
+import queue
+import random
+import threading
+import time
+import uuid
+from typing import Any, Callable, Dict, List, Optional
+
+# Worth another attempt later; everything else (auth, bad request) is not
+_RETRYABLE_NAMES = {
+    "LangSmithConnectionError",
+    "LangSmithRateLimitError",
+    "LangSmithRequestTimeout",
+    "LangSmithAPIError",  # 5xx
+    "ConnectionError",
+    "Timeout",
+    "ReadTimeout",
+    "ConnectTimeout",
+}
+
+
+def is_retryable(error: Exception) -> bool:
+    return type(error).__name__ in _RETRYABLE_NAMES
+
+
+class TelemetryDispatcher:
+    """
+    Sends LangSmith feedback off the request path.
+
+    submit_feedback() only enqueues (never blocks; when the queue is full the
+    item is dropped and counted). A single worker thread drains the queue in
+    batches over one shared client, retrying transient errors with
+    exponential backoff. Items that still fail are appended to spool_path and
+    replayed once the endpoint is reachable again (also after a restart).
+    """
+
+    def __init__(
+        self,
+        client_factory: Callable[[], Any],
+        max_queue: int = 1000,
+        batch_size: int = 20,
+        flush_interval: float = 1.0,
+        max_retries: int = 4,
+        retry_base: float = 0.5,
+        retry_cap: float = 30.0,
+        spool_path: Optional[str] = None,
+    ):
+        self.client_factory = client_factory
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.max_retries = max_retries
+        self.retry_base = retry_base
+        self.retry_cap = retry_cap
+        self.spool_path = spool_path
+        self._queue: "queue.Queue[Dict[str, Any]]" = queue.Queue(maxsize=max_queue)
+        self._client = None
+        self._client_lock = threading.Lock()
+        self._spool_lock = threading.Lock()
+        self._start_lock = threading.Lock()
+        self._worker: Optional[threading.Thread] = None
+        self._stop = threading.Event()
+        self._stats = {"queued": 0, "sent": 0, "retried": 0, "dropped": 0, "spooled": 0, "replayed": 0, "failed": 0}
+
+    # ---------------------------
+    # Producer side (request / UI threads)
+    # ---------------------------
+    def submit_feedback(self, run_id: str, key: str, score: Any = None, comment: str = "", value: Any = None) -> bool:
+        """Queue one feedback item; False if it had to be dropped"""
+        item = {
+            "kind": "feedback",
+            # Fixed id, so a retry after a lost response can't create a duplicate
+            "feedback_id": str(uuid.uuid4()),
+            "run_id": str(run_id),
+            "key": key,
+            "score": score,
+            "value": value,
+            "comment": comment,
+            "created_at": time.time(),
+        }
+        return self._enqueue(item)
+
+    def _enqueue(self, item: Dict[str, Any]) -> bool:
+        self._ensure_worker()
+        try:
+            self._queue.put_nowait(item)
+        except queue.Full:
+            self._stats["dropped"] += 1
+            return False
+        self._stats["queued"] += 1
+        return True
+
+    def _ensure_worker(self):
+        if self._worker is not None and self._worker.is_alive():
+            return
+        with self._start_lock:
+            if self._worker is None or not self._worker.is_alive():
+                self._stop.clear()
+                self._worker = threading.Thread(target=self._run, name="telemetry-dispatch", daemon=True)
+                self._worker.start()
+
+    # ---------------------------
+    # Worker
+    # ---------------------------
+    def client(self):
+        """One client for the whole process (created on first send)"""
+        if self._client is None:
+            with self._client_lock:
+                if self._client is None:
+                    self._client = self.client_factory()
+        return self._client
+
+    def _next_batch(self) -> List[Dict[str, Any]]:
+        try:
+            batch = [self._queue.get(timeout=self.flush_interval)]
+        except queue.Empty:
+            return []
+        while len(batch) < self.batch_size:
+            try:
+                batch.append(self._queue.get_nowait())
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self):
+        # Leftovers of an earlier offline period / process
+        self._replay_spool()
+        while not self._stop.is_set() or not self._queue.empty():
+            batch = self._next_batch()
+            if not batch:
+                continue
+            try:
+                if self._send_batch(batch):
+                    self._replay_spool()
+            finally:
+                for _ in batch:
+                    self._queue.task_done()
+
+    def _send(self, item: Dict[str, Any]):
+        self.client().create_feedback(
+            run_id=item["run_id"],
+            key=item["key"],
+            score=item["score"],
+            value=item["value"],
+            comment=item["comment"],
+            feedback_id=item["feedback_id"],
+            # Our own backoff below; the client's default retries would hold the batch
+            stop_after_attempt=1,
+        )
+
+    def _send_batch(self, batch: List[Dict[str, Any]]) -> bool:
+        """Send a batch in order; True if the endpoint was reachable throughout"""
+        for position, item in enumerate(batch):
+            attempt = 0
+            while True:
+                try:
+                    self._send(item)
+                    self._stats["sent"] += 1
+                    break
+                except Exception as e:
+                    if type(e).__name__ == "LangSmithConflictError":
+                        self._stats["sent"] += 1  # an earlier attempt already got through
+                        break
+                    if not is_retryable(e):
+                        self._stats["failed"] += 1
+                        print(f"⚠️  LangSmith feedback dropped: {e}")
+                        break
+                    if attempt >= self.max_retries or self._stop.is_set():
+                        # Offline: keep this and the rest of the batch for later
+                        self._spool(batch[position:])
+                        return False
+                    self._stats["retried"] += 1
+                    time.sleep(random.uniform(0, min(self.retry_cap, self.retry_base * 2 ** attempt)))
+                    attempt += 1
+        return True
+
+    # ---------------------------
+    # Spool file (offline buffer)
+    # ---------------------------
+    def _spool(self, items: List[Dict[str, Any]]):
+        if not self.spool_path:
+            self._stats["dropped"] += len(items)
+            print(f"⚠️  LangSmith unreachable, {len(items)} telemetry item(s) dropped (no spool file)")
+            return
+        try:
+            with self._spool_lock:
+                os.makedirs(os.path.dirname(os.path.abspath(self.spool_path)), exist_ok=True)
+                with open(self.spool_path, "a", encoding="utf-8") as f:
+                    for item in items:
+                        f.write(json.dumps(item, ensure_ascii=False) + "\n")
+            self._stats["spooled"] += len(items)
+            print(f"⚠️  LangSmith unreachable, {len(items)} telemetry item(s) spooled to {self.spool_path}")
+        except OSError as e:
+            self._stats["dropped"] += len(items)
+            print(f"❌ Could not write telemetry spool: {e}")
+
+    def _replay_spool(self):
+        if not self.spool_path:
+            return
+        with self._spool_lock:
+            if not os.path.exists(self.spool_path):
+                return
+            try:
+                with open(self.spool_path, "r", encoding="utf-8") as f:
+                    items = [json.loads(line) for line in f if line.strip()]
+                os.remove(self.spool_path)
+            except (OSError, ValueError) as e:
+                print(f"⚠️  Could not read telemetry spool: {e}")
+                return
+        for position in range(0, len(items), self.batch_size):
+            batch = items[position:position + self.batch_size]
+            if not self._send_batch(batch):
+                # Still offline: the unsent rest of this batch is spooled again
+                self._spool(items[position + self.batch_size:])
+                return
+            self._stats["replayed"] += len(batch)
+
+    # ---------------------------
+    # Lifecycle
+    # ---------------------------
+    def flush(self, timeout: float = 5.0) -> bool:
+        """Wait until the queue is drained (True) or timeout"""
+        deadline = time.monotonic() + timeout
+        while self._queue.unfinished_tasks:
+            if time.monotonic() > deadline:
+                return False
+            time.sleep(0.05)
+        return True
+
+    def close(self, timeout: float = 2.0):
+        """Stop the worker; whatever is still queued goes to the spool file"""
+        self._stop.set()
+        if self._worker is not None:
+            self._worker.join(timeout)
+        leftovers = []
+        while True:
+            try:
+                leftovers.append(self._queue.get_nowait())
+                self._queue.task_done()
+            except queue.Empty:
+                break
+        if leftovers:
+            self._spool(leftovers)
+
+    def stats(self) -> Dict[str, Any]:
+        return {**self._stats, "pending": self._queue.qsize()}
+
+
+def register_shutdown(dispatcher: TelemetryDispatcher, timeout: float = 2.0):
+    """Give queued items a short chance to go out (or reach the spool) at exit"""
+    atexit.register(dispatcher.close, timeout)
@@ -0,0 +1,80 @@
+# warmup.py
+# Optional background pre-warm of the QA pipeline when the app boots: build the
+# shared clients / chain, then one throwaway embedding and one small vector
+# query so the first user doesn't pay for imports, setup and TLS handshakes
+import threading
+import time
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+
+class Warmup:
+    """
+    Runs named steps once, in order, on a daemon thread.
+
+    start() is idempotent (first call wins). Requests that need the warmed-up
+    resources call wait(): while the warm-up is running they block on it
+    instead of building the same things a second time; once it has finished
+    (or if it was never started) wait() returns immediately.
+    """
+
+    def __init__(self, steps: List[Tuple[str, Callable[[], Any]]], name: str = "qa-warmup"):
+        self.steps = steps
+        self.name = name
+        self._lock = threading.Lock()
+        self._done = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._state = "off"  # off | running | ready | failed
+        self._current: Optional[str] = None
+        self._error: Optional[str] = None
+        self._timings: Dict[str, float] = {}
+        self._started_at: Optional[float] = None
+        self._finished_at: Optional[float] = None
+
+    def start(self) -> threading.Thread:
+        with self._lock:
+            if self._thread is None:
+                self._state = "running"
+                self._started_at = time.time()
+                self._thread = threading.Thread(target=self._run, name=self.name, daemon=True)
+                self._thread.start()
+            return self._thread
+
+    def _run(self):
+        try:
+            for name, step in self.steps:
+                self._current = name
+                started = time.perf_counter()
+                step()
+                self._timings[name] = round((time.perf_counter() - started) * 1000, 1)
+            self._state = "ready"
+            print(f"✅ Warm-up done in {sum(self._timings.values()) / 1000:.1f}s ({self._timings})")
+        except Exception as e:
+            # Requests fall back to building what's missing themselves
+            self._state = "failed"
+            self._error = f"{self._current}: {e}"
+            print(f"⚠️  Warm-up failed at '{self._current}': {e}")
+        finally:
+            self._current = None
+            self._finished_at = time.time()
+            self._done.set()
+
+    def wait(self, timeout: Optional[float] = None) -> bool:
+        """Block while the warm-up is running; True if it finished (or never started)"""
+        thread = self._thread
+        if thread is None or thread is threading.current_thread():
+            return True
+        return self._done.wait(timeout)
+
+    @property
+    def running(self) -> bool:
+        return self._state == "running"
+
+    def status(self) -> Dict[str, Any]:
+        return {
+            "state": self._state,
+            "step": self._current,
+            "error": self._error,
+            "timings_ms": dict(self._timings),
+            "started_at": self._started_at,
+            "finished_at": self._finished_at,
+        }
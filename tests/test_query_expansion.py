@@ -0,0 +1,39 @@
+# test_query_expansion.py
+# Elided Italian / French articles must not hide glossary terms
+#
+#   python -m pytest tests
+import os
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if ROOT not in sys.path:
+    sys.path.insert(0, ROOT)
+
+from src.query_expansion import QueryExpander, _tokens  # noqa: E402
+
+
+def test_elisions_are_split_off():
+    assert _tokens("dell'IA") == ["dell'", "ia"]
+    assert _tokens("L’uso", lower=False) == ["L'", "uso"]
+    assert _tokens("rock'n'roll") == ["rock'n'roll"]
+
+
+def test_italian_ai_question_with_elided_article():
+    expansion = QueryExpander().expand("Come gestire una violazione dei dati dell'IA?")
+    assert expansion.language == "it"
+    assert "KI" in expansion.terms and "Datenpanne" in expansion.terms
+    assert expansion.variants[0] == "Come gestire una Datenpanne KI"
+
+
+def test_italian_phrase_after_elided_article():
+    expansion = QueryExpander().expand("L'uso dell'intelligenza artificiale")
+    assert expansion.language == "it"
+    assert expansion.terms[0] == "Künstliche Intelligenz"
+    assert expansion.variants[0] == "L'uso Künstliche Intelligenz"
+
+
+def test_french_elisions_and_phrases_with_apostrophe():
+    expansion = QueryExpander().expand("Faut-il une analyse d'impact pour l'intelligence artificielle ?")
+    assert expansion.language == "fr"
+    assert expansion.terms[:2] == ["Datenschutz-Folgenabschätzung", "Künstliche Intelligenz"]
+    assert QueryExpander().expand("Quando serve una valutazione d'impatto?").terms == ["Datenschutz-Folgenabschätzung"]
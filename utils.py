@@ -1,11 +1,280 @@
+import hashlib
+import html
+import json
+import uuid
+from collections import OrderedDict
 from datetime import datetime
-from typing import List, Dict, Tuple, Optional
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple
 
 # Default metadata for header (customize here or pass overrides to export_chat)
 DEFAULT_PROJECT_DESCRIPTION = "GDPR Compliance Assistant - Chat export"
 DEFAULT_PROJECT_AUTHOR = "Unknown"
 DEFAULT_PROJECT_URL = "N/A"
 
+# format -> (mime type, file extension)
+EXPORT_FORMATS = {
+    "txt": ("text/plain", "txt"),
+    "md": ("text/markdown", "md"),
+    "jsonl": ("application/x-ndjson", "jsonl"),
+}
+
+
+# ---------------------------
+# Message helpers
+# ---------------------------
+def new_message_id() -> str:
+    return uuid.uuid4().hex[:16]
+
+
+def message_id(msg: Dict) -> str:
+    """
+    Stable id of a chat message. New messages get one when they are created;
+    older ones (without "id") get one derived from their content, stored on the dict.
+    """
+    if not msg.get("id"):
+        raw = f"{msg.get('role')}\0{msg.get('timestamp')}\0{msg.get('content')}"
+        msg["id"] = hashlib.sha1(raw.encode("utf-8")).hexdigest()[:16]
+    return msg["id"]
+
+
+def source_label(source: Dict) -> Tuple[Optional[str], Any]:
+    """(document name, page) of a source dict, falling back to its metadata"""
+    metadata = source.get("metadata", {}) or {}
+    doc_name = source.get("document") or metadata.get("document_name")
+    page_num = source.get("page") or metadata.get("page_number") or metadata.get("page")
+    return doc_name, page_num
+
+
+def copy_text(msg: Dict) -> str:
+    """Plain text put on the clipboard for an assistant message (answer + sources)"""
+    answer = msg.get("content") or ""
+    sources = msg.get("sources") or []
+    if not sources:
+        return answer
+    lines = []
+    for i, source in enumerate(sources):
+        doc_name, page_num = source_label(source)
+        header = f"[{i+1}] {(doc_name or 'Unknown document')}" + (f" — page {page_num}" if page_num is not None else "")
+        lines.append(f"{header}\n{source.get('content', '') or ''}")
+    return answer + "\n\nSources:\n" + "\n\n".join(lines)
+
+
+def copy_button_html(element_id: str, text: str) -> str:
+    """Copy-to-clipboard widget (for components.html); element_id must be stable"""
+    return """
+    <div style=\"display:flex; justify-content:flex-end; margin: 4px 0;\">
+      <button id=\"copy-btn-""" + element_id + """\" style=\"font-size:12px; padding:4px 8px; cursor:pointer;\">📋 Copy</button>
+    </div>
+    <textarea id=\"copy-text-""" + element_id + """\" style=\"position:absolute; left:-10000px; top:-10000px; white-space:pre;\">""" + html.escape(text) + """</textarea>
+    <script>
+    (function(){
+      var btn = document.getElementById('copy-btn-""" + element_id + """');
+      var txt = document.getElementById('copy-text-""" + element_id + """');
+      if(btn && txt){
+        btn.addEventListener('click', async function(){
+          try{
+            await navigator.clipboard.writeText(txt.value);
+            btn.textContent = '✅ Copied';
+            setTimeout(function(){ btn.textContent = '📋 Copy'; }, 1200);
+          }catch(e){
+            btn.textContent = '⚠️ Failed';
+          }
+        });
+      }
+    })();
+    </script>
+    """
+
+
+def message_preview(msg: Dict, max_chars: int = 160) -> str:
+    """One-line markdown preview of a message (collapsed chat history)"""
+    icon = "🧑" if msg.get("role") == "user" else "🛡️"
+    text = " ".join((msg.get("content") or "").split())
+    if len(text) > max_chars:
+        text = text[:max_chars].rsplit(" ", 1)[0] + " …"
+    sources = len(msg.get("sources") or [])
+    return f"- {icon} {text}" + (f" *({sources} sources)*" if sources else "")
+
+
+def sources_markdown(sources: List[Dict]) -> List[Tuple[str, str]]:
+    """(header, body) markdown pairs for the "Source Documents" expander"""
+    rendered = []
+    for i, source in enumerate(sources or []):
+        doc_name, page_num = source_label(source)
+        header = f"**Source {i+1}:** {doc_name or 'Unknown document'}"
+        if page_num is not None:
+            header += f" — page {page_num}"
+        # Preserve original line breaks in normal font
+        rendered.append((header, (source.get('content', '') or '').replace('\n', '  \n')))
+    return rendered
+
+
+class RenderCache:
+    """
+    Memoized per-message payloads (copy widget HTML, source markdown, export
+    blocks), keyed by message id. Chat messages don't change once added, so
+    each payload is built once instead of on every Streamlit rerun.
+    """
+
+    def __init__(self, max_entries: int = 5000):
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[tuple, Any]" = OrderedDict()
+
+    def memo(self, key: tuple, build: Callable[[], Any]) -> Any:
+        if key in self._entries:
+            self._entries.move_to_end(key)
+            return self._entries[key]
+        value = self._entries[key] = build()
+        if len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+        return value
+
+    def message_payload(self, msg: Dict) -> Dict[str, Any]:
+        """Everything the chat view needs to render one message"""
+        mid = message_id(msg)
+        return self.memo(("render", mid), lambda: {
+            "id": mid,
+            "copy_html": copy_button_html(mid, copy_text(msg)) if msg.get("role") == "assistant" else None,
+            "sources": sources_markdown(msg.get("sources") or []),
+            "preview": message_preview(msg),
+        })
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+
+# ---------------------------
+# Export
+# ---------------------------
+def _txt_block(idx: int, msg: Dict, timestamp: str) -> str:
+    lines: List[str] = []
+    lines.append(f"--- Message {idx} ---")
+    lines.append(f"Time: {timestamp}")
+    lines.append(f"Role: {msg.get('role') or 'unknown'}")
+    lines.append("")
+    lines.append((msg.get("content") or "").rstrip())
+
+    sources = msg.get("sources") or []
+    if sources:
+        lines.append("")
+        lines.append("Sources:")
+        for s_idx, src in enumerate(sources, start=1):
+            doc_name, page_num = source_label(src)
+            header = f"[{s_idx}] {doc_name or 'Unknown document'}" + (f" — page {page_num}" if page_num is not None else "")
+            src_content = (src.get("content", "") or "").rstrip()
+            lines.append(header)
+            if src_content:
+                lines.append(src_content)
+            lines.append("")
+
+    lines.append("")
+    return "\n".join(lines) + "\n"
+
+
+def _md_block(idx: int, msg: Dict, timestamp: str) -> str:
+    role = msg.get("role") or "unknown"
+    title = {"user": "🧑 User", "assistant": "🛡️ Assistant"}.get(role, role)
+    lines = [f"## {idx}. {title}", f"*{timestamp}*", "", (msg.get("content") or "").rstrip(), ""]
+    sources = msg.get("sources") or []
+    if sources:
+        lines.append("**Sources:**")
+        lines.append("")
+        for s_idx, src in enumerate(sources, start=1):
+            doc_name, page_num = source_label(src)
+            lines.append(f"{s_idx}. **{doc_name or 'Unknown document'}**" + (f" — page {page_num}" if page_num is not None else ""))
+            src_content = (src.get("content", "") or "").strip()
+            if src_content:
+                lines.extend("   > " + line for line in src_content.splitlines())
+        lines.append("")
+    return "\n".join(lines) + "\n"
+
+
+def _jsonl_block(idx: int, msg: Dict, timestamp: str) -> str:
+    record = {
+        "type": "message",
+        "index": idx,
+        "id": message_id(msg),
+        "role": msg.get("role") or "unknown",
+        "timestamp": timestamp,
+        "content": msg.get("content") or "",
+        "run_id": msg.get("run_id"),
+        "sources": [
+            {"document": source_label(src)[0], "page": source_label(src)[1], "content": src.get("content", "") or ""}
+            for src in msg.get("sources") or []
+        ],
+    }
+    return json.dumps(record, ensure_ascii=False, default=str) + "\n"
+
+
+_BLOCKS = {"txt": _txt_block, "md": _md_block, "jsonl": _jsonl_block}
+
+
+def _header(fmt: str, chat_name: str, description: str, author: str, url: str, exported_at: str) -> str:
+    if fmt == "jsonl":
+        record = {"type": "chat", "chat": chat_name, "description": description,
+                  "author": author, "url": url, "exported_at": exported_at}
+        return json.dumps(record, ensure_ascii=False) + "\n"
+    if fmt == "md":
+        return (f"# {chat_name}\n\n{description}  \nAuthor: {author}  \nURL: {url}  \n"
+                f"Exported at: {exported_at}\n\n")
+    lines = [description, f"Author: {author}", f"URL: {url}", f"Exported at: {exported_at}", f"Chat: {chat_name}", ""]
+    return "\n".join(lines) + "\n"
+
+
+# Stands in for the timestamp in cached export blocks, so messages without one
+# (shown with the export time) are cacheable too
+_TIME_SLOT = "@@export-time@@"
+
+
+def _message_block(fmt: str, idx: int, msg: Dict, exported_at: str, cache: Optional[RenderCache]) -> str:
+    timestamp = msg.get("timestamp") or exported_at
+    if cache is None:
+        return _BLOCKS[fmt](idx, msg, timestamp)
+    # The timestamp comes before the content, so the first slot is always ours
+    head, tail = cache.memo(
+        ("export", fmt, message_id(msg), idx),
+        lambda: tuple(_BLOCKS[fmt](idx, msg, _TIME_SLOT).split(_TIME_SLOT, 1)),
+    )
+    return head + timestamp + tail
+
+
+def _resolved_header(fmt: str, chat_name: str, project_description, author, url, exported_at: str) -> str:
+    if fmt not in _BLOCKS:
+        raise ValueError(f"Unknown export format: {fmt} (use one of {', '.join(_BLOCKS)})")
+    return _header(
+        fmt,
+        chat_name,
+        project_description or DEFAULT_PROJECT_DESCRIPTION,
+        author or DEFAULT_PROJECT_AUTHOR,
+        url or DEFAULT_PROJECT_URL,
+        exported_at,
+    )
+
+
+def iter_export(
+    chat_name: str,
+    messages: List[Dict],
+    fmt: str = "txt",
+    project_description: Optional[str] = None,
+    author: Optional[str] = None,
+    url: Optional[str] = None,
+    cache: Optional[RenderCache] = None,
+) -> Iterator[str]:
+    """
+    Yield the export chunk by chunk (header, then one block per message), so
+    long sessions can be written to a file without building one big string.
+    With a RenderCache, message blocks are built once per message and format.
+    """
+    exported_at = datetime.utcnow().isoformat(timespec="seconds") + "Z"
+    yield _resolved_header(fmt, chat_name, project_description, author, url, exported_at)
+    for idx, msg in enumerate(messages, start=1):
+        yield _message_block(fmt, idx, msg, exported_at, cache)
+
+
+def export_filename(chat_name: str, fmt: str = "txt") -> str:
+    safe_name = "".join(ch if ch.isalnum() or ch in ("-", "_") else "_" for ch in chat_name).strip("_") or "chat"
+    return f"{safe_name}_{datetime.utcnow().strftime('%Y%m%d_%H%M%S')}.{EXPORT_FORMATS[fmt][1]}"
+
 
 def export_chat(
     chat_name: str,
@@ -13,9 +282,12 @@ def export_chat(
     project_description: Optional[str] = None,
     author: Optional[str] = None,
     url: Optional[str] = None,
+    fmt: str = "txt",
+    cache: Optional[RenderCache] = None,
 ) -> Tuple[bytes, str]:
     """
-    Prepare an export of a chat as human-readable TXT bytes and a suggested filename.
+    Prepare an export of a chat as bytes and a suggested filename.
+    fmt: "txt" (human-readable, default), "md" (Markdown) or "jsonl" (one JSON object per line).
 
     Each message is expected to be a dict with at least keys:
       - role: "user" | "assistant"
@@ -24,51 +296,18 @@ def export_chat(
       - timestamp: Optional[str] (ISO-8601). If missing, it will be filled with export time.
     """
     exported_at = datetime.utcnow().isoformat(timespec="seconds") + "Z"
-
-    # Resolve header values
-    header_description = project_description or DEFAULT_PROJECT_DESCRIPTION
-    header_author = author or DEFAULT_PROJECT_AUTHOR
-    header_url = url or DEFAULT_PROJECT_URL
-
-    lines: List[str] = []
-    # Standard header
-    lines.append(header_description)
-    lines.append(f"Author: {header_author}")
-    lines.append(f"URL: {header_url}")
-    lines.append(f"Exported at: {exported_at}")
-    lines.append(f"Chat: {chat_name}")
-    lines.append("" )
-
-    for idx, msg in enumerate(messages, start=1):
-        role = msg.get("role") or "unknown"
-        content = (msg.get("content") or "").rstrip()
-        timestamp = (msg.get("timestamp") or exported_at)
-        lines.append(f"--- Message {idx} ---")
-        lines.append(f"Time: {timestamp}")
-        lines.append(f"Role: {role}")
-        lines.append("")
-        lines.append(content)
-
-        sources = msg.get("sources") or []
-        if sources:
-            lines.append("")
-            lines.append("Sources:")
-            for s_idx, src in enumerate(sources, start=1):
-                doc_name = src.get("document") or (src.get("metadata", {}) or {}).get("document_name")
-                page_num = src.get("page") or (src.get("metadata", {}) or {}).get("page_number") or (src.get("metadata", {}) or {}).get("page")
-                header = f"[{s_idx}] {doc_name or 'Unknown document'}" + (f" — page {page_num}" if page_num is not None else "")
-                src_content = (src.get("content", "") or "").rstrip()
-                lines.append(header)
-                if src_content:
-                    lines.append(src_content)
-                lines.append("")
-
-        lines.append("")
-
-    text = "\n".join(lines).rstrip() + "\n"
-    data = text.encode("utf-8")
-    safe_name = "".join(ch if ch.isalnum() or ch in ("-", "_") else "_" for ch in chat_name).strip("_") or "chat"
-    filename = f"{safe_name}_{datetime.utcnow().strftime('%Y%m%d_%H%M%S')}.txt"
-    return data, filename
+    parts = [_resolved_header(fmt, chat_name, project_description, author, url, exported_at)]
+    parts += [_message_block(fmt, idx, msg, exported_at, cache) for idx, msg in enumerate(messages, start=1)]
+    text = "".join(parts)
+    if fmt != "jsonl":
+        text = text.rstrip() + "\n"
+    return text.encode("utf-8"), export_filename(chat_name, fmt)
 
 
+def write_export(path: str, chat_name: str, messages: List[Dict], fmt: Optional[str] = None, **kwargs) -> str:
+    """Stream an export straight to a file (format from the extension if not given)"""
+    fmt = fmt or path.rsplit(".", 1)[-1].lower()
+    with open(path, "w", encoding="utf-8") as f:
+        for chunk in iter_export(chat_name, messages, fmt, **kwargs):
+            f.write(chunk)
+    return path